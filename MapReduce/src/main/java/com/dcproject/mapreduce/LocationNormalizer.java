@@ -0,0 +1,21 @@
+package com.dcproject.mapreduce;
+
+import java.util.Locale;
+
+/**
+ * Normalizes free-form location names so that "Andheri", "andheri " and
+ * "ANDHERI" produce the same key. Mirrors normalize_location() in the backend
+ * location catalog.
+ */
+public final class LocationNormalizer {
+
+    private LocationNormalizer() {
+    }
+
+    public static String normalize(String location) {
+        if (location == null) {
+            return "";
+        }
+        return location.trim().replaceAll("\\s+", " ").toLowerCase(Locale.ROOT);
+    }
+}
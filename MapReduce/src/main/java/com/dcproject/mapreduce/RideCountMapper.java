@@ -19,7 +19,7 @@ public class RideCountMapper extends Mapper<LongWritable, Text, Text, IntWritabl
         String[] fields = line.split(",");
 
         if (fields.length >= 3) {
-            String pickup = fields[2].trim(); // pickup location is the third field (0-indexed)
+            String pickup = LocationNormalizer.normalize(fields[2]); // pickup location is the third field (0-indexed)
             pickupLocation.set(pickup);
             context.write(pickupLocation, one);
         }
@@ -19,8 +19,8 @@ public class RouteFareMapper extends Mapper<LongWritable, Text, Text, DoubleWrit
         String[] fields = line.split(",");
 
         if (fields.length >= 5) {
-            String pickup = fields[2].trim();
-            String destination = fields[3].trim();
+            String pickup = LocationNormalizer.normalize(fields[2]);
+            String destination = LocationNormalizer.normalize(fields[3]);
             String routeKey = pickup + "-" + destination;
             double fareValue = Double.parseDouble(fields[4].trim());
 
@@ -207,12 +207,13 @@ class CabClient:
         try:
             print("\n--- System Statistics ---")
 
+            # Both calls go out in one round-trip via system.multicall
+            batch = xmlrpc.client.MultiCall(self.server)
             send_clock = self._lamport_before_send()
-            active_rides_result = self.server.get_active_rides(send_clock)
+            batch.get_active_rides(send_clock)
+            batch.get_available_drivers(send_clock)
+            active_rides_result, available_drivers_result = batch()
             self._lamport_update_on_receive(active_rides_result.get("server_clock"))
-
-            send_clock = self._lamport_before_send()
-            available_drivers_result = self.server.get_available_drivers(send_clock)
             self._lamport_update_on_receive(available_drivers_result.get("server_clock"))
 
             if active_rides_result["success"] and available_drivers_result["success"]:
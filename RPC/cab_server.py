@@ -495,6 +495,7 @@ class CabServer:
     def run(self):
         xmlrpc_server = ThreadedXMLRPCServer(("localhost", self.port), requestHandler=RequestHandler, allow_none=True)
         xmlrpc_server.register_introspection_functions()
+        xmlrpc_server.register_multicall_functions()
         xmlrpc_server.register_instance(self.cab_service)
         
         print(f"Server {self.server_id} running XML-RPC on port {self.port}")
@@ -515,6 +516,7 @@ class CabServer:
 def main():
     server = ThreadedXMLRPCServer(("localhost", 8000), requestHandler=RequestHandler, allow_none=True)
     server.register_introspection_functions()
+    server.register_multicall_functions()
 
     cab_service = CabService(None)  
     server.register_instance(cab_service)
@@ -0,0 +1,184 @@
+"""
+Benchmark for connection-count scaling of the cab server modes: the threaded
+XML-RPC server (a thread per connection) versus the asyncio server (one event
+loop, bounded worker pool).
+
+The server runs in a child process. The client is one asyncio process that
+runs N clients, each keeping a connection open (as long as the server allows)
+and calling ping at a fixed think time, so the offered load stays the same while the connection count grows
+(--storm makes every client connect and call at the same moment first).
+Reported per mode and N: completed and failed calls (timeouts, resets), latency percentiles, and the server's peak thread count and RSS.
+
+Usage:
+    python benchmarks/bench_async_server.py --clients 100 1000 10000 --seconds 20
+    python benchmarks/bench_async_server.py --clients 10000 --seconds 30 --storm
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import socket
+import sys
+import threading
+import time
+import xmlrpc.client
+
+# Add the parent directory to sys.path to allow relative imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import settings
+
+PING = xmlrpc.client.dumps((), "ping").encode()
+
+
+def _percentile(samples, pct):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _serve(mode, port):
+    """Child process: run one cab server in the given mode"""
+    settings.USE_PERSISTENT_STORAGE = False
+    settings.REPLICATION_MODE = "none"
+    settings.SERVER_HOST = "127.0.0.1"
+    import logging
+    logging.disable(logging.INFO)
+    from services.cab_service import CabService, ThreadedXMLRPCServer, AsyncServer, RequestHandler
+
+    service = CabService(0, is_leader=True)
+    service.peers = {}
+    if mode == "asyncio":
+        server = AsyncServer(("127.0.0.1", port), rpc_paths=RequestHandler.rpc_paths,
+                             workers=settings.ASYNC_RPC_WORKERS)
+    else:
+        server = ThreadedXMLRPCServer(("127.0.0.1", port), requestHandler=RequestHandler,
+                                      allow_none=True, logRequests=False)
+        server.daemon_threads = True
+    server.register_introspection_functions()
+    server.register_instance(service)
+    server.metrics = service.metrics
+    server.serve_forever()
+
+
+def _process_stats(pid):
+    """Thread count and resident memory (MB) of a process"""
+    stats = {}
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            key, _, value = line.partition(":")
+            stats[key] = value.strip()
+    return int(stats["Threads"]), int(stats["VmRSS"].split()[0]) / 1024
+
+
+class _Monitor(threading.Thread):
+    """Samples the server's peak thread count and RSS"""
+
+    def __init__(self, pid):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.peak_threads = 0
+        self.peak_rss = 0.0
+        self.stop = threading.Event()
+
+    def run(self):
+        while not self.stop.is_set():
+            try:
+                threads, rss = _process_stats(self.pid)
+            except (OSError, KeyError):
+                return
+            self.peak_threads = max(self.peak_threads, threads)
+            self.peak_rss = max(self.peak_rss, rss)
+            time.sleep(0.1)
+
+
+async def _client(port, deadline, think, storm, result):
+    """One client: keep a connection open and ping at a fixed think time"""
+    request = (f"POST {settings.RPC_PATH} HTTP/1.1\r\nHost: 127.0.0.1\r\n"
+               f"Content-Type: text/xml\r\nContent-Length: {len(PING)}\r\n\r\n").encode() + PING
+    reader = writer = None
+    if not storm:
+        await asyncio.sleep(random.uniform(0, think))
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.wait_for(asyncio.open_connection("127.0.0.1", port),
+                                                        settings.REQUEST_TIMEOUT)
+            writer.write(request)
+            head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), settings.REQUEST_TIMEOUT)
+            headers = head.decode("latin-1").lower()
+            length = int(headers.split("content-length:")[1].split("\r\n")[0])
+            await reader.readexactly(length)
+            if not headers.startswith("http/1.1 200") and not headers.startswith("http/1.0 200"):
+                raise ConnectionError(headers.split("\r\n")[0])
+            result["latencies"].append(time.perf_counter() - start)
+            if "connection: close" in headers or headers.startswith("http/1.0"):
+                writer.close()
+                writer = None
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError, IndexError):
+            result["failed"] += 1
+            if writer is not None:
+                writer.close()
+            writer = None
+        await asyncio.sleep(max(0.0, think - (time.perf_counter() - start)))
+    if writer is not None:
+        writer.close()
+
+
+async def _load(port, clients, seconds, think, storm):
+    result = {"failed": 0, "latencies": []}
+    deadline = time.perf_counter() + seconds
+    await asyncio.gather(*(_client(port, deadline, think, storm, result) for _ in range(clients)))
+    return result
+
+
+def run(mode, clients, seconds, think, storm=False):
+    port = _free_port()
+    server = multiprocessing.Process(target=_serve, args=(mode, port), daemon=True)
+    server.start()
+    for _ in range(100):
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            break
+        except OSError:
+            time.sleep(0.1)
+
+    monitor = _Monitor(server.pid)
+    monitor.start()
+    result = asyncio.run(_load(port, clients, seconds, think, storm))
+    monitor.stop.set()
+    server.terminate()
+    server.join()
+
+    latencies = result["latencies"] or [0.0]
+    print(f"  {mode:8s} {clients:6,} clients  ok={len(result['latencies']):7,}  failed={result['failed']:6,}  "
+          f"p50={_percentile(latencies, 50) * 1e3:7.2f} ms  p99={_percentile(latencies, 99) * 1e3:8.2f} ms  "
+          f"threads={monitor.peak_threads:6,}  rss={monitor.peak_rss:6.0f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Threaded vs asyncio server connection scaling')
+    parser.add_argument('--clients', type=int, nargs='+', default=[100, 1000, 10000], help='Concurrent clients')
+    parser.add_argument('--seconds', type=float, default=20, help='Duration of each run')
+    parser.add_argument('--rate', type=float, default=500, help='Total calls per second offered by all clients')
+    parser.add_argument('--storm', action='store_true', help='All clients connect and call at once first')
+    parser.add_argument('--modes', nargs='+', default=["threaded", "asyncio"], help='Server modes to compare')
+    args = parser.parse_args()
+
+    print(f"ping at {args.rate:.0f} calls/s total, {args.seconds:.0f} s per run"
+          f"{', starting with every client at once' if args.storm else ''}:")
+    for clients in args.clients:
+        for mode in args.modes:
+            run(mode, clients, args.seconds, clients / args.rate, args.storm)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Benchmark for how fast the load balancer ejects a failed backend and
+readmits a recovered one.
+
+Three backends run in child processes behind an in-process load balancer.
+One backend is made to fail in one of two ways: killed (connections are
+refused) or hung with SIGSTOP (connections are accepted but never answered,
+the case a probe without a timeout never detects). The time until the load
+balancer marks it down is measured, and for a hung backend, the time until
+it is marked up again after SIGCONT. Each scenario runs idle (probes only)
+and with client traffic (probes plus passive signals from failed calls),
+under the current health check settings and under the old ones (a probe
+every 5 s, REQUEST_TIMEOUT per probe, one result flips the status).
+
+Usage:
+    python benchmarks/bench_failure_detection.py --trials 3 --clients 4
+"""
+
+import argparse
+import logging
+import multiprocessing
+import os
+import random
+import signal
+import sys
+import threading
+import time
+import xmlrpc.client
+
+# Add the parent directory to sys.path to allow relative imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.local_cluster import start_backend, start_load_balancer
+from config import settings
+
+logging.disable(logging.CRITICAL)  # the load balancer logs every failed probe
+
+CONFIGS = {
+    "current": {},
+    "old": {"HEALTH_CHECK_INTERVAL": 5.0, "HEALTH_CHECK_TIMEOUT": settings.REQUEST_TIMEOUT,
+            "HEALTH_EJECT_FAILURES": 1, "HEALTH_READMIT_SUCCESSES": 1}
+}
+
+
+def _backend(server_id, ports):
+    """Child process: run one backend until killed"""
+    _, _, port = start_backend(server_id)
+    ports.put((server_id, port))
+    while True:
+        time.sleep(60)
+
+
+def _wait_status(balancer, port, status, timeout=60):
+    """Seconds until the load balancer reports a backend's status, or None"""
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        if balancer.server_status.get(port) == status:
+            return time.perf_counter() - start
+        time.sleep(0.005)
+    return None
+
+
+def _traffic(url, stop):
+    proxy = xmlrpc.client.ServerProxy(url, allow_none=True)
+    while not stop.is_set():
+        try:
+            proxy.get_available_cabs("Zone 1")
+        except (OSError, xmlrpc.client.Error):
+            pass
+        time.sleep(0.01)
+
+
+def trial(failure, clients):
+    """One failure of one backend; returns (seconds to eject, seconds to readmit or None)"""
+    ports = multiprocessing.Queue()
+    backends = [multiprocessing.Process(target=_backend, args=(i, ports), daemon=True) for i in range(3)]
+    for backend in backends:
+        backend.start()
+    backend_ports = dict(ports.get(timeout=60) for _ in backends)
+    _, balancer, url = start_load_balancer([backend_ports[i] for i in range(len(backends))])
+    victim, port = backends[-1], backend_ports[len(backends) - 1]
+    _wait_status(balancer, port, "up")
+
+    stop = threading.Event()
+    workers = [threading.Thread(target=_traffic, args=(url, stop), daemon=True) for _ in range(clients)]
+    for worker in workers:
+        worker.start()
+    time.sleep(1 + random.random() * settings.HEALTH_CHECK_INTERVAL)  # land anywhere in the probe cycle
+
+    os.kill(victim.pid, signal.SIGKILL if failure == "kill" else signal.SIGSTOP)
+    eject = _wait_status(balancer, port, "down")
+    readmit = None
+    if failure == "hang":
+        os.kill(victim.pid, signal.SIGCONT)
+        readmit = _wait_status(balancer, port, "up")
+
+    stop.set()
+    for backend in backends:
+        backend.kill()
+    return eject, readmit
+
+
+def _mean(values):
+    values = [v for v in values if v is not None]
+    return f"{sum(values) / len(values):6.2f} s" if values else "   never"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time to eject and readmit a failed backend')
+    parser.add_argument('--trials', type=int, default=3, help='Trials per scenario')
+    parser.add_argument('--clients', type=int, default=4, help='Client threads in the runs with traffic')
+    parser.add_argument('--configs', nargs='+', default=list(CONFIGS), choices=list(CONFIGS))
+    args = parser.parse_args()
+
+    defaults = {name: getattr(settings, name) for name in CONFIGS["old"]}
+    print(f"Mean over {args.trials} trials:")
+    for config in args.configs:
+        for name, value in dict(defaults, **CONFIGS[config]).items():
+            setattr(settings, name, value)
+        for failure in ("kill", "hang"):
+            for clients in (0, args.clients):
+                results = [trial(failure, clients) for _ in range(args.trials)]
+                line = (f"  {config:8s} {failure:5s} {'idle' if not clients else f'{clients} clients':10s} "
+                        f"eject {_mean(r[0] for r in results)}")
+                if failure == "hang":
+                    line += f"  readmit {_mean(r[1] for r in results)}"
+                print(line)
+
+
+if __name__ == "__main__":
+    main()
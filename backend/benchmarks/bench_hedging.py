@@ -0,0 +1,124 @@
+"""
+Benchmark for hedged reads through the load balancer with one jittery backend.
+
+Three backends run behind a load balancer; one of them stalls a fraction of
+its calls (--jitter-rate) for --jitter-ms, like a backend pausing for GC.
+Closed-loop clients call get_ride_status through the load balancer with
+hedging off and on, and the latency percentiles and the extra calls the
+hedges cost are reported.
+
+Usage:
+    python benchmarks/bench_hedging.py --seconds 15 --clients 4 --jitter-rate 0.05 --jitter-ms 100
+"""
+
+import argparse
+import functools
+import os
+import random
+import sys
+import threading
+import time
+import xmlrpc.client
+
+# Add the parent directory to sys.path to allow relative imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.local_cluster import start_backend, start_load_balancer
+from config import settings
+from services import cab_service, load_balancer
+from services.load_balancer import LoadBalancer
+
+
+def _percentile(samples, pct):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+def add_jitter(service, rate, delay, calls):
+    """Make a backend stall `rate` of its get_ride_status calls for `delay` seconds, counting all its calls"""
+    get_ride_status = service.get_ride_status
+    rng = random.Random(0)
+
+    def jittery_get_ride_status(*args):
+        calls[0] += 1
+        if rng.random() < rate:
+            time.sleep(delay)
+        return get_ride_status(*args)
+
+    service.get_ride_status = jittery_get_ride_status
+
+
+def count_calls(service, calls):
+    get_ride_status = service.get_ride_status
+
+    def counted_get_ride_status(*args):
+        calls[0] += 1
+        return get_ride_status(*args)
+
+    service.get_ride_status = counted_get_ride_status
+
+
+def measure(url, clients, seconds):
+    """Closed-loop clients; returns all call latencies in seconds"""
+    latencies = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def client():
+        proxy = xmlrpc.client.ServerProxy(url, allow_none=True)
+        local = []
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            proxy.get_ride_status("ride-0")
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Hedged reads with one jittery backend')
+    parser.add_argument('--seconds', type=float, default=15, help='Duration per run')
+    parser.add_argument('--clients', type=int, default=4, help='Concurrent clients')
+    parser.add_argument('--jitter-rate', type=float, default=0.05, help='Share of the jittery backend\'s calls that stall')
+    parser.add_argument('--jitter-ms', type=float, default=100, help='Length of a stall')
+    args = parser.parse_args()
+
+    # Every call is a new connection; a listen backlog of 5 would add SYN retries of 1 s
+    cab_service.ThreadedXMLRPCServer.request_queue_size = 1024
+    load_balancer.ThreadedXMLRPCServer.request_queue_size = 1024
+    # Without replication reads would all stay on the leader; spread them over the three backends
+    settings.LB_LEADER_ROUTING = False
+
+    nodes = [start_backend(i) for i in range(3)]
+    backend_calls = [0]
+    for _, service, _ in nodes[:-1]:
+        count_calls(service, backend_calls)
+    add_jitter(nodes[-1][1], args.jitter_rate, args.jitter_ms / 1e3, backend_calls)
+    ports = [port for _, _, port in nodes]
+
+    print(f"get_ride_status through the load balancer, {args.clients} clients, 1 of 3 backends stalls "
+          f"{args.jitter_rate * 100:g}% of calls for {args.jitter_ms:g} ms:")
+    for hedging in (False, True):
+        settings.HEDGE_ENABLED = hedging
+        _, balancer, url = start_load_balancer(ports, functools.partial(LoadBalancer, policy="p2c"))
+        measure(url, args.clients, 3)  # warm-up: connections and the hedge delay estimate
+        backend_calls[0] = 0
+        latencies = measure(url, args.clients, args.seconds)
+        stats = balancer.hedge_stats
+        print(f"  hedging {'on ' if hedging else 'off'}  {len(latencies) / args.seconds:7,.0f} calls/s  "
+              f"p50={_percentile(latencies, 50) * 1e3:6.1f} ms  "
+              f"p99={_percentile(latencies, 99) * 1e3:6.1f} ms  "
+              f"p99.9={_percentile(latencies, 99.9) * 1e3:6.1f} ms  "
+              f"backend calls +{(backend_calls[0] / len(latencies) - 1) * 100:4.1f}%  "
+              f"(hedged {stats['hedged']:,}, won {stats['hedge_won']:,})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""
+Benchmark for goodput through the load balancer under overload, with its
+adaptive concurrency limits and load shedding off and on.
+
+Two backends and a load balancer run in a child process. Each backend is
+given a fixed capacity: at most --slots calls of book_cab / get_ride_status
+run at once, each taking --service-time seconds, and the rest wait. The
+capacity of the cluster is measured with a closed loop of clients; then an
+open-loop client offers 1x, 2x and 4x that rate for --seconds, about 30%
+bookings and 70% status polls. Goodput counts only calls answered within
+--slo seconds. Without limits the excess queues at the backends until every
+answer is late; with limits the load balancer sheds it with a fast busy
+fault, status polls first, and the backends keep answering in time.
+
+Usage:
+    python benchmarks/bench_lb_overload.py --seconds 10 --slo 1
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import sys
+import threading
+import time
+import xmlrpc.client
+
+# Add the parent directory to sys.path to allow relative imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import settings
+from util.worker_pool import is_busy_error
+
+RIDERS = 20
+LIMITED_METHODS = ("book_cab", "get_ride_status")
+
+
+def _percentile(samples, pct):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+def _with_capacity(func, semaphore, service_time):
+    """Wrap a service method so that it runs under a backend's semaphore, taking `service_time`"""
+    def limited(*args):
+        with semaphore:
+            time.sleep(service_time)
+            return func(*args)
+    return limited
+
+
+def _cluster(limits, slots, service_time, ports):
+    """Child process: run two capacity-limited backends and a load balancer until killed"""
+    settings.LB_CONCURRENCY_LIMIT_ENABLED = limits
+    import logging
+    from benchmarks.local_cluster import start_backend, start_load_balancer
+    from services import cab_service, load_balancer
+    logging.disable(logging.CRITICAL)  # the load balancer logs every slow or failed call
+    cab_service.ThreadedXMLRPCServer.request_queue_size = 1024
+    load_balancer.ThreadedXMLRPCServer.request_queue_size = 1024
+
+    backend_ports = []
+    for server_id in range(2):
+        _, service, port = start_backend(server_id, riders=RIDERS)
+        semaphore = threading.Semaphore(slots)
+        for name in LIMITED_METHODS:
+            setattr(service, name, _with_capacity(getattr(service, name), semaphore, service_time))
+        backend_ports.append(port)
+    server, balancer, _ = start_load_balancer(backend_ports)
+    while any(balancer.server_status.get(port) != 'up' for port in backend_ports):
+        time.sleep(0.05)
+    ports.put(server.server_address[1])
+    while True:
+        time.sleep(60)
+
+
+def _bodies(count):
+    """Request bodies with their class, about 30% bookings and 70% status polls"""
+    bodies = []
+    for i in range(count):
+        if random.random() < 0.3:
+            body = xmlrpc.client.dumps((f"rider{i % RIDERS}", f"Zone {i % 10}", "Airport"), "book_cab")
+            bodies.append(("book", body.encode()))
+        else:
+            bodies.append(("poll", xmlrpc.client.dumps((f"ride-{i}",), "get_ride_status").encode()))
+    return bodies
+
+
+async def _call(port, body, timeout):
+    """One XML-RPC call on a fresh connection; returns 'ok', 'shed' or 'failed'"""
+    request = (f"POST {settings.RPC_PATH} HTTP/1.1\r\nHost: 127.0.0.1\r\n"
+               f"Content-Type: text/xml\r\nContent-Length: {len(body)}\r\n\r\n").encode() + body
+
+    async def exchange():
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        try:
+            writer.write(request)
+            head = await reader.readuntil(b"\r\n\r\n")
+            length = int(head.lower().split(b"content-length:")[1].split(b"\r\n")[0])
+            return await reader.readexactly(length)
+        finally:
+            writer.close()
+
+    response = await asyncio.wait_for(exchange(), timeout)
+    try:
+        xmlrpc.client.loads(response)
+    except xmlrpc.client.Fault as fault:
+        return "shed" if is_busy_error(fault) else "failed"
+    return "ok"
+
+
+async def _closed_loop(port, clients, seconds):
+    """Calls per second completed by clients that each wait for their previous call"""
+    deadline = time.perf_counter() + seconds
+    bodies = _bodies(1000)
+    done = [0]
+
+    async def client():
+        while time.perf_counter() < deadline:
+            if await _call(port, random.choice(bodies)[1], 30) == "ok":
+                done[0] += 1
+
+    await asyncio.gather(*(client() for _ in range(clients)))
+    return done[0] / seconds
+
+
+async def _open_loop(port, rate, seconds, slo):
+    """Offer calls at a fixed rate regardless of responses"""
+    outcome = {kind: {"good": 0, "late": 0, "shed": 0, "failed": 0, "latencies": []} for kind in ("book", "poll")}
+
+    async def one(kind, body):
+        counts = outcome[kind]
+        start = time.perf_counter()
+        try:
+            result = await _call(port, body, slo)
+        except asyncio.TimeoutError:
+            counts["late"] += 1
+            return
+        except (OSError, asyncio.IncompleteReadError, ValueError, IndexError, xmlrpc.client.Error):
+            counts["failed"] += 1
+            return
+        if result == "ok":
+            counts["good"] += 1
+            counts["latencies"].append(time.perf_counter() - start)
+        else:
+            counts[result] += 1
+
+    tasks = []
+    start = time.perf_counter()
+    for i, (kind, body) in enumerate(_bodies(int(rate * seconds))):
+        delay = start + i / rate - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.ensure_future(one(kind, body)))
+    await asyncio.gather(*tasks)
+    return outcome
+
+
+def _start(limits, args):
+    ports = multiprocessing.Queue()
+    cluster = multiprocessing.Process(target=_cluster, daemon=True,
+                                      args=(limits, args.slots, args.service_time, ports))
+    cluster.start()
+    return cluster, ports.get(timeout=120)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load balancer goodput under overload, limits off vs on')
+    parser.add_argument('--seconds', type=float, default=10, help='Duration of each run')
+    parser.add_argument('--slo', type=float, default=1.0, help='Seconds a caller waits for an answer')
+    parser.add_argument('--slots', type=int, default=2, help='Calls each backend runs at once')
+    parser.add_argument('--service-time', type=float, default=0.04, help='Seconds each call takes')
+    parser.add_argument('--loads', type=float, nargs='+', default=[1, 2, 4],
+                        help='Offered load as multiples of capacity')
+    args = parser.parse_args()
+
+    cluster, port = _start(True, args)
+    capacity = asyncio.run(_closed_loop(port, 2 * args.slots, 5))
+    cluster.kill()
+    cluster.join()
+    print(f"Capacity ~{capacity:,.0f} calls/s (2 backends x {args.slots} slots x "
+          f"{args.service_time * 1e3:g} ms); {args.seconds:g} s per run, SLO {args.slo:g} s:")
+
+    for load in args.loads:
+        for limits in (False, True):
+            cluster, port = _start(limits, args)
+            outcome = asyncio.run(_open_loop(port, capacity * load, args.seconds, args.slo))
+            cluster.kill()
+            cluster.join()
+            good = sum(counts["good"] for counts in outcome.values())
+            latencies = outcome["book"]["latencies"] + outcome["poll"]["latencies"] or [0.0]
+            print(f"  {load:g}x limits {'on ' if limits else 'off'}  "
+                  f"goodput={good / args.seconds:5,.0f}/s ({good / args.seconds / capacity * 100:3.0f}%)  "
+                  + "  ".join(f"{kind} good/late/shed={counts['good']:5,}/{counts['late']:5,}/{counts['shed']:5,}"
+                              for kind, counts in outcome.items())
+                  + f"  failed={sum(counts['failed'] for counts in outcome.values()):4,}"
+                  f"  p99={_percentile(latencies, 99) * 1e3:5.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Benchmark for the load balancer's balancing policies with one slow backend.
+
+Three backends run behind a load balancer; one of them answers every call
+--delay-ms late (a backend that is overloaded or pausing for GC). For each
+policy closed-loop clients call get_ride_status through the load balancer
+for --seconds, and the latency percentiles and the share of calls that went
+to the slow backend are reported. Everything runs in one process, so keep
+the clients few enough that the CPU is not the bottleneck.
+
+Usage:
+    python benchmarks/bench_lb_policies.py --seconds 10 --clients 4 --delay-ms 50
+"""
+
+import argparse
+import functools
+import os
+import sys
+import threading
+import time
+import xmlrpc.client
+
+# Add the parent directory to sys.path to allow relative imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.local_cluster import start_backend, start_load_balancer
+from services import cab_service, load_balancer
+from services.load_balancer import LoadBalancer
+from util.balancing import POLICIES
+
+
+def _percentile(samples, pct):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+def slow_down(service, delay, calls):
+    """Make a backend answer get_ride_status `delay` seconds late, counting its calls"""
+    get_ride_status = service.get_ride_status
+
+    def slow_get_ride_status(*args):
+        calls[0] += 1
+        time.sleep(delay)
+        return get_ride_status(*args)
+
+    service.get_ride_status = slow_get_ride_status
+
+
+def measure(url, clients, seconds):
+    """Closed-loop clients; returns all call latencies in seconds"""
+    latencies = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def client(index):
+        proxy = xmlrpc.client.ServerProxy(url, allow_none=True)
+        local = []
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            proxy.get_ride_status("ride-0")
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load balancing policies with one slow backend')
+    parser.add_argument('--policies', nargs='+', default=list(POLICIES), choices=list(POLICIES),
+                        help='Policies to compare')
+    parser.add_argument('--seconds', type=float, default=10, help='Duration per policy')
+    parser.add_argument('--clients', type=int, default=4, help='Concurrent clients')
+    parser.add_argument('--delay-ms', type=float, default=50, help='Extra latency of the slow backend')
+    args = parser.parse_args()
+
+    # Every call is a new connection; a listen backlog of 5 would add SYN retries of 1 s
+    cab_service.ThreadedXMLRPCServer.request_queue_size = 1024
+    load_balancer.ThreadedXMLRPCServer.request_queue_size = 1024
+
+    nodes = [start_backend(i) for i in range(3)]
+    slow_calls = [0]
+    slow_down(nodes[-1][1], args.delay_ms / 1e3, slow_calls)
+    ports = [port for _, _, port in nodes]
+
+    print(f"get_ride_status through the load balancer, {args.clients} clients, "
+          f"1 of 3 backends {args.delay_ms:g} ms slower:")
+    for policy in args.policies:
+        _, balancer, url = start_load_balancer(ports, functools.partial(LoadBalancer, policy=policy))
+        measure(url, args.clients, 1)  # warm-up: connections and the policy's first measurements
+        slow_calls[0] = 0
+        latencies = measure(url, args.clients, args.seconds)
+        print(f"  {policy:18s} {len(latencies) / args.seconds:7,.0f} calls/s  "
+              f"p50={_percentile(latencies, 50) * 1e3:6.1f} ms  "
+              f"p99={_percentile(latencies, 99) * 1e3:6.1f} ms  "
+              f"p99.9={_percentile(latencies, 99.9) * 1e3:6.1f} ms  "
+              f"to slow backend {slow_calls[0] / len(latencies) * 100:5.1f}%")
+
+
+if __name__ == "__main__":
+    main()
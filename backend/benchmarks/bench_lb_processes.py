@@ -0,0 +1,152 @@
+"""
+Benchmark for the throughput of the multi-process load balancer as the
+number of worker processes grows.
+
+Three backends run in their own processes. For each worker count a
+MultiProcessLoadBalancer is started on a free port in front of them, and
+client processes call get_user_rides (a read the load balancer does not
+cache, so every call is forwarded) over XML-RPC for a fixed time. The
+backends are the same for every run, so a rate that stops growing with the
+workers is bound by the backends or by the cores of the machine rather
+than by the load balancer.
+
+Usage:
+    python benchmarks/bench_lb_processes.py --processes 1 2 4 --seconds 10
+"""
+
+import argparse
+import logging
+import multiprocessing
+import os
+import random
+import socket
+import sys
+import time
+import xmlrpc.client
+
+# Add the parent directory to sys.path to allow relative imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import local_cluster
+from config import settings
+from services import cab_service, load_balancer
+from services.multiprocess_load_balancer import MultiProcessLoadBalancer
+
+cab_service.ThreadedXMLRPCServer.request_queue_size = 1024
+load_balancer.ThreadedXMLRPCServer.request_queue_size = 1024
+
+RIDERS = 20
+
+
+def _percentile(samples, pct):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+def _free_port():
+    """A free port whose frame RPC port (port + FRAME_PORT_OFFSET) is free too"""
+    while True:
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        try:
+            with socket.socket() as sock:
+                sock.bind(("127.0.0.1", port + settings.FRAME_PORT_OFFSET))
+            return port
+        except (OSError, OverflowError):
+            continue
+
+
+def _backend(server_id, ports):
+    logging.disable(logging.CRITICAL)
+    _, _, port = local_cluster.start_backend(server_id, riders=RIDERS)
+    ports.put((server_id, port))
+    while True:
+        time.sleep(3600)
+
+
+def _wait_ready(url, backends):
+    """Wait until the load balancer has seen every backend up"""
+    proxy = xmlrpc.client.ServerProxy(url, allow_none=True)
+    for _ in range(300):
+        try:
+            statuses = proxy.get_stats()["server_status"].values()
+            if len(statuses) == backends and all(status == "up" for status in statuses):
+                return
+        except Exception:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError("Load balancer did not start")
+
+
+def _client(url, seconds, seed, results):
+    proxy = xmlrpc.client.ServerProxy(url, allow_none=True)
+    rng = random.Random(seed)
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            proxy.get_user_rides(f"rider{rng.randrange(RIDERS)}")
+            latencies.append(time.perf_counter() - start)
+        except Exception:
+            errors += 1
+    results.put((latencies, errors))
+
+
+def run(processes, backend_ports, clients, seconds):
+    settings.LOAD_BALANCER_PORT = _free_port()
+    balancer = MultiProcessLoadBalancer(processes, backend_ports)
+    balancer.start()
+    url = f"http://127.0.0.1:{settings.LOAD_BALANCER_PORT}{settings.RPC_PATH}"
+    try:
+        _wait_ready(url, len(backend_ports))
+
+        results = multiprocessing.Queue()
+        workers = [multiprocessing.Process(target=_client, args=(url, seconds, i, results))
+                   for i in range(clients)]
+        for worker in workers:
+            worker.start()
+        latencies, errors = [], 0
+        for _ in workers:
+            client_latencies, client_errors = results.get()
+            latencies.extend(client_latencies)
+            errors += client_errors
+        for worker in workers:
+            worker.join()
+    finally:
+        balancer.stop()
+
+    print(f"  {processes:3d} processes  {len(latencies) / seconds:8,.0f} calls/s  "
+          f"p50={_percentile(latencies, 50) * 1e3:6.2f} ms  p99={_percentile(latencies, 99) * 1e3:6.2f} ms  "
+          f"errors={errors}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Multi-process load balancer throughput')
+    parser.add_argument('--processes', type=int, nargs='+', default=[1, 2, 4], help='Load balancer worker counts')
+    parser.add_argument('--clients', type=int, default=8, help='Client processes')
+    parser.add_argument('--seconds', type=float, default=10, help='Duration of each run')
+    parser.add_argument('--backends', type=int, default=3, help='Backend processes')
+    args = parser.parse_args()
+
+    ports = multiprocessing.Queue()
+    backends = [multiprocessing.Process(target=_backend, args=(i, ports), daemon=True)
+                for i in range(args.backends)]
+    for backend in backends:
+        backend.start()
+    backend_ports = [port for _, port in sorted(ports.get() for _ in backends)]
+
+    print(f"get_user_rides through the load balancer, {args.clients} client processes, "
+          f"{args.backends} backends, {os.cpu_count()} CPUs:")
+    try:
+        for processes in args.processes:
+            run(processes, backend_ports, args.clients, args.seconds)
+    finally:
+        for backend in backends:
+            backend.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Benchmark for the location catalog: bulk load, exact lookup and prefix
+autocomplete over a large set of generated location names.
+
+Usage:
+    python benchmarks/bench_location_catalog.py --names 1000000
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+# Add the parent directory to sys.path to allow relative imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from util.location_catalog import LocationCatalog
+
+AREAS = ["Andheri", "Bandra", "Colaba", "Dadar", "Juhu", "Kurla", "Powai", "Thane", "Vashi", "Worli"]
+SUFFIXES = ["East", "West", "North", "South", "Station", "Market", "Sector", "Phase", "Road", "Nagar"]
+
+
+def generate_names(count, seed=42):
+    """Generate distinct, realistic-looking location names"""
+    rng = random.Random(seed)
+    names = []
+    for i in range(count):
+        names.append(f"{rng.choice(AREAS)} {rng.choice(SUFFIXES)} {i}")
+    return names
+
+
+def _percentile(samples, pct):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+def run(name_count, query_count):
+    names = generate_names(name_count)
+    catalog = LocationCatalog()
+
+    start = time.perf_counter()
+    catalog.add_many(names)
+    load_time = time.perf_counter() - start
+
+    # The first autocomplete call builds the prefix index
+    start = time.perf_counter()
+    catalog.autocomplete("a", 1)
+    index_time = time.perf_counter() - start
+
+    rng = random.Random(7)
+    # Messy user input: wrong case and stray whitespace
+    queries = [f"  {rng.choice(names).upper()} " for _ in range(query_count)]
+    start = time.perf_counter()
+    for query in queries:
+        catalog.lookup(query)
+    lookup_time = time.perf_counter() - start
+
+    prefixes = [f"{rng.choice(AREAS)[:rng.randint(1, 5)]}" for _ in range(query_count // 10)]
+    latencies = []
+    for prefix in prefixes:
+        start = time.perf_counter()
+        catalog.autocomplete(prefix, 10)
+        latencies.append(time.perf_counter() - start)
+
+    print(f"Locations:              {len(catalog):,}")
+    print(f"Bulk load:              {load_time:.2f}s ({name_count / load_time:,.0f} names/s)")
+    print(f"Prefix index build:     {index_time:.2f}s")
+    print(f"Exact lookup:           {lookup_time / query_count * 1e6:.2f} us/op")
+    print(f"Autocomplete p50/p99:   {_percentile(latencies, 50) * 1e6:.1f} / "
+          f"{_percentile(latencies, 99) * 1e6:.1f} us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Location catalog benchmark')
+    parser.add_argument('--names', type=int, default=1_000_000, help='Number of location names')
+    parser.add_argument('--queries', type=int, default=100_000, help='Number of lookups')
+    args = parser.parse_args()
+    run(args.names, args.queries)
+
+
+if __name__ == "__main__":
+    main()
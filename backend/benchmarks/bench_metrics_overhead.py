@@ -0,0 +1,137 @@
+"""
+Benchmark for the cost of CabService instrumentation.
+
+The overhead is measured at the dispatcher (the same path an XML-RPC request
+takes after parsing) with METRICS_ENABLED off and on, and compared with the
+cost of a full HTTP round-trip; end-to-end timing alone is too noisy to show
+a few microseconds. A concurrent XML-RPC run then prints the histograms.
+
+Usage:
+    python benchmarks/bench_metrics_overhead.py --seconds 5 --clients 8
+"""
+
+import argparse
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import xmlrpc.client
+
+# Add the parent directory to sys.path to allow relative imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import settings
+
+settings.USE_PERSISTENT_STORAGE = False
+settings.REPLICATION_MODE = "none"
+
+from services.cab_service import CabService, ThreadedXMLRPCServer, RequestHandler
+
+
+def start_server(metrics_enabled):
+    """Start an in-process XML-RPC server on a free port"""
+    settings.METRICS_ENABLED = metrics_enabled
+    service = CabService(0, is_leader=True)
+    service.peers = {}
+
+    server = ThreadedXMLRPCServer(("127.0.0.1", 0), requestHandler=RequestHandler,
+                                  allow_none=True, logRequests=False)
+    server.register_introspection_functions()
+    server.register_instance(service)
+    server.metrics = service.metrics
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    url = f"http://127.0.0.1:{server.server_address[1]}{settings.RPC_PATH}"
+    return server, service, url
+
+
+def run_once(metrics_enabled, seconds, clients):
+    server, service, url = start_server(metrics_enabled)
+    for i in range(clients):
+        service.register_user(f"rider{i}", "pass", "RIDER")
+    for i in range(50):
+        service.register_user(f"driver{i}", "pass", "DRIVER")
+        service.set_driver_available(f"driver{i}", f"Zone {i % 10}", True)
+
+    stop = threading.Event()
+    calls = [0] * clients
+
+    def client(index):
+        proxy = xmlrpc.client.ServerProxy(url, allow_none=True)
+        rng = random.Random(index)
+        ride_ids = []
+        while not stop.is_set():
+            if ride_ids and rng.random() < 0.8:
+                proxy.get_ride_status(rng.choice(ride_ids))
+            else:
+                result = proxy.book_cab(f"rider{index}", f"Zone {rng.randrange(10)}", "Airport")
+                proxy.cancel_ride(result["ride_id"])
+                ride_ids.append(result["ride_id"])
+                calls[index] += 1
+            calls[index] += 1
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    server.shutdown()
+    server.server_close()
+
+    return sum(calls) / seconds, service.metrics.summary()
+
+
+def dispatch_cost(metrics_enabled, iterations):
+    """Average seconds per call through the server dispatcher, no HTTP"""
+    server, service, _ = start_server(metrics_enabled)
+    service.register_user("rider", "pass", "RIDER")
+    ride_id = service.book_cab("rider", "Zone 1", "Airport")["ride_id"]
+
+    start = time.perf_counter()
+    for i in range(iterations):
+        if i % 10 == 0:
+            result = server._dispatch("book_cab", ("rider", "Zone 1", "Airport"))
+            server._dispatch("cancel_ride", (result["ride_id"],))
+        else:
+            server._dispatch("get_ride_status", (ride_id,))
+    elapsed = time.perf_counter() - start
+
+    server.shutdown()
+    server.server_close()
+    return elapsed / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Metrics overhead benchmark')
+    parser.add_argument('--seconds', type=float, default=5, help='Duration of each run')
+    parser.add_argument('--clients', type=int, default=8, help='Concurrent XML-RPC clients')
+    parser.add_argument('--iterations', type=int, default=200_000, help='Dispatcher calls per mode')
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    baseline = min(dispatch_cost(False, args.iterations) for _ in range(3))
+    instrumented = min(dispatch_cost(True, args.iterations) for _ in range(3))
+    throughput, metrics = run_once(True, args.seconds, args.clients)
+    round_trip = args.clients / throughput
+
+    print(f"Dispatch, metrics off:  {baseline * 1e6:.2f} us/call")
+    print(f"Dispatch, metrics on:   {instrumented * 1e6:.2f} us/call "
+          f"(+{(instrumented - baseline) * 1e6:.2f} us)")
+    print(f"XML-RPC round-trip:     {round_trip * 1e6:.0f} us/call at {throughput:,.0f} calls/s "
+          f"-> overhead {(instrumented - baseline) / round_trip * 100:.2f}%")
+    print("\nPer-RPC latency (ms):")
+    for method, summary in sorted(metrics["rpc"].items()):
+        print(f"  {method:20s} n={summary['count']:7,}  p50={summary.get('p50_ms', 0):7.3f}  "
+              f"p99={summary.get('p99_ms', 0):7.3f}  p999={summary.get('p999_ms', 0):7.3f}")
+    for kind in ("wait", "hold"):
+        summary = metrics["lock"][kind]
+        print(f"  lock {kind:15s} n={summary['count']:7,}  p50={summary.get('p50_ms', 0):7.3f}  "
+              f"p99={summary.get('p99_ms', 0):7.3f}  p999={summary.get('p999_ms', 0):7.3f}")
+
+
+if __name__ == "__main__":
+    main()
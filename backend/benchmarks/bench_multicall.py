@@ -0,0 +1,94 @@
+"""
+Benchmark for screen-load latency through the load balancer: the calls one
+dashboard screen needs made one round-trip at a time versus as a single
+system.multicall batch, plus a large keyed batch sent whole versus split
+across backends.
+
+Usage:
+    python benchmarks/bench_multicall.py --screens 500
+"""
+
+import argparse
+import os
+import sys
+import time
+import xmlrpc.client
+
+# Add the parent directory to sys.path to allow relative imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.local_cluster import start_cluster
+from config import settings
+
+# Calls made to render the rider dashboard
+SCREEN = [
+    ("get_active_rides", ()),
+    ("get_available_cabs", ("Zone 1",)),
+    ("get_user_rides", ("rider0",)),
+    ("get_surge_pricing", ()),
+    ("get_server_stats", ()),
+]
+
+
+def _percentile(samples, pct):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+def _report(label, samples):
+    print(f"{label:32s} p50={_percentile(samples, 50) * 1e3:7.2f} ms  "
+          f"p99={_percentile(samples, 99) * 1e3:7.2f} ms")
+
+
+def run(screens, batch_size):
+    url, _, _ = start_cluster(3)
+    proxy = xmlrpc.client.ServerProxy(url, allow_none=True)
+
+    sequential = []
+    for _ in range(screens):
+        start = time.perf_counter()
+        for method, params in SCREEN:
+            getattr(proxy, method)(*params)
+        sequential.append(time.perf_counter() - start)
+
+    batched = []
+    for _ in range(screens):
+        start = time.perf_counter()
+        batch = xmlrpc.client.MultiCall(proxy)
+        for method, params in SCREEN:
+            getattr(batch, method)(*params)
+        list(batch())
+        batched.append(time.perf_counter() - start)
+
+    print(f"Dashboard screen ({len(SCREEN)} calls) through the load balancer, {screens} loads:")
+    _report("  sequential round-trips", sequential)
+    _report("  one multicall", batched)
+
+    # A driver app refreshing many rides at once: whole batch vs split by ride id
+    ride_ids = [proxy.book_cab(f"rider{i % 20}", f"Zone {i % 10}", "Airport")["ride_id"]
+                for i in range(batch_size)]
+    for label, threshold in (("  whole batch to one backend", 0), ("  split by ride id", 16)):
+        settings.MULTICALL_SPLIT_THRESHOLD = threshold
+        samples = []
+        for _ in range(max(1, screens // 5)):
+            start = time.perf_counter()
+            batch = xmlrpc.client.MultiCall(proxy)
+            for ride_id in ride_ids:
+                batch.get_ride_status(ride_id)
+            list(batch())
+            samples.append(time.perf_counter() - start)
+        if threshold == 0:
+            print(f"\nBatch of {batch_size} get_ride_status calls:")
+        _report(label, samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Multicall screen-load benchmark')
+    parser.add_argument('--screens', type=int, default=500, help='Screen loads per mode')
+    parser.add_argument('--batch-size', type=int, default=200, help='Calls in the large keyed batch')
+    args = parser.parse_args()
+    run(args.screens, args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Benchmark for booking throughput of the multi-process cab server as the
+number of worker processes grows.
+
+For each process count a MultiProcessCabServer is started on a free port,
+riders and drivers are registered through it, and client processes book
+rides in random zones over XML-RPC for a fixed time. With N partitions about
+(N-1)/N of the bookings arrive at a worker that does not own their zone and
+are forwarded over a Unix socket, so the forwarding cost is included.
+
+Usage:
+    python benchmarks/bench_multiprocess.py --processes 1 2 4 8 --seconds 10
+"""
+
+import argparse
+import logging
+import multiprocessing
+import os
+import random
+import socket
+import sys
+import tempfile
+import time
+import xmlrpc.client
+
+# Add the parent directory to sys.path to allow relative imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import settings
+
+settings.USE_PERSISTENT_STORAGE = False
+settings.REPLICATION_MODE = "none"
+settings.SERVER_HOST = "127.0.0.1"
+settings.PARTITION_SOCKET_DIR = tempfile.mkdtemp(prefix="cab-partitions-")
+
+from services.multiprocess_server import MultiProcessCabServer
+
+logging.disable(logging.INFO)
+
+ZONES = [f"Zone {i}" for i in range(50)]
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_ready(url, processes):
+    """Wait until every partition answers (a merged call touches all of them)"""
+    proxy = xmlrpc.client.ServerProxy(url, allow_none=True)
+    for _ in range(300):
+        try:
+            if proxy.get_server_stats()["stats"]["partitions"] == processes:
+                return
+        except Exception:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError("Server did not start")
+
+
+def _client(url, riders, seconds, seed, counts):
+    proxy = xmlrpc.client.ServerProxy(url, allow_none=True)
+    rng = random.Random(seed)
+    deadline = time.perf_counter() + seconds
+    booked = 0
+    while time.perf_counter() < deadline:
+        result = proxy.book_cab(f"rider{rng.randrange(riders)}", rng.choice(ZONES), "Airport")
+        if result.get("success"):
+            booked += 1
+    counts.put(booked)
+
+
+def run(processes, clients, seconds, riders, drivers):
+    port = _free_port()
+    settings.BASE_SERVER_PORT = port
+    server = MultiProcessCabServer(0, processes)
+    server.start()
+    url = f"http://127.0.0.1:{port}{settings.RPC_PATH}"
+    _wait_ready(url, processes)
+
+    proxy = xmlrpc.client.ServerProxy(url, allow_none=True)
+    for i in range(riders):
+        proxy.register_user(f"rider{i}", "pass", "RIDER")
+    for i in range(drivers):
+        proxy.register_user(f"driver{i}", "pass", "DRIVER")
+        proxy.set_driver_available(f"driver{i}", ZONES[i % len(ZONES)], True)
+
+    counts = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=_client, args=(url, riders, seconds, i, counts))
+               for i in range(clients)]
+    for worker in workers:
+        worker.start()
+    booked = sum(counts.get() for _ in workers)
+    for worker in workers:
+        worker.join()
+
+    stats = proxy.get_server_stats()["stats"]
+    server.stop()
+    print(f"  {processes:3d} processes  {booked / seconds:8,.0f} bookings/s  "
+          f"(rides in server: {stats['rides']['total']:,}, drivers available: {stats['drivers']['available']})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Multi-process cab server booking throughput')
+    parser.add_argument('--processes', type=int, nargs='+', default=[1, 2, 4], help='Worker process counts')
+    parser.add_argument('--clients', type=int, default=8, help='Client processes')
+    parser.add_argument('--seconds', type=float, default=10, help='Duration of each run')
+    parser.add_argument('--riders', type=int, default=100, help='Registered riders')
+    parser.add_argument('--drivers', type=int, default=200, help='Registered drivers')
+    args = parser.parse_args()
+
+    print(f"book_cab throughput, {args.clients} client processes, {os.cpu_count()} CPUs:")
+    for processes in args.processes:
+        run(processes, args.clients, args.seconds, args.riders, args.drivers)
+
+
+if __name__ == "__main__":
+    main()
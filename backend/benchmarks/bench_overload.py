@@ -0,0 +1,184 @@
+"""
+Benchmark for goodput under overload: the threaded XML-RPC server (a thread
+per connection, unbounded) versus the pooled server (fixed workers, bounded
+accept queue, fast 503 rejections).
+
+The server runs in a child process. Its capacity is measured first with a
+closed loop of clients; then an open-loop client offers --overload times that
+rate for --seconds. Goodput counts only calls answered within --slo seconds:
+work finished after the caller gave up is wasted.
+
+Usage:
+    python benchmarks/bench_overload.py --overload 3 --seconds 15
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import socket
+import sys
+import time
+import xmlrpc.client
+
+# Add the parent directory to sys.path to allow relative imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import settings
+
+RIDER = "rider0"
+
+
+def _percentile(samples, pct):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _serve(mode, port, rides, workers, queue_size):
+    """Child process: run one cab server in the given mode"""
+    settings.USE_PERSISTENT_STORAGE = False
+    settings.REPLICATION_MODE = "none"
+    settings.SERVER_HOST = "127.0.0.1"
+    import logging
+    logging.disable(logging.INFO)
+    from services.cab_service import CabService, ThreadedXMLRPCServer, PooledXMLRPCServer, RequestHandler
+
+    service = CabService(0, is_leader=True)
+    service.peers = {}
+    service.register_user(RIDER, "pass", "RIDER")
+    for i in range(rides):
+        service.book_cab(RIDER, f"Zone {i % 10}", "Airport")
+
+    server_class = PooledXMLRPCServer if mode == "pooled" else ThreadedXMLRPCServer
+    server = server_class(("127.0.0.1", port), requestHandler=RequestHandler,
+                          allow_none=True, logRequests=False)
+    server.daemon_threads = True
+    server.pool_workers = workers
+    server.pool_queue_size = queue_size
+    server.register_introspection_functions()
+    server.register_instance(service)
+    server.metrics = service.metrics
+    service.metrics.pool = server if mode == "pooled" else None
+    server.serve_forever()
+
+
+async def _call(port, body, timeout):
+    """One XML-RPC call on a fresh connection; returns the HTTP status"""
+    request = (f"POST {settings.RPC_PATH} HTTP/1.1\r\nHost: 127.0.0.1\r\n"
+               f"Content-Type: text/xml\r\nContent-Length: {len(body)}\r\n\r\n").encode() + body
+
+    async def exchange():
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        try:
+            writer.write(request)
+            head = await reader.readuntil(b"\r\n\r\n")
+            length = int(head.lower().split(b"content-length:")[1].split(b"\r\n")[0])
+            await reader.readexactly(length)
+            return int(head.split()[1])
+        finally:
+            writer.close()
+
+    return await asyncio.wait_for(exchange(), timeout)
+
+
+async def _closed_loop(port, body, clients, seconds):
+    """Calls per second completed by clients that each wait for their previous call"""
+    deadline = time.perf_counter() + seconds
+    done = [0]
+
+    async def client():
+        while time.perf_counter() < deadline:
+            if await _call(port, body, 30) == 200:
+                done[0] += 1
+
+    await asyncio.gather(*(client() for _ in range(clients)))
+    return done[0] / seconds
+
+
+async def _open_loop(port, body, rate, seconds, slo):
+    """Offer calls at a fixed rate regardless of responses"""
+    outcome = {"good": 0, "late": 0, "rejected": 0, "failed": 0, "latencies": []}
+
+    async def one():
+        start = time.perf_counter()
+        try:
+            status = await _call(port, body, slo)
+        except asyncio.TimeoutError:
+            outcome["late"] += 1
+            return
+        except (OSError, asyncio.IncompleteReadError, ValueError, IndexError):
+            outcome["failed"] += 1
+            return
+        if status == 200:
+            outcome["good"] += 1
+            outcome["latencies"].append(time.perf_counter() - start)
+        elif status == 503:
+            outcome["rejected"] += 1
+        else:
+            outcome["failed"] += 1
+
+    tasks = []
+    start = time.perf_counter()
+    for i in range(int(rate * seconds)):
+        delay = start + i / rate - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.ensure_future(one()))
+    await asyncio.gather(*tasks)
+    return outcome
+
+
+def _start(mode, args):
+    port = _free_port()
+    server = multiprocessing.Process(target=_serve, daemon=True,
+                                     args=(mode, port, args.rides, args.workers, args.queue_size))
+    server.start()
+    for _ in range(300):
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            break
+        except OSError:
+            time.sleep(0.1)
+    return server, port
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Goodput under overload, threaded vs pooled server')
+    parser.add_argument('--overload', type=float, default=3, help='Offered load as a multiple of capacity')
+    parser.add_argument('--seconds', type=float, default=15, help='Duration of the overload run')
+    parser.add_argument('--slo', type=float, default=1.0, help='Seconds a caller waits for an answer')
+    parser.add_argument('--rides', type=int, default=100, help='Rides returned by each get_user_rides call')
+    parser.add_argument('--workers', type=int, default=8, help='Worker threads of the pooled server')
+    parser.add_argument('--queue-size', type=int, default=16, help='Accept queue of the pooled server')
+    args = parser.parse_args()
+
+    body = xmlrpc.client.dumps((RIDER,), "get_user_rides").encode()
+
+    server, port = _start("pooled", args)
+    capacity = asyncio.run(_closed_loop(port, body, args.workers, 5))
+    server.terminate()
+    server.join()
+    rate = capacity * args.overload
+    print(f"Capacity ~{capacity:,.0f} calls/s (get_user_rides, {args.rides} rides); "
+          f"offering {rate:,.0f} calls/s ({args.overload:g}x) for {args.seconds:g} s, SLO {args.slo:g} s:")
+
+    for mode in ("threaded", "pooled"):
+        server, port = _start(mode, args)
+        outcome = asyncio.run(_open_loop(port, body, rate, args.seconds, args.slo))
+        server.terminate()
+        server.join()
+        latencies = outcome["latencies"] or [0.0]
+        print(f"  {mode:8s} goodput={outcome['good'] / args.seconds:7,.0f}/s  "
+              f"({outcome['good'] / args.seconds / capacity * 100:3.0f}% of capacity)  "
+              f"late={outcome['late']:6,}  rejected={outcome['rejected']:6,}  failed={outcome['failed']:5,}  "
+              f"p99={_percentile(latencies, 99) * 1e3:6.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
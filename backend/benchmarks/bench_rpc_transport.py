@@ -0,0 +1,177 @@
+"""
+Benchmark for the RPC transports: XML-RPC over HTTP versus length-prefixed
+frames over a persistent connection.
+
+First the serialization cost of a get_user_rides-sized response with each
+codec (msgpack only if installed), then call throughput and latency against
+one backend with concurrent clients: XML-RPC, frame RPC with blocking calls,
+and frame RPC with pipelined calls. Finally the same comparison through the
+load balancer, with the load balancer using the matching transport to its
+backends.
+
+Usage:
+    python benchmarks/bench_rpc_transport.py --seconds 3 --clients 8
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+import xmlrpc.client
+from collections import deque
+
+# Add the parent directory to sys.path to allow relative imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.local_cluster import start_backend, start_load_balancer
+from config import settings
+from util import frame_rpc
+from util.frame_rpc import FrameRPCClient
+
+
+def _percentile(samples, pct):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+def serialization(rides, iterations):
+    """Print encode+decode time and size of one response per codec"""
+    response = [
+        {"ride_id": f"ride-{i:08x}", "rider": "rider0", "driver": f"driver{i % 50}",
+         "pickup": f"Zone {i % 10}", "dropoff": "Airport", "status": "COMPLETED",
+         "fare": 243.5 + i, "version": 4, "created_at": 1760000000.0 + i,
+         "vector_clock": {"0": i, "1": i // 2, "2": i // 3}}
+        for i in range(rides)
+    ]
+
+    codecs = [("xmlrpc", lambda r: xmlrpc.client.dumps((r,), methodresponse=True, allow_none=True).encode(),
+               lambda data: xmlrpc.client.loads(data)[0][0])]
+    for name, dumps, loads in frame_rpc.CODECS.values():
+        if name == "msgpack" and frame_rpc.msgpack is None:
+            print("  (msgpack not installed, skipped)")
+            continue
+        codecs.append((name, dumps, loads))
+
+    print(f"Serialization of a {rides}-ride get_user_rides response, encode+decode:")
+    for name, dumps, loads in codecs:
+        data = dumps(response)
+        start = time.perf_counter()
+        for _ in range(iterations):
+            loads(dumps(response))
+        elapsed = (time.perf_counter() - start) / iterations
+        print(f"  {name:8s} {elapsed * 1e6:9.1f} us  {len(data):7,} bytes")
+
+
+def _run_clients(clients, seconds, make_worker):
+    """Run client threads for a while and collect per-call latencies"""
+    stop = threading.Event()
+    latencies = [[] for _ in range(clients)]
+    threads = [threading.Thread(target=make_worker(i, stop, latencies[i])) for i in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    samples = [s for per_client in latencies for s in per_client]
+    return len(samples) / elapsed, samples
+
+
+def _report(label, throughput, samples):
+    print(f"  {label:30s} {throughput:9,.0f} calls/s  p50={_percentile(samples, 50) * 1e3:6.2f} ms  "
+          f"p99={_percentile(samples, 99) * 1e3:6.2f} ms")
+
+
+def throughput(port, ride_id, clients, seconds, window):
+    """Compare the transports against one server listening on port (XML-RPC) and port + offset (frames)"""
+    host = settings.SERVER_HOST
+    frame_port = port + settings.FRAME_PORT_OFFSET
+
+    def xmlrpc_worker(index, stop, samples):
+        def work():
+            proxy = xmlrpc.client.ServerProxy(f"http://{host}:{port}{settings.RPC_PATH}", allow_none=True)
+            while not stop.is_set():
+                start = time.perf_counter()
+                proxy.get_ride_status(ride_id)
+                samples.append(time.perf_counter() - start)
+        return work
+
+    shared = FrameRPCClient(host, frame_port, settings.RPC_CODEC)
+
+    def frame_worker(index, stop, samples):
+        def work():
+            while not stop.is_set():
+                start = time.perf_counter()
+                shared.get_ride_status(ride_id)
+                samples.append(time.perf_counter() - start)
+        return work
+
+    def pipelined_worker(index, stop, samples):
+        def work():
+            client = FrameRPCClient(host, frame_port, settings.RPC_CODEC)
+            in_flight = deque()
+            while not stop.is_set() or in_flight:
+                while not stop.is_set() and len(in_flight) < window:
+                    in_flight.append((time.perf_counter(), client.call_async("get_ride_status", ride_id)))
+                sent, future = in_flight.popleft()
+                future.result(settings.REQUEST_TIMEOUT)
+                samples.append(time.perf_counter() - sent)
+            client.close()
+        return work
+
+    _report("XML-RPC", *_run_clients(clients, seconds, xmlrpc_worker))
+    _report("frame, shared connection", *_run_clients(clients, seconds, frame_worker))
+    _report(f"frame, pipelined x{window}", *_run_clients(clients, seconds, pipelined_worker))
+    shared.close()
+
+
+def _lb_worker(transport, lb_port, ride_id):
+    """Client worker calling the load balancer with a transport"""
+    def make(index, stop, samples):
+        def work():
+            if transport == "frame":
+                proxy = FrameRPCClient(settings.SERVER_HOST, lb_port + settings.FRAME_PORT_OFFSET, settings.RPC_CODEC)
+            else:
+                proxy = xmlrpc.client.ServerProxy(f"http://{settings.SERVER_HOST}:{lb_port}{settings.RPC_PATH}",
+                                                  allow_none=True)
+            while not stop.is_set():
+                start = time.perf_counter()
+                proxy.get_ride_status(ride_id)
+                samples.append(time.perf_counter() - start)
+        return work
+    return make
+
+
+def main():
+    parser = argparse.ArgumentParser(description='RPC transport benchmark')
+    parser.add_argument('--seconds', type=float, default=3, help='Duration of each throughput run')
+    parser.add_argument('--clients', type=int, default=8, help='Concurrent client threads')
+    parser.add_argument('--window', type=int, default=16, help='Calls in flight per pipelined client')
+    parser.add_argument('--rides', type=int, default=50, help='Rides in the serialized response')
+    parser.add_argument('--iterations', type=int, default=2000, help='Serialization rounds per codec')
+    args = parser.parse_args()
+
+    serialization(args.rides, args.iterations)
+
+    _, service, port = start_backend(0)
+    ride_id = service.book_cab("rider0", "Zone 1", "Airport")["ride_id"]
+    print(f"\nget_ride_status against one backend, {args.clients} clients:")
+    throughput(port, ride_id, args.clients, args.seconds, args.window)
+
+    # Through the load balancer; it talks to backends with the transport under test
+    backends = [port] + [start_backend(i)[2] for i in (1, 2)]
+    for transport in ("xmlrpc", "frame"):
+        settings.RPC_TRANSPORT = transport
+        server, _, _ = start_load_balancer(backends)
+        lb_port = server.server_address[1]
+        label = "XML-RPC" if transport == "xmlrpc" else "frame"
+        print(f"\nThrough the load balancer, {label} on both hops:")
+        rate, samples = _run_clients(args.clients, args.seconds, _lb_worker(transport, lb_port, ride_id))
+        _report(label, rate, samples)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Benchmark for read latency under a write-heavy booking burst, with readers
+served from published snapshots (LOCK_FREE_READS) and behind the service lock.
+
+Writers book and cancel rides against an in-process CabService whose peers
+are simulated with a fixed replication delay, so every write holds the lock
+for about as long as a synchronous replication round would.
+
+Usage:
+    python benchmarks/bench_snapshot_reads.py --seconds 5 --writers 4 --readers 4
+"""
+
+import argparse
+import logging
+import os
+import random
+import sys
+import threading
+import time
+
+# Add the parent directory to sys.path to allow relative imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import settings
+
+settings.USE_PERSISTENT_STORAGE = False
+settings.REPLICATION_MODE = "synchronous"
+
+from services.cab_service import CabService
+
+
+class SlowPeer:
+    """Stand-in for a peer server that acknowledges replication after a delay"""
+    def __init__(self, delay):
+        self.delay = delay
+
+    def __getattr__(self, name):
+        def replicate(*args):
+            time.sleep(self.delay)
+            return {"success": True}
+        return replicate
+
+
+def _percentile(samples, pct):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+def run_once(service, lock_free, seconds, writers, readers, ride_ids):
+    settings.LOCK_FREE_READS = lock_free
+    stop = threading.Event()
+    latencies = {"get_ride_status": [], "get_available_cabs": [], "get_server_stats": []}
+    writes = [0]
+
+    def writer(index):
+        rng = random.Random(index)
+        while not stop.is_set():
+            result = service.book_cab(f"rider{rng.randrange(100)}", f"Zone {rng.randrange(50)}", "Airport")
+            service.cancel_ride(result["ride_id"])
+            writes[0] += 2
+
+    def reader(index):
+        rng = random.Random(100 + index)
+        calls = [
+            ("get_ride_status", lambda: service.get_ride_status(rng.choice(ride_ids))),
+            ("get_available_cabs", lambda: service.get_available_cabs("Airport")),
+            ("get_server_stats", lambda: service.get_server_stats()),
+        ]
+        while not stop.is_set():
+            name, call = rng.choice(calls)
+            start = time.perf_counter()
+            call()
+            latencies[name].append(time.perf_counter() - start)
+            time.sleep(0.001)
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    threads += [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    mode = "snapshots (lock-free)" if lock_free else "service lock"
+    print(f"\n--- Reads via {mode}: {writes[0] / seconds:,.0f} writes/s ---")
+    for name, samples in latencies.items():
+        print(f"{name:20s} n={len(samples):6,}  p50={_percentile(samples, 50) * 1e3:7.3f} ms  "
+              f"p99={_percentile(samples, 99) * 1e3:7.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Snapshot read latency benchmark')
+    parser.add_argument('--seconds', type=float, default=5, help='Duration of each run')
+    parser.add_argument('--writers', type=int, default=4, help='Booking writer threads')
+    parser.add_argument('--readers', type=int, default=4, help='Status polling reader threads')
+    parser.add_argument('--replication-delay', type=float, default=0.002, help='Simulated peer ack delay in seconds')
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    service = CabService(0, is_leader=True)
+    service.peers = {port: SlowPeer(args.replication_delay) for port in (1, 2)}
+
+    for i in range(100):
+        service.register_user(f"rider{i}", "pass", "RIDER")
+    for i in range(200):
+        service.register_user(f"driver{i}", "pass", "DRIVER")
+        service.set_driver_available(f"driver{i}", f"Zone {i % 50}", True)
+    ride_ids = [service.book_cab(f"rider{i}", "Airport", "Downtown")["ride_id"] for i in range(100)]
+
+    run_once(service, False, args.seconds, args.writers, args.readers, ride_ids)
+    run_once(service, True, args.seconds, args.writers, args.readers, ride_ids)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Benchmark for the surge pricing engine: a paced stream of booking and driver
+availability events at a target rate, with the recompute loop and lock-free
+fare reads running alongside.
+
+Usage:
+    python benchmarks/bench_surge_pricing.py --rate 10000 --seconds 10
+"""
+
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+# Add the parent directory to sys.path to allow relative imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from util.surge_pricing import SurgePricingEngine
+
+
+def _percentile(samples, pct):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+def run(rate, seconds, zones, drivers, recompute_interval):
+    engine = SurgePricingEngine(window=60, buckets=12)
+    rng = random.Random(42)
+    # A few hot zones take most of the demand
+    hot_zones = list(range(zones // 50 or 1))
+
+    stop = threading.Event()
+    recompute_times = []
+    read_latencies = []
+
+    def recompute_loop():
+        while not stop.is_set():
+            start = time.perf_counter()
+            engine.recompute()
+            recompute_times.append(time.perf_counter() - start)
+            stop.wait(recompute_interval)
+
+    def reader_loop():
+        reader_rng = random.Random(7)
+        while not stop.is_set():
+            start = time.perf_counter()
+            engine.multiplier(reader_rng.randrange(zones))
+            read_latencies.append(time.perf_counter() - start)
+            time.sleep(0.0005)
+
+    threads = [threading.Thread(target=recompute_loop), threading.Thread(target=reader_loop)]
+    for thread in threads:
+        thread.start()
+
+    update_latencies = []
+    events = 0
+    batch = max(1, rate // 1000)  # pace in 1 ms steps
+    start_time = time.perf_counter()
+    deadline = start_time + seconds
+    next_step = start_time
+    while time.perf_counter() < deadline:
+        for _ in range(batch):
+            start = time.perf_counter()
+            if rng.random() < 0.7:
+                zone = rng.choice(hot_zones) if rng.random() < 0.5 else rng.randrange(zones)
+                engine.record_request(zone)
+            else:
+                engine.update_driver(f"driver{rng.randrange(drivers)}", rng.randrange(zones), rng.random() < 0.8)
+            update_latencies.append(time.perf_counter() - start)
+            events += 1
+        next_step += 0.001
+        delay = next_step - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+    elapsed = time.perf_counter() - start_time
+
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    surging = engine.recompute()
+    print(f"Target rate:            {rate:,} events/s over {seconds}s")
+    print(f"Achieved rate:          {events / elapsed:,.0f} events/s")
+    print(f"Update p50/p99:         {_percentile(update_latencies, 50) * 1e6:.1f} / "
+          f"{_percentile(update_latencies, 99) * 1e6:.1f} us")
+    print(f"Multiplier read p99:    {_percentile(read_latencies, 99) * 1e6:.2f} us "
+          f"({len(read_latencies):,} reads)")
+    print(f"Recompute p50/max:      {_percentile(recompute_times, 50) * 1e3:.2f} / "
+          f"{max(recompute_times) * 1e3:.2f} ms over {zones:,} zones")
+    print(f"Zones surging:          {len(surging):,} (max x{max(surging.values(), default=1.0):.2f})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Surge pricing benchmark')
+    parser.add_argument('--rate', type=int, default=10_000, help='Target events per second')
+    parser.add_argument('--seconds', type=float, default=10, help='Benchmark duration')
+    parser.add_argument('--zones', type=int, default=5_000, help='Number of zones')
+    parser.add_argument('--drivers', type=int, default=20_000, help='Number of drivers')
+    parser.add_argument('--interval', type=float, default=1.0, help='Recompute interval in seconds')
+    args = parser.parse_args()
+    run(args.rate, args.seconds, args.zones, args.drivers, args.interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Benchmark for the expiry timing wheel with a large number of pending timers:
+schedule, heartbeat re-schedule, cancel and batched expiry.
+
+With --check it instead checks that every timer fires on exactly the tick
+its delay ends, for wheels of one to four levels with delays far beyond
+their span, and exits non-zero if one fires early, late or not at all.
+
+Usage:
+    python benchmarks/bench_timing_wheel.py --timers 1000000
+    python benchmarks/bench_timing_wheel.py --check
+"""
+
+import argparse
+import math
+import os
+import random
+import sys
+import time
+
+# Add the parent directory to sys.path to allow relative imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from util.timing_wheel import TimingWheel
+
+
+def run(timer_count, max_delay):
+    # A simulated clock lets the benchmark turn hours of wheel time in seconds
+    now = [0.0]
+    wheel = TimingWheel(tick=1.0, clock=lambda: now[0])
+    rng = random.Random(42)
+    delays = [rng.uniform(1, max_delay) for _ in range(timer_count)]
+
+    start = time.perf_counter()
+    for i, delay in enumerate(delays):
+        wheel.schedule(("ride", i), delay)
+    schedule_time = time.perf_counter() - start
+
+    # A tenth of the timers get a heartbeat, another tenth are cancelled
+    touched = rng.sample(range(timer_count), timer_count // 5)
+    heartbeats, cancels = touched[:len(touched) // 2], touched[len(touched) // 2:]
+    start = time.perf_counter()
+    for i in heartbeats:
+        wheel.schedule(("ride", i), rng.uniform(1, max_delay))
+    for i in cancels:
+        wheel.cancel(("ride", i))
+    update_time = time.perf_counter() - start
+
+    pending = len(wheel)
+    expired = 0
+    batches = 0
+    start = time.perf_counter()
+    while len(wheel):
+        now[0] += 1.0
+        batch = wheel.advance()
+        if batch:
+            expired += len(batch)
+            batches += 1
+    expire_time = time.perf_counter() - start
+
+    print(f"Pending timers:         {timer_count:,}")
+    print(f"Schedule:               {schedule_time / timer_count * 1e6:.2f} us/op")
+    print(f"Re-schedule + cancel:   {update_time / len(touched) * 1e6:.2f} us/op")
+    print(f"Expired:                {expired:,} of {pending:,} in {batches:,} batches "
+          f"over {int(now[0]):,} ticks")
+    print(f"Expiry:                 {expire_time / max(expired, 1) * 1e6:.2f} us/timer "
+          f"({expire_time:.2f}s total)")
+
+
+def check(levels, wheel_size, timer_count, max_delay):
+    """
+    Schedule, re-schedule and cancel timers on a simulated clock and compare
+    the tick each fires on with the tick its delay ends
+
+    Returns:
+        int: Timers that fired early, late or never
+    """
+    now = [0.0]
+    wheel = TimingWheel(tick=1.0, wheel_size=wheel_size, levels=levels, clock=lambda: now[0])
+    rng = random.Random(levels)
+    due = {}  # key -> tick it must fire on
+    for i in range(timer_count):
+        delay = rng.uniform(0.5, max_delay)
+        wheel.schedule(i, delay)
+        due[i] = max(math.ceil(delay), 1)
+
+    wrong = 0
+    while len(wheel):
+        now[0] += 1.0
+        tick = int(now[0])
+        for key in wheel.advance():
+            wrong += due.pop(key) != tick
+        # Move or cancel a few pending timers as the wheel turns
+        if tick % 7 == 0 and due:
+            key = rng.choice(list(due))
+            if rng.random() < 0.5:
+                delay = rng.uniform(0.5, max_delay)
+                wheel.schedule(key, delay)
+                due[key] = tick + max(math.ceil(delay), 1)
+            else:
+                wheel.cancel(key)
+                del due[key]
+    wrong += len(due)
+
+    print(f"  levels={levels} wheel_size={wheel_size} span={wheel_size ** levels:,} ticks  "
+          f"{timer_count:,} timers up to {max_delay:,.0f} ticks  wrong {wrong}")
+    return wrong
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Timing wheel benchmark')
+    parser.add_argument('--timers', type=int, default=1_000_000, help='Number of pending timers')
+    parser.add_argument('--max-delay', type=float, default=3600, help='Maximum timer delay in seconds')
+    parser.add_argument('--check', action='store_true', help='Check expiry ticks instead of timing')
+    args = parser.parse_args()
+    if not args.check:
+        run(args.timers, args.max_delay)
+        return
+
+    print("Timers firing on the tick their delay ends:")
+    wrong = sum(check(levels, 8, 2000, 3 * 8 ** 4) for levels in range(1, 5))
+    if wrong:
+        print("FAIL: timers fired early, late or never")
+        sys.exit(1)
+    print("OK: every timer fired on time")
+
+
+if __name__ == "__main__":
+    main()
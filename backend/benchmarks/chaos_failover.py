@@ -0,0 +1,115 @@
+"""
+Chaos check for load balancer failover: a backend is killed mid-load.
+
+Three backends run in child processes behind an in-process load balancer.
+Clients send a mix of reads (get_available_cabs, get_user_rides) and
+bookings for --seconds; after --kill-at seconds one backend is killed with
+SIGKILL. The client-visible error rate is reported with retries off
+(LB_RETRIES = 0, the old behaviour) and on, along with the load balancer's
+retry counters.
+
+Usage:
+    python benchmarks/chaos_failover.py --seconds 10 --kill-at 4 --clients 8
+"""
+
+import argparse
+import logging
+import multiprocessing
+import os
+import random
+import signal
+import sys
+import threading
+import time
+import xmlrpc.client
+
+# Add the parent directory to sys.path to allow relative imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.local_cluster import start_backend, start_load_balancer
+from config import settings
+
+logging.disable(logging.CRITICAL)  # the load balancer logs every failed call
+
+
+def _backend(server_id, ports):
+    """Child process: run one backend until killed"""
+    _, _, port = start_backend(server_id)
+    ports.put((server_id, port))
+    while True:
+        time.sleep(60)
+
+
+def _client(url, deadline, kill_time, seed, outcome, lock):
+    proxy = xmlrpc.client.ServerProxy(url, allow_none=True)
+    rng = random.Random(seed)
+    while time.perf_counter() < deadline:
+        roll = rng.random()
+        try:
+            if roll < 0.4:
+                proxy.get_available_cabs(f"Zone {rng.randrange(10)}")
+            elif roll < 0.8:
+                proxy.get_user_rides(f"rider{rng.randrange(20)}")
+            else:
+                proxy.book_cab(f"rider{rng.randrange(20)}", f"Zone {rng.randrange(10)}", "Airport")
+            failed = False
+        except (OSError, xmlrpc.client.Error):
+            failed = True
+        phase = "after" if time.perf_counter() >= kill_time else "before"
+        with lock:
+            outcome[phase][0] += 1
+            outcome[phase][1] += failed
+
+
+def run(args, retries):
+    settings.LB_RETRIES = retries
+    ports = multiprocessing.Queue()
+    backends = [multiprocessing.Process(target=_backend, args=(i, ports), daemon=True) for i in range(3)]
+    for backend in backends:
+        backend.start()
+    backend_ports = dict(ports.get(timeout=60) for _ in backends)
+    _, balancer, url = start_load_balancer([backend_ports[i] for i in range(len(backends))])
+
+    outcome = {"before": [0, 0], "after": [0, 0]}  # phase -> [calls, errors]
+    lock = threading.Lock()
+    start = time.perf_counter()
+    deadline = start + args.seconds
+    kill_time = start + args.kill_at
+    clients = [threading.Thread(target=_client, args=(url, deadline, kill_time, i, outcome, lock))
+               for i in range(args.clients)]
+    for client in clients:
+        client.start()
+
+    time.sleep(args.kill_at)
+    os.kill(backends[-1].pid, signal.SIGKILL)
+
+    for client in clients:
+        client.join()
+    for backend in backends[:-1]:
+        backend.terminate()
+
+    label = f"LB_RETRIES={retries}"
+    for phase, (calls, errors) in outcome.items():
+        print(f"  {label:13s} {phase:6s} kill: {calls:6,} calls  {errors:5,} errors  "
+              f"({errors / max(calls, 1) * 100:5.2f}%)")
+        label = ""
+    stats = balancer.retry_stats
+    print(f"  {'':13s} retries {stats['retries']:,}  failovers {stats['failovers']:,}  "
+          f"recovered {stats['recovered']:,}  budget exhausted {stats['budget_exhausted']:,}  "
+          f"deadline exceeded {stats['deadline_exceeded']:,}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Client error rate when a backend is killed mid-load')
+    parser.add_argument('--seconds', type=float, default=10, help='Duration of each run')
+    parser.add_argument('--kill-at', type=float, default=4, help='Seconds into the run the backend is killed')
+    parser.add_argument('--clients', type=int, default=8, help='Concurrent clients')
+    args = parser.parse_args()
+
+    print(f"3 backends, one killed after {args.kill_at:g} s of {args.seconds:g} s, {args.clients} clients:")
+    for retries in (0, settings.LB_RETRIES):
+        run(args, retries)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Chaos check for idempotent retries of book_cab through the load balancer.
+
+Two backends run behind a load balancer whose backend calls time out after
+--timeout seconds. Faults are injected after a booking has been committed
+and before it is answered: some bookings stall past the load balancer's
+timeout (the load balancer retries them), a few stall past its retry too
+(the client sees an error and retries the same key itself). Each client
+booking carries its own idempotency key and is retried until it succeeds.
+
+At the end the distinct rides on all backends are counted. With
+idempotency keys there must be exactly one ride per booking; with
+--without-keys each client retry is a new call and the duplicates it
+creates are reported. Exits non-zero if a duplicate ride is found in keyed
+mode. With --replication the backends replicate synchronously to each
+other, so a retry that lands on another backend finds the replicated
+response.
+
+Usage:
+    python benchmarks/chaos_idempotency.py --bookings 300 --clients 8
+    python benchmarks/chaos_idempotency.py --bookings 300 --clients 8 --replication
+"""
+
+import argparse
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+import xmlrpc.client
+from collections import Counter
+
+# Add the parent directory to sys.path to allow relative imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.local_cluster import start_backend, start_load_balancer, connect_peers
+from config import settings
+
+logging.disable(logging.CRITICAL)  # the load balancer logs every injected timeout
+
+
+def inject_faults(service, timeout, slow, stalled, seed):
+    """
+    Stall some bookings of a backend after they are committed: `slow` of
+    them past one load balancer timeout, `stalled` past its retry as well
+    """
+    rng = random.Random(seed)
+    replicate = service._replicate_operation
+
+    def faulty_replicate(operation, params):
+        replicate(operation, params)
+        if operation == "book_ride":
+            roll = rng.random()
+            if roll < stalled:
+                time.sleep(timeout * (settings.LB_RETRIES + 2))
+            elif roll < stalled + slow:
+                time.sleep(timeout * 1.5)
+
+    service._replicate_operation = faulty_replicate
+
+
+def _client(url, bookings, with_keys, outcome, lock):
+    proxy = xmlrpc.client.ServerProxy(url, allow_none=True)
+    while True:
+        with lock:
+            if not bookings:
+                return
+            rider = bookings.pop()
+        key = uuid.uuid4().hex if with_keys else None
+        pickup = f"Zone {random.randrange(10)}"  # a retry repeats the booking's params with its key
+        for attempt in range(20):
+            try:
+                result = proxy.book_cab(rider, pickup, "Airport", None, key)
+            except (OSError, xmlrpc.client.Error) as e:
+                with lock:
+                    outcome["errors"][type(e).__name__] += 1
+                time.sleep(min(0.05 * 2 ** attempt, 1.0))  # back off, as a client turned away busy should
+                continue
+            with lock:
+                outcome["ride_ids"].append(result["ride_id"])
+                outcome["replayed"] += bool(result.get("replayed"))
+            break
+        else:
+            with lock:
+                outcome["gave_up"] += 1
+
+
+def run(args, with_keys):
+    settings.REPLICATION_MODE = "synchronous" if args.replication else "none"
+    nodes = [start_backend(i, riders=args.bookings, drivers=20) for i in range(2)]
+    if args.replication:
+        connect_peers(nodes)
+    for _, service, _ in nodes:
+        service.idempotency.wait_timeout = None  # a retry waits for the call it repeats
+        inject_faults(service, args.timeout, args.slow, args.stalled, service.server_id)
+
+    settings.REQUEST_TIMEOUT = args.timeout
+    _, balancer, url = start_load_balancer([port for _, _, port in nodes])
+
+    outcome = {"ride_ids": [], "replayed": 0, "gave_up": 0, "errors": Counter()}
+    lock = threading.Lock()
+    bookings = [f"rider{i}" for i in range(args.bookings)]
+    start = time.perf_counter()
+    clients = [threading.Thread(target=_client, args=(url, bookings, with_keys, outcome, lock))
+               for _ in range(args.clients)]
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    elapsed = time.perf_counter() - start
+
+    # Stalled calls may still be finishing on the backends
+    time.sleep(args.timeout * (settings.LB_RETRIES + 2))
+    # Replicated rides are on every backend, so rides are counted by id
+    riders = {ride_id: ride.rider_name for _, service, _ in nodes for ride_id, ride in list(service.rides.items())}
+    rides = Counter(riders.values())
+    booked = len(outcome["ride_ids"])
+    duplicates = sum(count - 1 for count in rides.values() if count > 1)
+    errors = ", ".join(f"{name} {count}" for name, count in outcome["errors"].most_common()) or "none"
+
+    print(f"{'With' if with_keys else 'Without'} idempotency keys ({elapsed:.1f} s):")
+    print(f"  bookings answered {booked:,}  distinct ride ids {len(set(outcome['ride_ids'])):,}  "
+          f"replayed {outcome['replayed']:,}  gave up {outcome['gave_up']}")
+    print(f"  client-visible errors: {errors}")
+    print(f"  rides on backends {sum(rides.values()):,}  riders with duplicate rides "
+          f"{sum(count > 1 for count in rides.values())}  duplicate rides {duplicates:,}")
+    return duplicates
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Duplicate rides under injected timeouts, with and without keys')
+    parser.add_argument('--bookings', type=int, default=300, help='Bookings, one per rider')
+    parser.add_argument('--clients', type=int, default=8, help='Concurrent clients')
+    parser.add_argument('--timeout', type=float, default=0.3, help='Load balancer timeout for backend calls')
+    parser.add_argument('--slow', type=float, default=0.1, help='Fraction of bookings stalled past one timeout')
+    parser.add_argument('--stalled', type=float, default=0.03,
+                        help='Fraction of bookings stalled past the load balancer retry too')
+    parser.add_argument('--without-keys', action='store_true', help='Also run with retries that carry no key')
+    parser.add_argument('--replication', action='store_true', help='Backends replicate synchronously to each other')
+    args = parser.parse_args()
+
+    duplicates = run(args, with_keys=True)
+    if args.without_keys:
+        run(args, with_keys=False)
+
+    if duplicates:
+        print("FAIL: duplicate rides with idempotency keys")
+        sys.exit(1)
+    print("OK: one ride per booking")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""
+Correctness check for replication into a multi-process cab server, and for
+its per-partition matching.
+
+Two multi-process cab servers replicate to each other synchronously: server
+0 with two partitions, server 1 with three, so a ride or zone maps to
+different partition indexes on the two servers. Calls on server 0 are read
+back on server 1, where each replicated operation must have been applied on
+the partition that owns its ride or zone. The script checks that:
+
+- a booking, its cancellation and a registration reach server 1 and are
+  found there through the partition router;
+- a driver moved to a zone of another partition is available exactly once
+  on both servers, in the new zone;
+- a replicate call without the peers' REPLICATION_TOKEN is refused;
+- matching stays within a partition, as documented in
+  services.multiprocess_server: a ride picked up in a zone whose partition
+  has no available driver stays REQUESTED, and a driver available in
+  another partition cannot accept it.
+
+Exits non-zero if a check fails.
+
+Usage:
+    python benchmarks/check_partitions.py
+"""
+
+import logging
+import os
+import socket
+import sys
+import tempfile
+import time
+import xmlrpc.client
+
+# Add the parent directory to sys.path to allow relative imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import settings
+
+settings.USE_PERSISTENT_STORAGE = False
+settings.REPLICATION_MODE = "synchronous"
+settings.SERVER_COUNT = 2
+settings.SERVER_HOST = "127.0.0.1"
+settings.PARTITION_SOCKET_DIR = tempfile.mkdtemp(prefix="cab-partitions-")
+
+from services.multiprocess_server import MultiProcessCabServer
+from util.location_catalog import normalize_location
+from util.partitioning import zone_partition
+
+logging.disable(logging.CRITICAL)
+
+PROCESSES = [2, 3]  # partitions of server 0 and server 1
+
+failures = []
+
+
+def check(name, ok):
+    print(f"  {'ok  ' if ok else 'FAIL'} {name}")
+    if not ok:
+        failures.append(name)
+
+
+def _free_port_pair():
+    """A port whose next port is free too (server 1 listens on BASE_SERVER_PORT + 1)"""
+    while True:
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        try:
+            with socket.socket() as sock:
+                sock.bind(("127.0.0.1", port + 1))
+            return port
+        except OSError:
+            continue
+
+
+def _wait_ready(proxy, processes):
+    """Wait until every partition answers (a merged call touches all of them)"""
+    for _ in range(300):
+        try:
+            if proxy.get_server_stats()["stats"]["partitions"] == processes:
+                return
+        except Exception:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError("Server did not start")
+
+
+def _zone(*partitions):
+    """A zone owned by partitions[i] on server i (None: any partition)"""
+    for i in range(1000):
+        zone = f"Check Zone {i}"
+        if all(p is None or zone_partition(zone, count) == p for p, count in zip(partitions, PROCESSES)):
+            return zone
+    raise RuntimeError("No zone found")
+
+
+def _available(proxy, driver):
+    """Locations the driver is listed available at, one per partition listing them"""
+    drivers = proxy.get_available_cabs("Airport")["available_drivers"]
+    return [normalize_location(d["location"]) for d in drivers if d["username"] == driver]
+
+
+def check_replication(origin, follower):
+    """Writes on server 0 are found on server 1, applied on the partitions owning them"""
+    origin.register_user("check_rider", "pass", "RIDER")
+    origin.register_user("check_driver", "pass", "DRIVER")
+    check("registration replicated to every partition",
+          follower.register_user("check_rider", "pass", "RIDER")["message"] == "Username already exists"
+          and all(follower.book_cab("check_rider", _zone(None, p), "Airport")["success"]
+                  for p in range(PROCESSES[1])))
+
+    ride_ids = [origin.book_cab("check_rider", f"Booking Zone {i}", "Airport")["ride_id"] for i in range(12)]
+    found = [follower.get_ride_status(ride_id) for ride_id in ride_ids]
+    check("replicated bookings found through the router", all(r["success"] for r in found))
+
+    for ride_id in ride_ids:
+        origin.cancel_ride(ride_id)
+    statuses = [follower.get_ride_status(ride_id).get("ride_info", {}).get("status") for ride_id in ride_ids]
+    check("replicated cancellations applied to the same rides", statuses == ["CANCELLED"] * len(ride_ids))
+
+    # Zones owned by different partitions on both servers
+    first, second = _zone(0, 0), _zone(1, 1)
+    origin.set_driver_available("check_driver", first, True)
+    origin.set_driver_available("check_driver", second, True)
+    check("moved driver available once, in the new zone, on server 0",
+          _available(origin, "check_driver") == [normalize_location(second)])
+    check("moved driver available once, in the new zone, on server 1",
+          _available(follower, "check_driver") == [normalize_location(second)])
+    origin.set_driver_available("check_driver", second, False)
+    check("driver made unavailable on every partition of server 1", _available(follower, "check_driver") == [])
+
+    forged = follower.replicate("set_driver_available",
+                                {"driver_name": "check_driver", "location": second, "is_available": True})
+    check("replication without the peers' token refused",
+          not forged["success"] and _available(follower, "check_driver") == [])
+
+
+def check_matching(origin):
+    """A ride is matched only with drivers available in its own partition"""
+    origin.register_user("lone_driver", "pass", "DRIVER")
+    driver_zone, pickup = _zone(0), _zone(1)
+    # Server 0's sample drivers are available in both partitions; take the other partition's out
+    for driver in origin.get_available_cabs(pickup)["available_drivers"]:
+        origin.set_driver_available(driver["username"], driver_zone, False)
+    origin.set_driver_available("lone_driver", driver_zone, True)
+
+    ride = origin.book_cab("check_rider", pickup, "Airport")
+    status = origin.get_ride_status(ride["ride_id"])["ride_info"]
+    check("ride in a partition without drivers stays REQUESTED",
+          status["status"] == "REQUESTED" and not status.get("driver_name"))
+    accepted = origin.accept_ride(ride["ride_id"], "lone_driver")
+    check("driver of another partition cannot accept it", not accepted["success"])
+
+    origin.set_driver_available("lone_driver", pickup, True)
+    check("once in the ride's partition the driver can accept it",
+          origin.accept_ride(ride["ride_id"], "lone_driver")["success"])
+
+
+def main():
+    settings.BASE_SERVER_PORT = _free_port_pair()
+    servers = [MultiProcessCabServer(i, processes) for i, processes in enumerate(PROCESSES)]
+    for server in servers:
+        server.start()
+    proxies = [xmlrpc.client.ServerProxy(f"http://127.0.0.1:{server.port}{settings.RPC_PATH}", allow_none=True)
+               for server in servers]
+    try:
+        for proxy, processes in zip(proxies, PROCESSES):
+            _wait_ready(proxy, processes)
+        print(f"Replication from a {PROCESSES[0]}-partition server to a {PROCESSES[1]}-partition server:")
+        check_replication(*proxies)
+        print("Matching within a partition:")
+        check_matching(proxies[0])
+    finally:
+        for server in servers:
+            server.stop()
+    if failures:
+        print(f"FAIL: {len(failures)} checks failed")
+        sys.exit(1)
+    print("OK: replicated operations land on their owning partitions; matching stays within a partition")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Read-after-write check through the load balancer.
+
+Three backends run behind a load balancer with leader routing, once per
+replication mode. Each client books a ride, reads it back with
+get_ride_status, cancels it and reads it again, each call through the load
+balancer right after the previous one was answered. A read that does not
+find the ride, or finds it not yet cancelled, is a stale read. With
+synchronous replication reads may go to the followers, which have every
+acknowledged write; with asynchronous replication or none they must stay
+on the leader. Exits non-zero if any read is stale.
+
+Usage:
+    python benchmarks/check_read_after_write.py --rides 200 --clients 8
+    python benchmarks/check_read_after_write.py --modes synchronous
+"""
+
+import argparse
+import logging
+import os
+import sys
+import threading
+import time
+import xmlrpc.client
+from collections import Counter
+
+# Add the parent directory to sys.path to allow relative imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.local_cluster import start_backend, start_load_balancer, connect_peers
+from config import settings
+from util.worker_pool import BUSY_STATUS
+
+logging.disable(logging.CRITICAL)
+
+
+def _percentile(samples, pct):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+def _call(proxy, method, *params):
+    """Call through the load balancer, retrying calls it turned away busy"""
+    while True:
+        try:
+            return getattr(proxy, method)(*params)
+        except xmlrpc.client.Fault as e:
+            if e.faultCode != BUSY_STATUS:
+                raise
+            time.sleep(0.01)
+
+
+def _client(url, riders, outcome, lock):
+    proxy = xmlrpc.client.ServerProxy(url, allow_none=True)
+    while True:
+        with lock:
+            if not riders:
+                return
+            rider = riders.pop()
+        start = time.perf_counter()
+        ride_id = _call(proxy, "book_cab", rider, f"Zone {len(riders) % 10}", "Airport")["ride_id"]
+        booked = _call(proxy, "get_ride_status", ride_id)
+        _call(proxy, "cancel_ride", ride_id)
+        cancelled = _call(proxy, "get_ride_status", ride_id)
+        latency = time.perf_counter() - start
+        with lock:
+            outcome["latencies"].append(latency)
+            if not booked["success"]:
+                outcome["stale"]["booking not found"] += 1
+            if not cancelled["success"] or cancelled["ride_info"]["status"] != "CANCELLED":
+                outcome["stale"]["cancellation not seen"] += 1
+
+
+def run(mode, rides, clients):
+    settings.REPLICATION_MODE = mode
+    nodes = [start_backend(i, riders=rides) for i in range(3)]
+    if mode != "none":
+        connect_peers(nodes)
+    _, balancer, url = start_load_balancer([port for _, _, port in nodes])
+
+    outcome = {"latencies": [], "stale": Counter()}
+    lock = threading.Lock()
+    riders = [f"rider{i}" for i in range(rides)]
+    workers = [threading.Thread(target=_client, args=(url, riders, outcome, lock)) for _ in range(clients)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    stale = sum(outcome["stale"].values())
+    latencies = outcome["latencies"]
+    print(f"  {mode:<13} leader {balancer.leader}  rides {len(latencies):,}  "
+          f"p50={_percentile(latencies, 50) * 1e3:6.2f} ms  p99={_percentile(latencies, 99) * 1e3:6.2f} ms  "
+          f"stale reads {stale} {dict(outcome['stale']) if stale else ''}")
+    return stale
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stale reads after writes through the load balancer')
+    parser.add_argument('--rides', type=int, default=200, help='Rides booked and cancelled, one per rider')
+    parser.add_argument('--clients', type=int, default=8, help='Concurrent clients')
+    parser.add_argument('--modes', nargs='+', default=["none", "asynchronous", "synchronous"],
+                        choices=["none", "asynchronous", "synchronous"], help='Replication modes to check')
+    args = parser.parse_args()
+
+    print(f"book, read, cancel, read through the load balancer (leader routing "
+          f"{'on' if settings.LB_LEADER_ROUTING else 'off'}), {args.clients} clients:")
+    stale = sum(run(mode, args.rides, args.clients) for mode in args.modes)
+    if stale:
+        print("FAIL: reads missed writes acknowledged before them")
+        sys.exit(1)
+    print("OK: every read saw the writes before it")
+
+
+if __name__ == "__main__":
+    main()
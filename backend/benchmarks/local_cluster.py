@@ -0,0 +1,122 @@
+"""
+In-process cab servers and load balancer on free localhost ports, shared by
+the benchmarks that need real RPC round-trips. Every server listens for both
+XML-RPC and frame RPC (on port + FRAME_PORT_OFFSET). No MongoDB is needed and
+replication is off unless a benchmark turns it on and connects the backends
+with connect_peers; every backend starts with the same seeded users.
+"""
+
+import logging
+import os
+import sys
+import threading
+
+# Add the parent directory to sys.path to allow relative imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import settings
+
+settings.USE_PERSISTENT_STORAGE = False
+settings.REPLICATION_MODE = "none"
+settings.SERVER_HOST = "127.0.0.1"
+
+from services.cab_service import CabService, ThreadedXMLRPCServer, FrameServer, RequestHandler
+from services import load_balancer as lb_module
+from services.load_balancer import LoadBalancer
+from util.frame_rpc import FrameRPCServer
+from util.xmlrpc_transport import SharedServerProxy
+
+logging.disable(logging.INFO)
+
+
+def _serve(server):
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _bind_pair(make_xmlrpc_server, frame_server_class):
+    """
+    Bind an XML-RPC server on a free port and a frame server on that port +
+    FRAME_PORT_OFFSET, as the load balancer and rpc_proxy expect
+    """
+    while True:
+        server = make_xmlrpc_server(0)
+        try:
+            frame_server = frame_server_class(
+                (settings.SERVER_HOST, server.server_address[1] + settings.FRAME_PORT_OFFSET),
+                workers=settings.FRAME_RPC_WORKERS
+            )
+            return server, frame_server
+        except (OSError, OverflowError):
+            server.server_close()
+
+
+def start_backend(server_id=0, riders=20, drivers=50):
+    """
+    Start a CabService behind a threaded XML-RPC server
+
+    Returns:
+        tuple: (server, service, port)
+    """
+    service = CabService(server_id, is_leader=(server_id == 0))
+    service.peers = {}
+    for i in range(riders):
+        service.register_user(f"rider{i}", "pass", "RIDER")
+    for i in range(drivers):
+        service.register_user(f"driver{i}", "pass", "DRIVER")
+        service.set_driver_available(f"driver{i}", f"Zone {i % 10}", True)
+
+    server, frame_server = _bind_pair(
+        lambda port: ThreadedXMLRPCServer((settings.SERVER_HOST, port), requestHandler=RequestHandler,
+                                          allow_none=True, logRequests=False),
+        FrameServer
+    )
+    for rpc_server in (server, frame_server):
+        rpc_server.register_introspection_functions()
+        rpc_server.register_multicall_functions()
+        rpc_server.register_instance(service)
+        rpc_server.metrics = service.metrics
+        _serve(rpc_server)
+    return server, service, server.server_address[1]
+
+
+def connect_peers(nodes):
+    """Make backends replicate to each other (with REPLICATION_MODE other than "none")"""
+    for _, service, port in nodes:
+        service.peers = {
+            other: SharedServerProxy(f"http://{settings.SERVER_HOST}:{other}{settings.RPC_PATH}")
+            for _, _, other in nodes if other != port
+        }
+
+
+def start_load_balancer(ports, balancer_class=LoadBalancer):
+    """
+    Start a load balancer in front of backends
+
+    Returns:
+        tuple: (server, load balancer, url)
+    """
+    balancer = balancer_class(ports)
+    server, frame_server = _bind_pair(
+        lambda port: lb_module.ThreadedXMLRPCServer((settings.SERVER_HOST, port), allow_none=True,
+                                                    requestHandler=lb_module.MetricsRequestHandler,
+                                                    logRequests=False),
+        FrameRPCServer
+    )
+    for rpc_server in (server, frame_server):
+        rpc_server.register_introspection_functions()
+        rpc_server.register_instance(balancer)
+        _serve(rpc_server)
+    return server, balancer, f"http://{settings.SERVER_HOST}:{server.server_address[1]}{settings.RPC_PATH}"
+
+
+def start_cluster(backends=3):
+    """
+    Start backends and a load balancer in front of them
+
+    Returns:
+        tuple: (load balancer url, load balancer, list of (server, service, port))
+    """
+    nodes = [start_backend(i) for i in range(backends)]
+    _, balancer, url = start_load_balancer([port for _, _, port in nodes])
+    return url, balancer, nodes
@@ -0,0 +1,156 @@
+"""
+Replay of load balancer captures (LB_CAPTURE_PATH) against a cluster.
+
+The captured calls, merged from any number of capture files (rotated ones,
+or one per worker of a multi-process load balancer), are sent in the order
+they arrived with their original inter-arrival times divided by the speed
+factor. Sending is open-loop: a call is due at its scheduled time whether
+or not earlier calls have been answered, and its latency is measured from
+that time, so calls queued behind slow ones in the replayer count as slow
+rather than quietly thinning the load. Each speed is replayed in turn and
+reports the rate reached, the latency percentiles overall and per method,
+and the latency recorded at capture for comparison.
+
+The target is a running load balancer (--url), or a cluster started in
+this process (--local N backends) seeded with the users of local_cluster.
+Replayed writes change the target's state, so replay against a test
+cluster, not production.
+
+Usage:
+    LB_CAPTURE_PATH=logs/lb_capture.bin python services/load_balancer.py   # capture
+    python benchmarks/replay_capture.py logs/lb_capture.bin* --speed 1 2 4
+    python benchmarks/replay_capture.py logs/lb_capture.bin --local 3 --speed 1 10
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+import xmlrpc.client
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+# Add the parent directory to sys.path to allow relative imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import settings
+from util.traffic_capture import read_capture
+
+
+def _percentile(samples, pct):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+def load_calls(paths, limit=None):
+    """Captured calls of all files, in arrival order"""
+    calls = sorted((call for path in paths for call in read_capture(path)), key=lambda call: call.started)
+    return calls[:limit] if limit else calls
+
+
+class Replayer:
+    """Sends captured calls to a load balancer on their schedule and collects latencies"""
+
+    def __init__(self, url, concurrency):
+        self.url = url
+        self.concurrency = concurrency
+        self._proxies = threading.local()
+        self._lock = threading.Lock()
+
+    def _proxy(self):
+        proxy = getattr(self._proxies, "proxy", None)
+        if proxy is None:
+            proxy = self._proxies.proxy = xmlrpc.client.ServerProxy(self.url, allow_none=True)
+        return proxy
+
+    def _send(self, call, due, latencies, errors):
+        try:
+            getattr(self._proxy(), call.method)(*call.params)
+            failed = None
+        except Exception as e:
+            failed = type(e).__name__
+        latency = time.perf_counter() - due
+        with self._lock:
+            latencies[call.method].append(latency)
+            if failed:
+                errors[failed] += 1
+
+    def replay(self, calls, speed):
+        """
+        Replay calls at `speed` times their captured rate
+
+        Returns:
+            tuple: (method -> latencies, error kind -> count, seconds taken, worst send lag)
+        """
+        latencies = defaultdict(list)
+        errors = defaultdict(int)
+        first = calls[0].started
+        worst_lag = 0.0
+        begin = time.perf_counter() + 0.1
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="replay") as executor:
+            for call in calls:
+                due = begin + (call.started - first) / speed
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    worst_lag = max(worst_lag, -delay)
+                executor.submit(self._send, call, due, latencies, errors)
+        return latencies, errors, time.perf_counter() - begin, worst_lag
+
+
+def report(calls, speed, latencies, errors, seconds, worst_lag):
+    span = max(calls[-1].started - calls[0].started, 1e-9)
+    every = [latency for samples in latencies.values() for latency in samples]
+    print(f"\n  speed {speed:g}x: {len(calls):,} calls in {seconds:.1f} s, "
+          f"{len(calls) / seconds:,.0f} calls/s (target {len(calls) * speed / span:,.0f}), "
+          f"worst send lag {worst_lag * 1e3:.1f} ms")
+    print(f"    all     p50={_percentile(every, 50) * 1e3:7.2f} ms  p90={_percentile(every, 90) * 1e3:7.2f} ms  "
+          f"p99={_percentile(every, 99) * 1e3:7.2f} ms  p99.9={_percentile(every, 99.9) * 1e3:7.2f} ms")
+    if errors:
+        print(f"    errors  {dict(errors)}")
+
+    captured = defaultdict(list)
+    for call in calls:
+        captured[call.method].append(call.duration)
+    print(f"    {'method':<28}{'calls':>8}{'p50 ms':>10}{'p99 ms':>10}{'captured p50':>14}{'captured p99':>14}")
+    for method, samples in sorted(latencies.items(), key=lambda item: -len(item[1])):
+        print(f"    {method:<28}{len(samples):8,}{_percentile(samples, 50) * 1e3:10.2f}"
+              f"{_percentile(samples, 99) * 1e3:10.2f}{_percentile(captured[method], 50) * 1e3:14.2f}"
+              f"{_percentile(captured[method], 99) * 1e3:14.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay load balancer captures against a cluster')
+    parser.add_argument('captures', nargs='+', help='Capture files, merged by arrival time')
+    parser.add_argument('--speed', type=float, nargs='+', default=[1.0], help='Speed factors to replay at')
+    parser.add_argument('--url', default=None, help='Load balancer URL (default: LOAD_BALANCER_PORT on SERVER_HOST)')
+    parser.add_argument('--local', type=int, default=0, metavar='BACKENDS',
+                        help='Replay against a cluster of this many backends started here instead')
+    parser.add_argument('--concurrency', type=int, default=256, help='Calls in flight at most')
+    parser.add_argument('--limit', type=int, default=None, help='Replay only the first calls')
+    args = parser.parse_args()
+
+    calls = load_calls(args.captures, args.limit)
+    if not calls:
+        print("No calls captured")
+        return
+
+    url = args.url or f"http://{settings.SERVER_HOST}:{settings.LOAD_BALANCER_PORT}{settings.RPC_PATH}"
+    if args.local:
+        from benchmarks.local_cluster import start_cluster
+        from services import cab_service, load_balancer
+        cab_service.ThreadedXMLRPCServer.request_queue_size = 1024
+        load_balancer.ThreadedXMLRPCServer.request_queue_size = 1024
+        url, _, _ = start_cluster(args.local)
+
+    span = calls[-1].started - calls[0].started
+    print(f"Replaying {len(calls):,} calls captured over {span:.1f} s against {url}")
+    replayer = Replayer(url, args.concurrency)
+    for speed in args.speed:
+        report(calls, speed, *replayer.replay(calls, speed))
+
+
+if __name__ == "__main__":
+    main()
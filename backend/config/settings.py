@@ -44,16 +44,161 @@ ENCRYPT_PASSWORDS = True
 
 # Replication Configuration
 REPLICATION_MODE = "synchronous"  # synchronous or asynchronous
+REPLICATION_TOKEN = os.getenv("REPLICATION_TOKEN", "dev-replication-token-change-in-production")  # shared secret peers send with replicate calls
 CONSISTENCY_LEVEL = "quorum"  # one, quorum, all
 
 # Pricing Configuration
 BASE_FARE = 50  # in INR
 PER_KM_RATE = 12  # in INR
 PER_MINUTE_RATE = 2  # in INR
-SURGE_FACTOR = 1.0  # Multiplier for peak times
+SURGE_FACTOR = 1.0  # Baseline multiplier applied to every zone
+
+# Surge Pricing Configuration
+SURGE_WINDOW = 600  # seconds of ride requests counted as demand
+SURGE_BUCKETS = 10  # buckets the demand window is split into
+SURGE_UPDATE_INTERVAL = 30  # seconds between multiplier recomputations
+SURGE_THRESHOLD = 1.0  # requests per available driver before surge starts
+SURGE_SENSITIVITY = 0.25  # multiplier increase per request-per-driver above threshold
+SURGE_MAX_MULTIPLIER = 3.0  # cap on the zone multiplier
+SURGE_SMOOTHING = 0.5  # weight of the new target on each recomputation
+
+# Location Catalog Configuration
+LOCATION_AUTOCOMPLETE_LIMIT = 10  # Default number of autocomplete suggestions
+
+# Expiry Configuration
+RIDE_REQUEST_TIMEOUT = 300  # seconds a ride may stay REQUESTED before it expires
+DRIVER_PRESENCE_TTL = 120  # seconds without a location heartbeat before a driver is dropped
+EXPIRY_TICK_INTERVAL = 1.0  # resolution of the expiry timing wheel in seconds
+EXPIRY_BATCH_SIZE = 500  # expirations applied per lock acquisition
+
+# Scheduled Ride Configuration
+SCHEDULED_RIDE_DISPATCH_LEAD = 300  # seconds before pickup that a scheduled ride is dispatched
+SCHEDULED_RIDE_MIN_LEAD = 900  # earliest pickup that can be scheduled, in seconds from now
+SCHEDULED_RIDE_MAX_AHEAD = 7 * 24 * 3600  # latest pickup that can be scheduled, in seconds from now
+SCHEDULED_DISPATCH_BATCH_SIZE = 100  # scheduled rides dispatched per batch
+
+# Read Path Configuration
+LOCK_FREE_READS = True  # serve read-only RPCs from published snapshots instead of taking the service lock
+
+# Batched Call Configuration
+MULTICALL_SPLIT_THRESHOLD = 16  # batches at least this long are split by routing key across backends (0 = never split)
+LB_BATCH_WORKERS = 32  # threads of the load balancer sending the sub-batches of split batches
+
+# Metrics Configuration
+METRICS_ENABLED = True  # per-RPC latency histograms, lock wait/hold and replication timing (get_metrics)
+METRICS_RATE_WINDOW = 10  # seconds over which the load balancer's request rates are averaged
+LB_METRICS_PATH = "/metrics"  # HTTP GET path of the load balancer's Prometheus text metrics
+
+# Optimistic Concurrency Configuration
+RIDE_CAS_MAX_RETRIES = 5  # compare-and-set attempts before a ride transition reports a conflict
+
+# RPC Transport Configuration
+RPC_TRANSPORT = os.getenv("RPC_TRANSPORT", "xmlrpc")  # xmlrpc, or frame (length-prefixed frames over persistent TCP)
+RPC_CODEC = os.getenv("RPC_CODEC", "json")  # json or msgpack, payload encoding of the frame transport
+FRAME_RPC_ENABLED = True  # servers and load balancer also accept frame RPC on port + FRAME_PORT_OFFSET
+FRAME_PORT_OFFSET = 100
+FRAME_RPC_WORKERS = 32  # requests a frame listener executes concurrently
+
+# Server Mode Configuration
+SERVER_MODE = os.getenv("SERVER_MODE", "threaded")  # threaded (thread per connection), pooled or asyncio (one event loop)
+ASYNC_RPC_WORKERS = 32  # calls an asyncio server executes concurrently on its worker pool
+SERVER_WORKERS = 32  # worker threads of a pooled server
+SERVER_QUEUE_SIZE = 64  # connections a pooled server queues for its workers before rejecting with 503
+
+# Multi-process Server Configuration
+SERVER_PROCESSES = int(os.getenv("SERVER_PROCESSES", os.cpu_count() or 1))  # worker processes per cab server
+PARTITION_SOCKET_DIR = os.getenv("PARTITION_SOCKET_DIR", "/tmp")  # Unix sockets for calls between partitions
+LB_PROCESSES = int(os.getenv("LB_PROCESSES", os.cpu_count() or 1))  # worker processes of a multi-process load balancer
+
+# Load Balancing Configuration
+LB_POLICY = os.getenv("LB_POLICY", "least_connections")  # least_connections, p2c or peak_ewma (see util.balancing)
+LB_LEADER_ROUTING = True  # send writes to the leader backend (learned from health probes), reads to followers if REPLICATION_MODE is synchronous, else to the leader too
+LB_WEIGHTED_ROUTING = True  # weight backends by the load they report in health probes
+LB_LOAD_COSTS = {  # reported load -> cost per unit; a backend's weight is 1 / (1 + total cost)
+    "cpu": 2.0,  # share of one core used since the previous probe
+    "queue_depth": 0.1,  # connections waiting for a worker (pooled servers)
+    "active_rides": 0.002
+}
+LB_MIN_WEIGHT = 0.05  # lowest weight, so a loaded backend still gets some traffic
+LB_DRAIN_TIMEOUT = 30  # seconds a draining backend's in-flight calls get before it is removed anyway
+
+# Idempotency Configuration
+IDEMPOTENCY_TTL = 24 * 3600  # seconds a response is kept for retries carrying the same idempotency key
+IDEMPOTENCY_MAX_KEYS = 100000  # responses kept per server before the oldest are evicted
+
+# Health Check Configuration
+HEALTH_CHECK_INTERVAL = 1.0  # seconds between rounds of load balancer health probes
+HEALTH_CHECK_TIMEOUT = 0.5  # seconds a probe may take before it counts as a failure
+HEALTH_EJECT_FAILURES = 3  # consecutive failed probes or calls before a backend is marked down
+HEALTH_READMIT_SUCCESSES = 2  # consecutive successes before a down backend takes traffic again
+
+# Circuit Breaker Configuration
+BREAKER_WINDOW = 10  # seconds of call outcomes a backend's breaker computes its error rate over
+BREAKER_MIN_CALLS = 20  # calls in the window before the error rate can open the breaker
+BREAKER_FAILURE_RATE = 0.5  # share of calls failing in transit that opens the breaker
+BREAKER_OPEN_SECONDS = 5  # seconds an open breaker sends no calls before probing
+BREAKER_HALF_OPEN_CALLS = 3  # calls a half-open breaker lets through at a time; that many successes close it
+
+# Retry Configuration
+LB_RETRIES = 2  # extra attempts for reads and keyed writes that failed in transit or were rejected as busy
+LB_RETRY_DEADLINE = 15  # seconds after a call's first attempt beyond which it is not retried
+LB_RETRY_BUDGET_RATIO = 0.2  # retries allowed per call over the budget window
+LB_RETRY_BUDGET_MIN = 10  # retries per second allowed regardless of the ratio
+LB_RETRY_BUDGET_WINDOW = 10  # seconds
+
+# Hedged Request Configuration
+HEDGE_ENABLED = True  # send a second copy of slow get_ride_status / get_available_cabs / get_user_rides calls
+HEDGE_PERCENTILE = 95  # a call is hedged once it is slower than this percentile of its recent latency
+HEDGE_MIN_DELAY = 0.002  # seconds, lower bound of the hedge delay
+HEDGE_BUDGET_RATIO = 0.05  # hedged copies allowed per eligible call over LB_RETRY_BUDGET_WINDOW
+HEDGE_BUDGET_MIN = 5  # hedged copies per second allowed regardless of the ratio
+HEDGE_WORKERS = 64  # threads sending hedged copies (the calls themselves run in their request threads)
+
+# Adaptive Concurrency Configuration
+LB_CONCURRENCY_LIMIT_ENABLED = True  # cap the calls in flight to each backend, shedding the excess
+LB_LIMIT_INITIAL = 20  # calls in flight allowed per backend at start
+LB_LIMIT_MIN = 2  # lowest per-backend limit
+LB_LIMIT_MAX = 200  # highest per-backend limit
+LB_LIMIT_BACKOFF = 0.9  # factor applied to the limit when latency shows queueing
+LB_LIMIT_LATENCY_TOLERANCE = 2.0  # latency, as a multiple of the no-load latency, that counts as queueing
+LB_PRIORITY_SHARES = {  # priority -> share of a backend's limit its calls may fill
+    "critical": 1.0,  # bookings and other writes, logins
+    "normal": 0.9,
+    "sheddable": 0.75  # stats and status polling, dropped first
+}
+
+# Response Cache Configuration
+LB_CACHE_ENABLED = True  # answer repeated hot reads from the load balancer
+LB_CACHE_MAX_ENTRIES = 10000  # cached responses kept, least recently used evicted first
+# Each load balancer process (each worker of a multi-process one) has its own
+# cache, and only writes it forwards itself invalidate it: changes made through
+# other workers or on the backends (expiries, scheduled dispatch) show up once
+# the TTL runs out, so a TTL bounds how stale an answer can be. get_ride_status
+# is not cached, as clients poll it right after their own writes; giving it a
+# TTL here turns its caching on.
+LB_CACHE_TTLS = {  # cached read -> seconds a response is reused at most
+    "get_available_cabs": 1.0,
+    "get_active_rides": 1.0,
+    "get_surge_pricing": 2.0,
+    "autocomplete_locations": 30.0
+}
+
+# Traffic Capture Configuration
+LB_CAPTURE_PATH = os.getenv("LB_CAPTURE_PATH", "")  # file the load balancer records served calls to for replay (empty = off)
+LB_CAPTURE_SAMPLE_RATE = float(os.getenv("LB_CAPTURE_SAMPLE_RATE", 1.0))  # share of calls recorded
+LB_CAPTURE_MAX_BYTES = 64 * 1024 * 1024  # size at which the capture file is rotated
+LB_CAPTURE_BACKUPS = 5  # rotated capture files kept
 
 # System Constants
-RIDE_STATUSES = ["REQUESTED", "ACCEPTED", "IN_PROGRESS", "COMPLETED", "CANCELLED"]
+RIDE_STATUSES = ["SCHEDULED", "REQUESTED", "ACCEPTED", "IN_PROGRESS", "COMPLETED", "CANCELLED"]
+RIDE_STATUS_TRANSITIONS = {  # status -> statuses it may move to
+    "SCHEDULED": ["REQUESTED", "ACCEPTED", "CANCELLED"],
+    "REQUESTED": ["ACCEPTED", "CANCELLED"],
+    "ACCEPTED": ["IN_PROGRESS", "CANCELLED"],
+    "IN_PROGRESS": ["COMPLETED", "CANCELLED"],
+    "COMPLETED": [],
+    "CANCELLED": []
+}
 USER_TYPES = ["RIDER", "DRIVER"]
 PAYMENT_METHODS = ["CASH", "CARD", "WALLET"]
 PAYMENT_STATUSES = ["PENDING", "COMPLETED", "FAILED"]
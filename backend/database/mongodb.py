@@ -53,6 +53,7 @@ class MongoDB:
             self._db.users.create_index("username", unique=True)
             self._db.users.create_index("email", sparse=True)
             self._db.users.create_index([("user_type", 1), ("is_available", 1)])
+            self._db.users.create_index([("user_type", 1), ("is_available", 1), ("current_location_id", 1)])
             
             # Rides collection indexes
             self._db.rides.create_index("ride_id", unique=True)
@@ -60,6 +61,11 @@ class MongoDB:
             self._db.rides.create_index("driver_name")
             self._db.rides.create_index("status")
             self._db.rides.create_index("booking_time")
+            self._db.rides.create_index([("pickup_id", 1), ("destination_id", 1)])
+            self._db.rides.create_index([("status", 1), ("dispatch_time", 1)])
+            
+            # Locations collection indexes (_id is the compact location id)
+            self._db.locations.create_index("key", unique=True)
             
             logger.info("Database indexes created successfully")
         except OperationFailure as e:
@@ -82,6 +88,16 @@ class MongoDB:
         """Get rides collection"""
         return self.db.rides
     
+    @property
+    def locations(self):
+        """Get locations collection"""
+        return self.db.locations
+    
+    @property
+    def counters(self):
+        """Get counters collection (sequence generators)"""
+        return self.db.counters
+    
     @property
     def sessions(self):
         """Get sessions collection"""
@@ -1,4 +1,5 @@
 from datetime import datetime
+import threading
 import uuid
 
 class Ride:
@@ -8,8 +9,11 @@ class Ride:
         self.driver_name = None
         self.pickup = pickup
         self.destination = destination
-        self.status = "REQUESTED"  # "REQUESTED", "ACCEPTED", "IN_PROGRESS", "COMPLETED", "CANCELLED"
+        self.pickup_id = None  # LocationCatalog id of the pickup
+        self.destination_id = None  # LocationCatalog id of the destination
+        self.status = "REQUESTED"  # "SCHEDULED", "REQUESTED", "ACCEPTED", "IN_PROGRESS", "COMPLETED", "CANCELLED"
         self.booking_time = datetime.utcnow().isoformat()
+        self.scheduled_time = None  # Requested pickup time (epoch seconds) for scheduled rides
         self.start_time = None
         self.end_time = None
         self.estimated_time = None
@@ -20,6 +24,7 @@ class Ride:
         self.driver_rating = None
         self.version = 0  # For optimistic concurrency control
         self.vector_clock = {}  # For vector clock implementation
+        self._lock = threading.Lock()  # Guards compare-and-set on status/version
     
     def to_dict(self):
         return {
@@ -28,8 +33,11 @@ class Ride:
             'driver_name': self.driver_name,
             'pickup': self.pickup,
             'destination': self.destination,
+            'pickup_id': self.pickup_id,
+            'destination_id': self.destination_id,
             'status': self.status,
             'booking_time': self.booking_time,
+            'scheduled_time': self.scheduled_time,
             'start_time': self.start_time,
             'end_time': self.end_time,
             'estimated_time': self.estimated_time,
@@ -51,8 +59,11 @@ class Ride:
             data['destination']
         )
         ride.driver_name = data.get('driver_name')
+        ride.pickup_id = data.get('pickup_id')
+        ride.destination_id = data.get('destination_id')
         ride.status = data.get('status', 'REQUESTED')
         ride.booking_time = data.get('booking_time', datetime.utcnow().isoformat())
+        ride.scheduled_time = data.get('scheduled_time')
         ride.start_time = data.get('start_time')
         ride.end_time = data.get('end_time')
         ride.estimated_time = data.get('estimated_time')
@@ -68,7 +79,8 @@ class Ride:
     def update_status(self, new_status, server_id):
         self.status = new_status
         self.version += 1
-        self.vector_clock[server_id] = self.vector_clock.get(server_id, 0) + 1
+        node = str(server_id)  # string keys, as in VectorClock and for XML-RPC
+        self.vector_clock[node] = self.vector_clock.get(node, 0) + 1
         
         # Update timestamps based on status change
         now = datetime.utcnow().isoformat()
@@ -79,6 +91,59 @@ class Ride:
         elif new_status == "COMPLETED":
             self.end_time = now
     
+    def read_state(self):
+        """Get (status, version) as one consistent pair"""
+        with self._lock:
+            return self.status, self.version
+    
+    def snapshot(self):
+        """Get a dict copy of the ride that no concurrent change can tear"""
+        with self._lock:
+            data = self.to_dict()
+            data['vector_clock'] = dict(self.vector_clock)
+            return data
+    
+    def compare_and_set(self, expected_version, new_status, server_id, **changes):
+        """
+        Apply a status change only if the ride is still at expected_version
+        
+        Args:
+            expected_version (int): Version the caller validated the change against
+            new_status (str): Status to move to
+            server_id: Server applying the change
+            **changes: Other attributes to set with the status (e.g. driver_name)
+            
+        Returns:
+            int or None: The new version, or None if another change got in first
+        """
+        with self._lock:
+            if self.version != expected_version:
+                return None
+            for name, value in changes.items():
+                setattr(self, name, value)
+            self.update_status(new_status, server_id)
+            return self.version
+    
+    def apply_replicated(self, new_status, server_id, version=None, **changes):
+        """
+        Apply a status change replicated from a peer
+        
+        Changes carrying a version are applied at most once and never over a
+        newer one, so duplicated or reordered replication is harmless.
+        
+        Returns:
+            bool: True if the change was applied
+        """
+        with self._lock:
+            if version is not None and version <= self.version:
+                return False
+            for name, value in changes.items():
+                setattr(self, name, value)
+            self.update_status(new_status, server_id)
+            if version is not None:
+                self.version = version
+            return True
+    
     def __str__(self):
         status_str = f"({self.status})"
         driver_str = f"with {self.driver_name}" if self.driver_name else "awaiting driver"
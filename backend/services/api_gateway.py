@@ -6,13 +6,16 @@ Provides RESTful API endpoints that communicate with backend RPC services
 from flask import Flask, request, jsonify, session
 from flask_cors import CORS
 from flask_session import Session
-import xmlrpc.client
 import time
 import logging
 import os
 import sys
 import threading
+import uuid
 import bcrypt
+from datetime import datetime, timezone
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 
 # Add the parent directory to sys.path to allow relative imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -20,6 +23,11 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from config import settings
 from util.clock.lamport_clock import LamportClock
 from util.auth import generate_token, decode_token, require_auth
+from util.location_catalog import LocationCatalog, normalize_location, display_location
+from util.timing_wheel import TimingWheel
+from util.scheduled_queue import ScheduledJobQueue
+from util.surge_pricing import SurgePricingEngine
+from util.frame_rpc import rpc_proxy
 from database.mongodb import db
 
 # Create log directory if it doesn't exist (before logging setup)
@@ -47,10 +55,7 @@ logger = logging.getLogger("APIGateway")
 
 # Initialize RPC client to connect to load balancer (optional, for backward compatibility)
 try:
-    rpc_client = xmlrpc.client.ServerProxy(
-        f"http://{settings.SERVER_HOST}:{settings.LOAD_BALANCER_PORT}{settings.RPC_PATH}", 
-        allow_none=True
-    )
+    rpc_client = rpc_proxy(settings.SERVER_HOST, settings.LOAD_BALANCER_PORT)
 except Exception as e:
     logger.warning(f"Could not connect to RPC server: {e}")
     rpc_client = None
@@ -61,6 +66,28 @@ lamport_clock = LamportClock()
 # Thread-local storage for request context
 thread_local = threading.local()
 
+# Location catalog, mirrored from the MongoDB locations collection
+location_catalog = LocationCatalog()
+_location_catalog_loaded = False
+_location_catalog_lock = threading.Lock()
+
+# Expiry of unaccepted ride requests and lapsed driver heartbeats
+expiry_timers = TimingWheel(tick=settings.EXPIRY_TICK_INTERVAL)
+
+# Future bookings; MongoDB is the durable copy, this is the wake-up queue
+scheduled_rides = ScheduledJobQueue()
+
+# Zone-level surge pricing (zones are location ids)
+surge = SurgePricingEngine(
+    window=settings.SURGE_WINDOW,
+    buckets=settings.SURGE_BUCKETS,
+    threshold=settings.SURGE_THRESHOLD,
+    sensitivity=settings.SURGE_SENSITIVITY,
+    max_multiplier=settings.SURGE_MAX_MULTIPLIER,
+    smoothing=settings.SURGE_SMOOTHING,
+    base_multiplier=settings.SURGE_FACTOR
+)
+
 def _before_request():
     """Prepare request context with a new Lamport clock timestamp"""
     thread_local.request_clock = lamport_clock.increment()
@@ -72,6 +99,239 @@ def _after_response(response_data):
         lamport_clock.update(response_data["server_clock"])
     return response_data
 
+def _load_location_catalog():
+    """Load persisted locations into the in-memory catalog (once per process)"""
+    global _location_catalog_loaded
+    if _location_catalog_loaded:
+        return
+    with _location_catalog_lock:
+        if not _location_catalog_loaded:
+            for doc in db.locations.find({}, {"key": 0}):
+                location_catalog.register(doc['_id'], doc['name'])
+            _location_catalog_loaded = True
+
+def _lookup_location_id(name):
+    """Get the persisted id of a location without creating it"""
+    location_id = location_catalog.lookup(name)
+    if location_id is not None:
+        return location_id
+    
+    doc = db.locations.find_one({"key": normalize_location(name)})
+    if not doc:
+        return None
+    location_catalog.register(doc['_id'], doc['name'])
+    return doc['_id']
+
+def _location_id(name):
+    """Get the persisted id of a location, allocating a new one if needed"""
+    key = normalize_location(name)
+    if not key:
+        return None
+    
+    location_id = _lookup_location_id(name)
+    if location_id is not None:
+        return location_id
+    
+    # Allocate the next compact id; a concurrent insert of the same key wins
+    counter = db.counters.find_one_and_update(
+        {"_id": "location_id"},
+        {"$inc": {"seq": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    doc = {"_id": counter['seq'], "key": key, "name": display_location(name)}
+    try:
+        db.locations.insert_one(doc)
+    except DuplicateKeyError:
+        doc = db.locations.find_one({"key": key})
+    
+    location_catalog.register(doc['_id'], doc['name'])
+    return doc['_id']
+
+def _expire_batch(ride_ids, driver_names):
+    """Apply one batch of expirations with a single update per collection"""
+    now = time.time()
+    if ride_ids:
+        # The status/booking_time guard keeps this safe across gateway processes
+        result = db.rides.update_many(
+            {
+                "ride_id": {"$in": ride_ids},
+                "status": "REQUESTED",
+                "driver_name": None,
+                "booking_time": {"$lte": now - settings.RIDE_REQUEST_TIMEOUT}
+            },
+            {
+                "$set": {
+                    "status": "CANCELLED",
+                    "cancellation_reason": "Expired before a driver accepted",
+                    "cancellation_time": now
+                },
+                "$inc": {"version": 1}
+            }
+        )
+        if result.modified_count:
+            logger.info(f"Expired {result.modified_count} ride requests")
+    
+    if driver_names:
+        lapsed = {
+            "username": {"$in": driver_names},
+            "is_available": True,
+            "last_active": {"$lte": now - settings.DRIVER_PRESENCE_TTL}
+        }
+        # A timer may have fired for a driver whose heartbeat arrived in another gateway process
+        expired = [user["username"] for user in db.users.find(lapsed, {"username": 1})]
+        if not expired:
+            return
+        result = db.users.update_many(dict(lapsed, username={"$in": expired}), {"$set": {"is_available": False}})
+        for driver_name in expired:
+            surge.update_driver(driver_name, None, False)
+        if result.modified_count:
+            logger.info(f"Dropped {result.modified_count} drivers with lapsed heartbeats")
+
+def _expire_due():
+    """Turn the expiry wheel and apply expired timers in batches"""
+    expired = expiry_timers.advance()
+    for start in range(0, len(expired), settings.EXPIRY_BATCH_SIZE):
+        batch = expired[start:start + settings.EXPIRY_BATCH_SIZE]
+        _expire_batch(
+            [key for kind, key in batch if kind == "ride"],
+            [key for kind, key in batch if kind == "driver"]
+        )
+
+def _sweep_expired():
+    """One-off sweep for requests and drivers that lapsed while no gateway was running"""
+    now = time.time()
+    db.rides.update_many(
+        {
+            "status": "REQUESTED",
+            "driver_name": None,
+            "booking_time": {"$lte": now - settings.RIDE_REQUEST_TIMEOUT}
+        },
+        {
+            "$set": {
+                "status": "CANCELLED",
+                "cancellation_reason": "Expired before a driver accepted",
+                "cancellation_time": now
+            },
+            "$inc": {"version": 1}
+        }
+    )
+    db.users.update_many(
+        {
+            "user_type": "DRIVER",
+            "is_available": True,
+            "last_active": {"$lte": now - settings.DRIVER_PRESENCE_TTL}
+        },
+        {"$set": {"is_available": False}}
+    )
+
+def _start_expiry_worker():
+    """Start a background thread that turns the expiry timing wheel"""
+    def expiry_worker():
+        try:
+            _sweep_expired()
+        except Exception as e:
+            logger.error(f"Error sweeping expired rides and drivers: {e}")
+        while True:
+            try:
+                _expire_due()
+            except Exception as e:
+                logger.error(f"Error in expiry worker: {e}")
+            time.sleep(settings.EXPIRY_TICK_INTERVAL)
+    
+    expiry_thread = threading.Thread(target=expiry_worker, daemon=True)
+    expiry_thread.start()
+
+def _dispatch_scheduled_rides(batch):
+    """Move a batch of due scheduled rides into the normal REQUESTED flow"""
+    ride_ids = [ride_id for ride_id, _ in batch]
+    now = time.time()
+    
+    # booking_time restarts so the request expiry counts from dispatch
+    result = db.rides.update_many(
+        {"ride_id": {"$in": ride_ids}, "status": "SCHEDULED"},
+        {"$set": {"status": "REQUESTED", "booking_time": now}, "$inc": {"version": 1}}
+    )
+    for ride_id in ride_ids:
+        expiry_timers.schedule(("ride", ride_id), settings.RIDE_REQUEST_TIMEOUT)
+    
+    logger.info(f"Dispatched {result.modified_count} scheduled rides")
+
+def _start_scheduled_dispatcher():
+    """Load pending scheduled rides and start the dispatch worker"""
+    try:
+        for ride in db.rides.find({"status": "SCHEDULED"}, {"ride_id": 1, "dispatch_time": 1}):
+            scheduled_rides.push(ride['ride_id'], ride['dispatch_time'])
+        logger.info(f"Loaded {len(scheduled_rides)} scheduled rides")
+    except Exception as e:
+        logger.error(f"Error loading scheduled rides: {e}")
+    
+    scheduled_rides.start_worker(_dispatch_scheduled_rides, settings.SCHEDULED_DISPATCH_BATCH_SIZE)
+
+def _transition_ride(ride_id, new_status, changes=None, from_statuses=None, expected_version=None):
+    """
+    Move a ride document to a new status with a compare-and-set on its version
+    
+    The update only matches the version that was read, so concurrent changes
+    to the same ride cannot overwrite each other and different rides never
+    contend. A lost race is re-validated against the winner's status and
+    retried (up to RIDE_CAS_MAX_RETRIES) only while it is still valid.
+    
+    Args:
+        ride_id (str): Ride to update
+        new_status (str): Status to move to
+        changes (callable): Given the current ride, returns other fields to set
+        from_statuses (list): Restrict the statuses the ride may move from
+        expected_version (int): Version the client last saw; any other fails
+    
+    Returns:
+        tuple: (new version or None, ride as it was before the change or as it
+                blocked the change, whether it failed on a version conflict)
+    """
+    ride = None
+    for _ in range(settings.RIDE_CAS_MAX_RETRIES):
+        ride = db.rides.find_one({"ride_id": ride_id})
+        if not ride:
+            return None, None, False
+        
+        version = ride.get('version')
+        if expected_version is not None and (version or 0) != expected_version:
+            return None, ride, True
+        if new_status not in settings.RIDE_STATUS_TRANSITIONS.get(ride['status'], []):
+            return None, ride, False
+        if from_statuses is not None and ride['status'] not in from_statuses:
+            return None, ride, False
+        
+        update = {"status": new_status}
+        if changes:
+            update.update(changes(ride))
+        
+        # A null version also matches documents written before versioning
+        result = db.rides.update_one(
+            {"ride_id": ride_id, "version": version},
+            {"$set": update, "$inc": {"version": 1}}
+        )
+        if result.modified_count:
+            return (version or 0) + 1, ride, False
+    
+    return None, ride, True
+
+def _calculate_fare(estimated_distance, estimated_time, zone=None):
+    """Calculate the fare for a ride (simplified), with the zone's surge multiplier"""
+    fare = settings.BASE_FARE + (estimated_distance * settings.PER_KM_RATE) + (estimated_time * settings.PER_MINUTE_RATE)
+    return round(fare * surge.multiplier(zone), 2)
+
+def _parse_pickup_time(value):
+    """Parse a pickup time given as a UNIX timestamp or an ISO-8601 string"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        pass
+    parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """API endpoint for health check"""
@@ -240,10 +500,43 @@ def get_current_user():
         logger.error(f"Getting current user failed: {e}")
         return jsonify({"success": False, "message": str(e)}), 500
 
+# Namespace of ride ids derived from idempotency keys
+IDEMPOTENT_RIDE_NAMESPACE = uuid.UUID("8f5c2f0e-3d8a-4e0b-9a51-6c3f1d2b7e44")
+
+def _booking_response(ride, replayed=False):
+    """Response of /api/book_cab for a stored ride"""
+    response = {
+        "success": True,
+        "message": "Cab booked successfully",
+        "ride_id": ride['ride_id'],
+        "fare": ride['fare'],
+        "estimated_time": ride['estimated_time']
+    }
+    if replayed:
+        response["replayed"] = True
+    return jsonify(response), 201
+
+def _replayed_booking(ride, pickup_id, destination_id):
+    """Response of /api/book_cab for a retry finding the ride its key booked; 422 if it asked for another trip"""
+    if ride.get('pickup_id') != pickup_id or ride.get('destination_id') != destination_id:
+        return jsonify({
+            "success": False,
+            "message": "Idempotency-Key already used for a booking with another pickup or destination"
+        }), 422
+    return _booking_response(ride, replayed=True)
+
 @app.route('/api/book_cab', methods=['POST'])
 @require_auth
 def book_cab():
-    """API endpoint for booking a cab"""
+    """
+    API endpoint for booking a cab
+    
+    A request with an Idempotency-Key header books at most one ride per key
+    and rider: the ride id is derived from the key, so a retry finds the
+    ride (or loses the insert on the unique ride_id index) and is answered
+    with the original booking. Reusing the key for another pickup or
+    destination is refused with 422.
+    """
     try:
         data = request.json
         username = request.current_user['username']
@@ -252,24 +545,37 @@ def book_cab():
         if not data.get('pickup') or not data.get('destination'):
             return jsonify({"success": False, "message": "Pickup and destination required"}), 400
         
-        # Generate unique ride ID
-        import uuid
+        # Resolve locations to catalog ids and canonical names
+        pickup_id = _location_id(data['pickup'])
+        destination_id = _location_id(data['destination'])
+        if pickup_id is None or destination_id is None:
+            return jsonify({"success": False, "message": "Pickup and destination required"}), 400
+        
+        # A retried request gets the ride its first attempt booked
         ride_id = str(uuid.uuid4())
+        idempotency_key = request.headers.get('Idempotency-Key')
+        if idempotency_key:
+            ride_id = str(uuid.uuid5(IDEMPOTENT_RIDE_NAMESPACE, f"{username}:{idempotency_key}"))
+            ride = db.rides.find_one({"ride_id": ride_id})
+            if ride:
+                return _replayed_booking(ride, pickup_id, destination_id)
         
         # Calculate fare (simplified)
-        base_fare = settings.BASE_FARE
         estimated_distance = data.get('estimated_distance', 10)  # km
         estimated_time = data.get('estimated_time', 20)  # minutes
         
-        fare = base_fare + (estimated_distance * settings.PER_KM_RATE) + (estimated_time * settings.PER_MINUTE_RATE)
+        surge.record_request(pickup_id)
+        fare = _calculate_fare(estimated_distance, estimated_time, pickup_id)
         
         # Create ride document
         ride_doc = {
             'ride_id': ride_id,
             'rider_name': username,
             'driver_name': None,
-            'pickup': data['pickup'],
-            'destination': data['destination'],
+            'pickup': location_catalog.get_name(pickup_id),
+            'destination': location_catalog.get_name(destination_id),
+            'pickup_id': pickup_id,
+            'destination_id': destination_id,
             'status': 'REQUESTED',
             'booking_time': time.time(),
             'start_time': None,
@@ -284,21 +590,104 @@ def book_cab():
             'vector_clock': {}
         }
         
-        # Insert ride into database
-        result = db.rides.insert_one(ride_doc)
+        # Insert ride into database; a concurrent retry of the same key loses here
+        try:
+            db.rides.insert_one(ride_doc)
+        except DuplicateKeyError:
+            if not idempotency_key:
+                raise
+            return _replayed_booking(db.rides.find_one({"ride_id": ride_id}), pickup_id, destination_id)
+        expiry_timers.schedule(("ride", ride_id), settings.RIDE_REQUEST_TIMEOUT)
         
         logger.info(f"Cab booked successfully: {ride_id}")
         
+        return _booking_response(ride_doc)
+        
+    except Exception as e:
+        logger.error(f"Booking failed: {e}")
+        return jsonify({"success": False, "message": str(e)}), 500
+
+@app.route('/api/rides/schedule', methods=['POST'])
+@require_auth
+def schedule_ride():
+    """API endpoint for booking a cab for a future pickup time"""
+    try:
+        data = request.json
+        username = request.current_user['username']
+        
+        # Validate required fields
+        if not data.get('pickup') or not data.get('destination') or not data.get('pickup_time'):
+            return jsonify({"success": False, "message": "Pickup, destination and pickup_time required"}), 400
+        
+        try:
+            pickup_time = _parse_pickup_time(data['pickup_time'])
+        except ValueError:
+            return jsonify({"success": False, "message": "Invalid pickup_time"}), 400
+        
+        now = time.time()
+        if not now + settings.SCHEDULED_RIDE_MIN_LEAD <= pickup_time <= now + settings.SCHEDULED_RIDE_MAX_AHEAD:
+            return jsonify({
+                "success": False,
+                "message": (f"Pickup time must be between {settings.SCHEDULED_RIDE_MIN_LEAD // 60} minutes "
+                            f"and {settings.SCHEDULED_RIDE_MAX_AHEAD // 86400} days from now")
+            }), 400
+        
+        # Resolve locations to catalog ids and canonical names
+        pickup_id = _location_id(data['pickup'])
+        destination_id = _location_id(data['destination'])
+        if pickup_id is None or destination_id is None:
+            return jsonify({"success": False, "message": "Pickup and destination required"}), 400
+        
+        # Generate unique ride ID
+        ride_id = str(uuid.uuid4())
+        
+        estimated_distance = data.get('estimated_distance', 10)  # km
+        estimated_time = data.get('estimated_time', 20)  # minutes
+        fare = _calculate_fare(estimated_distance, estimated_time, pickup_id)
+        dispatch_time = pickup_time - settings.SCHEDULED_RIDE_DISPATCH_LEAD
+        
+        # Create ride document
+        ride_doc = {
+            'ride_id': ride_id,
+            'rider_name': username,
+            'driver_name': None,
+            'pickup': location_catalog.get_name(pickup_id),
+            'destination': location_catalog.get_name(destination_id),
+            'pickup_id': pickup_id,
+            'destination_id': destination_id,
+            'status': 'SCHEDULED',
+            'booking_time': now,
+            'scheduled_time': pickup_time,
+            'dispatch_time': dispatch_time,
+            'start_time': None,
+            'end_time': None,
+            'estimated_time': estimated_time,
+            'estimated_distance': estimated_distance,
+            'fare': fare,
+            'payment_status': 'PENDING',
+            'rider_rating': None,
+            'driver_rating': None,
+            'version': 0,
+            'vector_clock': {}
+        }
+        
+        # Insert ride into database, then queue it for dispatch
+        db.rides.insert_one(ride_doc)
+        scheduled_rides.push(ride_id, dispatch_time)
+        
+        logger.info(f"Cab scheduled successfully: {ride_id} for {time.ctime(pickup_time)}")
+        
         return jsonify({
             "success": True,
-            "message": "Cab booked successfully",
+            "message": "Cab scheduled successfully",
             "ride_id": ride_id,
             "fare": fare,
+            "scheduled_time": pickup_time,
             "estimated_time": estimated_time
         }), 201
         
     except Exception as e:
-        logger.error(f"Booking failed: {e}")
+        logger.error(f"Scheduling failed: {e}")
         return jsonify({"success": False, "message": str(e)}), 500
 
 @app.route('/api/ride/<ride_id>', methods=['GET'])
@@ -335,32 +724,45 @@ def cancel_ride(ride_id):
         if ride['rider_name'] != username and ride.get('driver_name') != username:
             return jsonify({"success": False, "message": "Unauthorized"}), 403
         
-        # Check if ride can be cancelled
-        if ride['status'] in ['COMPLETED', 'CANCELLED']:
+        def cancellation(ride):
+            """Penalty and reason for the status the ride is cancelled from"""
+            if ride['status'] == 'SCHEDULED':
+                # Cancelling a future booking before dispatch - no penalty
+                return 0.0, "Scheduled ride cancelled before dispatch"
+            elif ride['status'] == 'REQUESTED':
+                # Early cancellation - smaller penalty
+                return 0.1, "Cancelled before driver assignment"
+            elif ride['status'] == 'ACCEPTED':
+                # Cancelling after driver accepted - medium penalty
+                if user_type == 'DRIVER':
+                    return 0.3, "Driver cancelled after accepting"
+                return 0.3, "Rider cancelled after driver accepted"
+            elif ride['status'] == 'IN_PROGRESS':
+                # Cancelling during ride - highest penalty
+                if user_type == 'DRIVER':
+                    return 0.5, "Driver cancelled during ride"
+                return 0.5, "Rider cancelled during ride"
+            return 0.0, ""
+        
+        # Update ride status, keyed on the version it was read at
+        data = request.get_json(silent=True) or {}
+        version, ride, conflict = _transition_ride(
+            ride_id,
+            "CANCELLED",
+            changes=lambda ride: {
+                "cancelled_by": username,
+                "cancellation_reason": cancellation(ride)[1],
+                "cancellation_time": time.time()
+            },
+            expected_version=data.get('version')
+        )
+        
+        if version is None:
+            if conflict:
+                return jsonify({"success": False, "message": "Ride was modified concurrently, please retry"}), 409
             return jsonify({"success": False, "message": f"Cannot cancel a {ride['status'].lower()} ride"}), 400
         
-        # Determine penalty based on ride status and who is cancelling
-        rating_penalty = 0.0
-        cancellation_reason = ""
-        
-        if ride['status'] == 'REQUESTED':
-            # Early cancellation - smaller penalty
-            rating_penalty = 0.1
-            cancellation_reason = "Cancelled before driver assignment"
-        elif ride['status'] == 'ACCEPTED':
-            # Cancelling after driver accepted - medium penalty
-            rating_penalty = 0.3
-            if user_type == 'DRIVER':
-                cancellation_reason = "Driver cancelled after accepting"
-            else:
-                cancellation_reason = "Rider cancelled after driver accepted"
-        elif ride['status'] == 'IN_PROGRESS':
-            # Cancelling during ride - highest penalty
-            rating_penalty = 0.5
-            if user_type == 'DRIVER':
-                cancellation_reason = "Driver cancelled during ride"
-            else:
-                cancellation_reason = "Rider cancelled during ride"
+        rating_penalty, cancellation_reason = cancellation(ride)
         
         # Apply rating penalty to the user who cancelled
         user = db.users.find_one({"username": username})
@@ -373,40 +775,86 @@ def cancel_ride(ride_id):
                 {"$set": {"rating": new_rating}}
             )
         
-        # Update ride status
-        result = db.rides.update_one(
-            {"ride_id": ride_id},
-            {"$set": {
-                "status": "CANCELLED",
-                "cancelled_by": username,
-                "cancellation_reason": cancellation_reason,
-                "cancellation_time": time.time()
-            }}
-        )
+        expiry_timers.cancel(("ride", ride_id))
+        scheduled_rides.cancel(ride_id)
         
         # If driver was assigned, make them available again
         if ride.get('driver_name'):
             db.users.update_one(
                 {"username": ride['driver_name']},
-                {"$set": {"is_available": True}}
+                {"$set": {"is_available": True, "last_active": time.time()}}
             )
+            expiry_timers.schedule(("driver", ride['driver_name']), settings.DRIVER_PRESENCE_TTL)
         
-        if result.modified_count > 0:
-            logger.info(f"Ride cancelled: {ride_id} by {username} (penalty: {rating_penalty})")
-            return jsonify({
-                "success": True, 
-                "message": "Ride cancelled successfully",
-                "rating_penalty": rating_penalty,
-                "new_rating": new_rating if user else None,
-                "reason": cancellation_reason
-            }), 200
-        else:
-            return jsonify({"success": False, "message": "Failed to cancel ride"}), 400
-            
+        logger.info(f"Ride cancelled: {ride_id} by {username} (penalty: {rating_penalty})")
+        return jsonify({
+            "success": True,
+            "message": "Ride cancelled successfully",
+            "rating_penalty": rating_penalty,
+            "new_rating": new_rating if user else None,
+            "reason": cancellation_reason,
+            "version": version
+        }), 200
+    
     except Exception as e:
         logger.error(f"Cancelling ride failed: {e}")
         return jsonify({"success": False, "message": str(e)}), 500
 
+@app.route('/api/ride/<ride_id>/status', methods=['PUT'])
+@require_auth
+def update_ride_status(ride_id):
+    """API endpoint for the assigned driver to start or complete a ride"""
+    try:
+        data = request.json or {}
+        username = request.current_user['username']
+        new_status = data.get('status')
+        
+        if new_status not in ('IN_PROGRESS', 'COMPLETED'):
+            return jsonify({"success": False, "message": "Status must be IN_PROGRESS or COMPLETED"}), 400
+        
+        ride = db.rides.find_one({"ride_id": ride_id})
+        
+        if not ride:
+            return jsonify({"success": False, "message": "Ride not found"}), 404
+        
+        if ride.get('driver_name') != username:
+            return jsonify({"success": False, "message": "Only the assigned driver can update this ride"}), 403
+        
+        timestamp_field = 'start_time' if new_status == 'IN_PROGRESS' else 'end_time'
+        version, ride, conflict = _transition_ride(
+            ride_id,
+            new_status,
+            changes=lambda ride: {timestamp_field: time.time()},
+            expected_version=data.get('version')
+        )
+        
+        if version is None:
+            if conflict:
+                return jsonify({"success": False, "message": "Ride was modified concurrently, please retry"}), 409
+            return jsonify({
+                "success": False,
+                "message": f"Invalid status transition from {ride['status']} to {new_status}"
+            }), 400
+        
+        # A completed ride frees the driver for the next one
+        if new_status == 'COMPLETED':
+            db.users.update_one(
+                {"username": username},
+                {"$set": {"is_available": True, "last_active": time.time()}}
+            )
+            expiry_timers.schedule(("driver", username), settings.DRIVER_PRESENCE_TTL)
+        
+        logger.info(f"Ride {ride_id} status updated to {new_status} by {username}")
+        return jsonify({
+            "success": True,
+            "message": f"Ride status updated to {new_status}",
+            "version": version
+        }), 200
+    
+    except Exception as e:
+        logger.error(f"Updating ride status failed: {e}")
+        return jsonify({"success": False, "message": str(e)}), 500
+
 @app.route('/api/user/<username>/rides', methods=['GET'])
 @require_auth
 def get_user_rides(username):
@@ -456,7 +904,7 @@ def get_active_rides():
         else:
             rides = list(db.rides.find({
                 "rider_name": username,
-                "status": {"$in": ["REQUESTED", "ACCEPTED", "IN_PROGRESS"]}
+                "status": {"$in": ["SCHEDULED", "REQUESTED", "ACCEPTED", "IN_PROGRESS"]}
             }, {"_id": 0}).sort("booking_time", -1))
         
         return jsonify({"success": True, "rides": rides, "count": len(rides)}), 200
@@ -500,34 +948,29 @@ def accept_ride(ride_id):
         if user_type != 'DRIVER':
             return jsonify({"success": False, "message": "Only drivers can accept rides"}), 403
         
-        # Find the ride
-        ride = db.rides.find_one({"ride_id": ride_id})
+        # Accept the ride; of several drivers racing for it only one version matches
+        data = request.get_json(silent=True) or {}
+        version, ride, conflict = _transition_ride(
+            ride_id,
+            "ACCEPTED",
+            changes=lambda ride: {"driver_name": username, "accept_time": time.time()},
+            from_statuses=["REQUESTED"],
+            expected_version=data.get('version')
+        )
         
-        if not ride:
+        if ride is None:
             return jsonify({"success": False, "message": "Ride not found"}), 404
         
-        if ride['status'] != 'REQUESTED':
+        if version is None:
+            if conflict:
+                return jsonify({"success": False, "message": "Ride was modified concurrently, please retry"}), 409
             return jsonify({"success": False, "message": "Ride is not available"}), 400
         
-        if ride.get('driver_name') is not None:
-            return jsonify({"success": False, "message": "Ride already assigned"}), 400
-        
-        # Accept the ride
-        result = db.rides.update_one(
-            {"ride_id": ride_id, "driver_name": None},
-            {"$set": {
-                "driver_name": username,
-                "status": "ACCEPTED",
-                "accept_time": time.time()
-            }}
-        )
-        
-        if result.modified_count > 0:
-            logger.info(f"Ride accepted: {ride_id} by {username}")
-            return jsonify({"success": True, "message": "Ride accepted successfully"}), 200
-        else:
-            return jsonify({"success": False, "message": "Failed to accept ride"}), 400
-            
+        expiry_timers.cancel(("ride", ride_id))
+        surge.update_driver(username, None, False)
+        logger.info(f"Ride accepted: {ride_id} by {username}")
+        return jsonify({"success": True, "message": "Ride accepted successfully", "version": version}), 200
+
     except Exception as e:
         logger.error(f"Accepting ride failed: {e}")
         return jsonify({"success": False, "message": str(e)}), 500
@@ -545,18 +988,32 @@ def set_driver_availability():
         if user_type != 'DRIVER':
             return jsonify({"success": False, "message": "Only drivers can set availability"}), 403
         
+        # Resolve the reported location to its catalog id
+        location_id = _location_id(data.get('location'))
+        location = location_catalog.get_name(location_id) if location_id is not None else None
+        
         # Update driver availability
+        is_available = data.get('is_available', True)
         result = db.users.update_one(
             {"username": username},
             {
                 "$set": {
-                    "is_available": data.get('is_available', True),
-                    "current_location": data.get('location'),
+                    "is_available": is_available,
+                    "current_location": location,
+                    "current_location_id": location_id,
                     "last_active": time.time()
                 }
             }
         )
         
+        surge.update_driver(username, location_id, is_available)
+        
+        # Each update doubles as a presence heartbeat
+        if is_available:
+            expiry_timers.schedule(("driver", username), settings.DRIVER_PRESENCE_TTL)
+        else:
+            expiry_timers.cancel(("driver", username))
+        
         if result.modified_count > 0:
             logger.info(f"Driver availability updated: {username}")
             return jsonify({"success": True, "message": "Availability updated successfully"}), 200
@@ -595,8 +1052,11 @@ def get_available_cabs():
         
         # Find available drivers near the location
         query = {"user_type": "DRIVER", "is_available": True}
-        if location:
-            query["current_location"] = location
+        if normalize_location(location):
+            location_id = _lookup_location_id(location)
+            if location_id is None:
+                return jsonify({"success": True, "available_drivers": [], "count": 0}), 200
+            query["current_location_id"] = location_id
         
         drivers = list(db.users.find(query, {"password": 0, "_id": 0}))
         
@@ -610,6 +1070,42 @@ def get_available_cabs():
         logger.error(f"Getting available cabs failed: {e}")
         return jsonify({"success": False, "message": str(e)}), 500
 
+@app.route('/api/locations/autocomplete', methods=['GET'])
+@require_auth
+def autocomplete_locations():
+    """API endpoint for location autocomplete"""
+    try:
+        prefix = request.args.get('q', '')
+        limit = min(int(request.args.get('limit', settings.LOCATION_AUTOCOMPLETE_LIMIT)), 50)
+        
+        _load_location_catalog()
+        locations = location_catalog.autocomplete(prefix, limit)
+        
+        return jsonify({"success": True, "locations": locations, "count": len(locations)}), 200
+        
+    except Exception as e:
+        logger.error(f"Location autocomplete failed: {e}")
+        return jsonify({"success": False, "message": str(e)}), 500
+
+@app.route('/api/surge', methods=['GET'])
+def get_surge_pricing():
+    """API endpoint for current surge multipliers per zone"""
+    try:
+        zones = []
+        for zone, info in surge.snapshot().items():
+            zones.append(dict(info, location_id=zone, location=location_catalog.get_name(zone)))
+        zones.sort(key=lambda z: z["multiplier"], reverse=True)
+        
+        return jsonify({
+            "success": True,
+            "base_multiplier": settings.SURGE_FACTOR,
+            "zones": zones
+        }), 200
+        
+    except Exception as e:
+        logger.error(f"Getting surge pricing failed: {e}")
+        return jsonify({"success": False, "message": str(e)}), 500
+
 @app.route('/api/stats', methods=['GET'])
 def get_stats():
     """API endpoint for getting system statistics"""
@@ -712,6 +1208,11 @@ def main():
         logger.error(f"Failed to connect to MongoDB: {e}")
         logger.warning("API Gateway will start but database operations may fail")
     
+    # Expire stale ride requests and driver heartbeats in the background
+    _start_expiry_worker()
+    _start_scheduled_dispatcher()
+    surge.start(settings.SURGE_UPDATE_INTERVAL)
+    
     # Start the Flask server
     logger.info(f"Starting API Gateway on port 5000")
     app.run(
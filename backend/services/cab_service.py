@@ -4,7 +4,10 @@ Provides core functionality and handles client requests
 """
 
 from xmlrpc.server import SimpleXMLRPCServer, SimpleXMLRPCRequestHandler
+import xmlrpc.client
 from socketserver import ThreadingMixIn
+from collections import namedtuple
+from contextlib import nullcontext, contextmanager
 import threading
 import logging
 import time
@@ -13,6 +16,10 @@ import os
 import sys
 import random
 import uuid
+import inspect
+import functools
+import hashlib
+import hmac
 import datetime
 import socket
 import math
@@ -25,6 +32,17 @@ from models.user import User
 from util.clock.lamport_clock import LamportClock
 from util.clock.vector_clock import VectorClock
 from util.clock.ntp_time import NTPClient, start_time_sync
+from util.location_catalog import LocationCatalog
+from util.timing_wheel import TimingWheel
+from util.scheduled_queue import ScheduledJobQueue
+from util.surge_pricing import SurgePricingEngine
+from util.metrics import ServiceMetrics
+from util.frame_rpc import FrameRPCServer
+from util.async_rpc import AsyncRPCServer
+from util.worker_pool import BoundedPoolMixIn
+from util.partitioning import partition_of, zone_partition
+from util.idempotency import IdempotencyCache, KeyReusedError, KEY_REUSED_STATUS
+from util.xmlrpc_transport import SharedServerProxy
 from config import settings
 
 # Configure logging
@@ -41,10 +59,99 @@ class RequestHandler(SimpleXMLRPCRequestHandler):
     """XML-RPC request handler with specific RPC path"""
     rpc_paths = (settings.RPC_PATH,)
 
-class ThreadedXMLRPCServer(ThreadingMixIn, SimpleXMLRPCServer):
+class ServiceDispatcherMixin:
+    """Per-method timing and batched multicall, shared by the XML-RPC and frame servers"""
+    metrics = None  # ServiceMetrics that per-method latency is recorded into
+    
+    def _replication_outbox(self):
+        """The service's outbox, so what a call replicates is sent once it has released the service lock"""
+        outbox = getattr(self.instance, "_replication_outbox", None)
+        return outbox() if outbox else nullcontext()
+    
+    def _dispatch(self, method, params):
+        """Dispatch a call, timing it when metrics are enabled"""
+        with self._replication_outbox():
+            if self.metrics is None or not self.metrics.enabled:
+                return super()._dispatch(method, params)
+            
+            start = time.perf_counter()
+            try:
+                return super()._dispatch(method, params)
+            finally:
+                # Only methods that exist get a histogram, so clients cannot grow the table
+                if method in self.funcs or (not method.startswith("_") and hasattr(self.instance, method)):
+                    self.metrics.record_rpc(method, time.perf_counter() - start)
+    
+    def system_multicall(self, call_list):
+        """Run a system.multicall batch, under one service lock acquisition where the service allows it"""
+        batch_guard = getattr(self.instance, "batch_guard", None)
+        with self._replication_outbox(), batch_guard(call_list) if batch_guard else nullcontext():
+            return super().system_multicall(call_list)
+
+class ThreadedXMLRPCServer(ServiceDispatcherMixin, ThreadingMixIn, SimpleXMLRPCServer):
     """Threaded XML-RPC Server to handle concurrent requests"""
     pass
 
+class PooledXMLRPCServer(ServiceDispatcherMixin, BoundedPoolMixIn, SimpleXMLRPCServer):
+    """XML-RPC Server with a fixed worker pool and a bounded accept queue (see util.worker_pool)"""
+    pass
+
+class FrameServer(ServiceDispatcherMixin, FrameRPCServer):
+    """Length-prefixed frame RPC server over persistent connections (see util.frame_rpc)"""
+    pass
+
+class AsyncServer(ServiceDispatcherMixin, AsyncRPCServer):
+    """Event-loop XML-RPC and frame RPC server with a bounded worker pool (see util.async_rpc)"""
+    pass
+
+def idempotent(method):
+    """
+    Make a mutating RPC safe to retry: a call repeating an earlier call's
+    idempotency_key gets that call's response (marked "replayed") instead of
+    running again. Calls without a key run as before.
+    
+    Keys are chosen by clients, so they are scoped to the method and to its
+    first argument, the user or ride the call acts for. A key reused with
+    other arguments is rejected with a Fault (KEY_REUSED_STATUS) instead of
+    being answered with the response to a different request.
+    """
+    signature = inspect.signature(method)
+    key_index = list(signature.parameters).index("idempotency_key") - 1
+    
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        key = kwargs.get("idempotency_key")
+        if key is None and len(args) > key_index:
+            key = args[key_index]
+        if not key:
+            return method(self, *args, **kwargs)
+        
+        bound = signature.bind(self, *args, **kwargs)
+        bound.apply_defaults()
+        arguments = [value for name, value in list(bound.arguments.items())[1:]
+                     if name not in ("client_clock", "idempotency_key")]
+        key = f"{method.__name__}:{arguments[0]}:{key}"
+        fingerprint = hashlib.sha256(json.dumps(arguments, default=str).encode()).hexdigest()
+        try:
+            response, replayed = self.idempotency.run(key, lambda: method(self, *args, **kwargs),
+                                                      cacheable=_cacheable_response, fingerprint=fingerprint)
+        except KeyReusedError as e:
+            raise xmlrpc.client.Fault(KEY_REUSED_STATUS, str(e))
+        if replayed:
+            return dict(response, replayed=True)
+        if _cacheable_response(response):
+            self._replicate_operation("idempotency", {"key": key, "response": response, "fingerprint": fingerprint})
+        return response
+    
+    return wrapper
+
+def _cacheable_response(response):
+    """A lost compare-and-set asks the client to retry, so it is not replayed"""
+    return not response.get("conflict")
+
+# Immutable read views published by CabService writers (see CabService._publish)
+ServiceSnapshot = namedtuple("ServiceSnapshot", ["available_drivers", "active_rides", "stats"])
+
 class CabService:
     """
     Core cab booking service implementation with features:
@@ -55,27 +162,72 @@ class CabService:
     - Clock synchronization
     - Vector clock for causality tracking
     """
-    def __init__(self, server_id, is_leader=False):
+    # RPCs that hold self.lock for their whole body
+    LOCKED_METHODS = frozenset([
+        "register_user", "authenticate_user", "book_cab", "schedule_ride",
+        "set_driver_available", "accept_ride"
+    ])
+    
+    # Read-only RPCs, served from snapshots when LOCK_FREE_READS is on
+    READ_METHODS = frozenset([
+        "get_ride_status", "get_available_cabs", "get_active_rides", "get_user_rides",
+        "get_server_stats", "get_metrics", "get_surge_pricing", "autocomplete_locations",
+        "get_server_time", "ping"
+    ])
+    
+    # RPCs a multicall batch may run back to back while holding self.lock
+    BATCH_SAFE_METHODS = LOCKED_METHODS | READ_METHODS | frozenset(["cancel_ride", "update_ride_status"])
+    
+    # Operations peers apply through the replicate RPC, each by its _replicate_<operation> handler
+    REPLICATED_OPERATIONS = frozenset([
+        "register_user", "book_ride", "schedule_ride", "dispatch_scheduled", "cancel_ride",
+        "update_ride_status", "accept_ride", "set_driver_available", "expire", "idempotency"
+    ])
+    
+    def __init__(self, server_id, is_leader=False, partition=None):
         """
         Initialize the cab service
         
         Args:
             server_id (int): Unique identifier for this server instance
             is_leader (bool): Whether this server is the leader for consensus
+            partition (tuple): (index, count) when this service owns one zone
+                partition of a multi-process server (see services.multiprocess_server)
         """
         self.server_id = server_id
         self.is_leader = is_leader
+        self.partition = partition
         self.logger = logging.getLogger(f"CabServer-{server_id}")
         
         # Data stores
         self.users = {}  # username -> User
         self.rides = {}  # ride_id -> Ride
         self.ride_counter = 1000
-        self.driver_locations = {}  # driver_name -> location
+        self.driver_locations = {}  # driver_name -> location id
+        self.locations = LocationCatalog()
         self.driver_availability = {}  # driver_name -> bool
         
+        # Latency histograms, lock wait/hold and replication timing
+        self.metrics = ServiceMetrics(settings.METRICS_ENABLED)
+        self._cpu_sample = (time.monotonic(), time.process_time())  # for the load reported by ping
+        
         # Synchronization
-        self.lock = threading.RLock()
+        self.lock = self.metrics.new_lock()
+        
+        # Responses of keyed writes, so retried calls are not applied twice
+        self.idempotency = IdempotencyCache(settings.IDEMPOTENCY_TTL, settings.IDEMPOTENCY_MAX_KEYS,
+                                            wait_timeout=settings.REQUEST_TIMEOUT)
+        self._publish_lock = threading.Lock()  # serializes snapshot publishing
+        
+        # Copy-on-write read views, swapped by writers after each commit
+        self._ride_views = {}  # ride_id -> published ride dict (never mutated)
+        self._user_ride_ids = {}  # username -> tuple of ride ids
+        self._published_rides = {}  # ride_id -> (status, driver_name) as last published
+        self._active_ride_views = {}  # ride_id -> published ride dict, writer side
+        self._ride_status_counts = {}  # status -> number of rides
+        self._user_counts = {}  # user_type -> number of users
+        self._available_driver_count = 0
+        self._snapshot = ServiceSnapshot((), (), self._build_stats())
         
         # Clock synchronization
         self.lamport_clock = LamportClock()
@@ -86,8 +238,40 @@ class CabService:
         self.ntp_client.sync_time()
         start_time_sync(settings.CLOCK_SYNC_INTERVAL)
         
+        # Zone-level surge pricing (zones are location ids)
+        self.surge = SurgePricingEngine(
+            window=settings.SURGE_WINDOW,
+            buckets=settings.SURGE_BUCKETS,
+            threshold=settings.SURGE_THRESHOLD,
+            sensitivity=settings.SURGE_SENSITIVITY,
+            max_multiplier=settings.SURGE_MAX_MULTIPLIER,
+            smoothing=settings.SURGE_SMOOTHING,
+            base_multiplier=settings.SURGE_FACTOR
+        )
+        self.surge.start(settings.SURGE_UPDATE_INTERVAL)
+        
+        # Expiry of unaccepted ride requests and lapsed driver heartbeats
+        self.expiry_timers = TimingWheel(tick=settings.EXPIRY_TICK_INTERVAL)
+        self._start_expiry_worker()
+        
+        # Future bookings, dispatched shortly before their pickup time
+        journal_path = None
+        if settings.USE_PERSISTENT_STORAGE:
+            journal_name = f"scheduled_rides_{server_id}.jsonl"
+            if partition is not None:
+                journal_name = f"scheduled_rides_{server_id}_p{partition[0]}.jsonl"
+            journal_path = os.path.join(settings.DATABASE_PATH, journal_name)
+        self.scheduled_rides = ScheduledJobQueue(journal_path, clock=self.ntp_client.get_time)
+        self._restore_scheduled_rides()
+        self.scheduled_rides.start_worker(
+            self._dispatch_scheduled_rides,
+            settings.SCHEDULED_DISPATCH_BATCH_SIZE,
+            name=f"scheduled-dispatch-{server_id}"
+        )
+        
         # Replication
-        self.peers = {}  # port -> ServerProxy
+        self.peers = {}  # port -> SharedServerProxy
+        self._outbox = threading.local()  # operations replicated by this thread's call, not sent yet
         self.init_peers()
         
         # Start with sample data if leader
@@ -98,14 +282,12 @@ class CabService:
 
     def init_peers(self):
         """Initialize connections to peer servers for replication"""
-        import xmlrpc.client
-        
         for i in range(settings.SERVER_COUNT):
             port = settings.BASE_SERVER_PORT + i
             if port != (settings.BASE_SERVER_PORT + self.server_id):
                 server_url = f"http://{settings.SERVER_HOST}:{port}{settings.RPC_PATH}"
                 try:
-                    self.peers[port] = xmlrpc.client.ServerProxy(server_url, allow_none=True)
+                    self.peers[port] = SharedServerProxy(server_url)
                     self.logger.debug(f"Connected to peer at {server_url}")
                 except Exception as e:
                     self.logger.warning(f"Failed to connect to peer at {server_url}: {e}")
@@ -134,15 +316,22 @@ class CabService:
             if user.user_type == "DRIVER":
                 # Set random locations for drivers
                 locations = ["Downtown", "Airport", "Mall", "University", "Tech Park"]
-                user.current_location = random.choice(locations)
-                user.is_available = True
+                location_id = self.locations.intern(random.choice(locations))
+                user.current_location = self.locations.get_name(location_id)
+                user.is_available = self._owns_zone(user.current_location)
                 user.vehicle_info = {
                     "type": random.choice(["Sedan", "SUV", "Hatchback"]),
                     "model": random.choice(["Swift", "City", "Innova", "Creta"]),
                     "license_plate": f"KA-{random.randint(10, 99)}-{random.choice('ABCDEFGH')}-{random.randint(1000, 9999)}"
                 }
-                self.driver_locations[user.username] = user.current_location
+                self.driver_locations[user.username] = location_id
                 self.driver_availability[user.username] = user.is_available
+                self.surge.update_driver(user.username, location_id, user.is_available)
+                if user.is_available:
+                    self._touch_driver_presence(user.username)
+        
+        with self.lock:
+            self._publish(drivers=True, users=True)
         
         self.logger.info(f"Sample data initialized with {len(sample_users)} users")
 
@@ -151,17 +340,34 @@ class CabService:
         Simple ping method for health checks
         
         Returns:
-            dict: Response with server clock
+            dict: Response with server clock, whether this server is the
+                  leader and its load, which load balancers route by
         """
         server_clock = self._update_lamport_on_receive(client_clock)
         return {
             "status": "ok",
             "server_id": self.server_id,
+            "is_leader": self.is_leader,
+            "load": self._load_report(),
             "server_clock": server_clock,
             "utc_time": self.ntp_client.get_utc_iso()
         }
 
-    def register_user(self, username, password, user_type, name=None, email=None, phone=None, client_clock=None):
+    def _load_report(self):
+        """CPU used since the last report (share of one core), accept queue depth and active rides"""
+        now, cpu = time.monotonic(), time.process_time()
+        last_now, last_cpu = self._cpu_sample
+        self._cpu_sample = (now, cpu)
+        pool = self.metrics.pool.pool_stats() if self.metrics.pool is not None else {}
+        return {
+            "cpu": round((cpu - last_cpu) / (now - last_now), 3) if now > last_now else 0.0,
+            "queue_depth": pool.get("queue_depth", 0),
+            "active_rides": len(self._snapshot.active_rides)
+        }
+
+    @idempotent
+    def register_user(self, username, password, user_type, name=None, email=None, phone=None, client_clock=None,
+                      idempotency_key=None):
         """
         Register a new user
         
@@ -173,6 +379,8 @@ class CabService:
             email (str): Email address of the user
             phone (str): Phone number of the user
             client_clock (int): Client's Lamport clock value
+            idempotency_key (str): Client-chosen key under which a retry of this call is answered
+                from the first call's response
             
         Returns:
             dict: Response with success status
@@ -199,6 +407,7 @@ class CabService:
             # Create new user
             user = User(username, password, user_type, name, email, phone)
             self.users[username] = user
+            self._publish(users=True)
             
             # Replicate to peers
             self._replicate_operation("register_user", {
@@ -271,7 +480,8 @@ class CabService:
                 "server_clock": server_clock
             }
 
-    def book_cab(self, username, pickup, destination, client_clock=None):
+    @idempotent
+    def book_cab(self, username, pickup, destination, client_clock=None, idempotency_key=None):
         """
         Book a new cab ride
         
@@ -280,6 +490,8 @@ class CabService:
             pickup (str): Pickup location
             destination (str): Destination location
             client_clock (int): Client's Lamport clock value
+            idempotency_key (str): Client-chosen key under which a retry of this call is answered
+                from the first call's response
             
         Returns:
             dict: Response with booking result
@@ -303,26 +515,33 @@ class CabService:
                     "server_clock": server_clock
                 }
             
+            # Resolve locations to catalog ids and canonical names
+            pickup_id = self.locations.intern(pickup)
+            destination_id = self.locations.intern(destination)
+            if pickup_id is None or destination_id is None:
+                return {
+                    "success": False,
+                    "message": "Pickup and destination required",
+                    "server_clock": server_clock
+                }
+            pickup = self.locations.get_name(pickup_id)
+            destination = self.locations.get_name(destination_id)
+            
             # Generate ride ID
-            ride_id = Ride.generate_ride_id()
+            ride_id = self._new_ride_id()
             
             # Calculate estimated fare
-            estimated_fare = self._calculate_fare(pickup, destination)
+            self.surge.record_request(pickup_id)
+            estimated_fare = self._calculate_fare(pickup, destination, pickup_id)
             
             # Create new ride
             ride = Ride(ride_id, username, pickup, destination)
+            ride.pickup_id = pickup_id
+            ride.destination_id = destination_id
             ride.fare = estimated_fare
             
             # Find available driver
-            available_driver = self._find_nearest_driver(pickup)
-            
-            if available_driver:
-                ride.driver_name = available_driver
-                ride.status = "ACCEPTED"
-                self.driver_availability[available_driver] = False
-                self.logger.info(f"Ride {ride_id} assigned to driver {available_driver}")
-            else:
-                self.logger.info(f"No drivers available for ride {ride_id}")
+            self._match_ride(ride)
             
             # Store ride
             self.rides[ride_id] = ride
@@ -333,6 +552,7 @@ class CabService:
             
             ride.estimated_distance = distance
             ride.estimated_time = duration
+            self._publish([ride_id], drivers=ride.driver_name is not None)
             
             # Replicate to peers
             self._replicate_operation("book_ride", {
@@ -359,58 +579,184 @@ class CabService:
                 "server_clock": server_clock
             }
 
-    def cancel_ride(self, ride_id, client_clock=None):
+    @idempotent
+    def schedule_ride(self, username, pickup, destination, pickup_time, client_clock=None,
+                      idempotency_key=None):
         """
-        Cancel a booked ride
+        Book a cab for a future pickup time
+        
+        The ride is held as SCHEDULED and dispatched through the normal
+        matching path SCHEDULED_RIDE_DISPATCH_LEAD seconds before pickup.
         
         Args:
-            ride_id (str): ID of the ride to cancel
+            username (str): Username of the rider
+            pickup (str): Pickup location
+            destination (str): Destination location
+            pickup_time (float): Requested pickup time as a UNIX timestamp
             client_clock (int): Client's Lamport clock value
+            idempotency_key (str): Client-chosen key under which a retry of this call is answered
+                from the first call's response
             
         Returns:
-            dict: Response with cancellation result
+            dict: Response with booking result
         """
         server_clock = self._update_lamport_on_receive(client_clock)
         
+        try:
+            pickup_time = float(pickup_time)
+        except (TypeError, ValueError):
+            return {
+                "success": False,
+                "message": "Invalid pickup time",
+                "server_clock": server_clock
+            }
+        
+        now = self.ntp_client.get_time()
+        if not now + settings.SCHEDULED_RIDE_MIN_LEAD <= pickup_time <= now + settings.SCHEDULED_RIDE_MAX_AHEAD:
+            return {
+                "success": False,
+                "message": (f"Pickup time must be between {settings.SCHEDULED_RIDE_MIN_LEAD // 60} minutes "
+                            f"and {settings.SCHEDULED_RIDE_MAX_AHEAD // 86400} days from now"),
+                "server_clock": server_clock
+            }
+        
         with self.lock:
-            # Check if ride exists
-            if ride_id not in self.rides:
+            # Check if user exists and is a rider
+            if username not in self.users:
                 return {
                     "success": False,
-                    "message": "Ride not found",
+                    "message": "User not found",
                     "server_clock": server_clock
                 }
             
-            ride = self.rides[ride_id]
+            if self.users[username].user_type != "RIDER":
+                return {
+                    "success": False,
+                    "message": "Only riders can book cabs",
+                    "server_clock": server_clock
+                }
             
-            # Check if ride can be cancelled
-            if ride.status in ["COMPLETED", "CANCELLED"]:
+            # Resolve locations to catalog ids and canonical names
+            pickup_id = self.locations.intern(pickup)
+            destination_id = self.locations.intern(destination)
+            if pickup_id is None or destination_id is None:
                 return {
                     "success": False,
-                    "message": f"Cannot cancel a ride that is {ride.status}",
+                    "message": "Pickup and destination required",
                     "server_clock": server_clock
                 }
+            pickup = self.locations.get_name(pickup_id)
+            destination = self.locations.get_name(destination_id)
             
-            # Free up the driver
-            if ride.driver_name and ride.driver_name in self.driver_availability:
-                self.driver_availability[ride.driver_name] = True
+            # Create the scheduled ride
+            ride_id = self._new_ride_id()
+            ride = Ride(ride_id, username, pickup, destination)
+            ride.pickup_id = pickup_id
+            ride.destination_id = destination_id
+            ride.status = "SCHEDULED"
+            ride.scheduled_time = pickup_time
+            ride.fare = self._calculate_fare(pickup, destination, pickup_id)
+            ride.estimated_distance = self._estimate_distance(pickup, destination)
+            ride.estimated_time = self._estimate_duration(ride.estimated_distance)
             
-            # Update ride status
-            ride.update_status("CANCELLED", self.server_id)
+            self.rides[ride_id] = ride
+            self.scheduled_rides.push(
+                ride_id,
+                pickup_time - settings.SCHEDULED_RIDE_DISPATCH_LEAD,
+                ride.to_dict()
+            )
+            self._publish([ride_id])
             
             # Replicate to peers
-            self._replicate_operation("cancel_ride", {
-                "ride_id": ride_id
+            self._replicate_operation("schedule_ride", {
+                "ride_id": ride_id,
+                "rider_name": username,
+                "pickup": pickup,
+                "destination": destination,
+                "fare": ride.fare,
+                "scheduled_time": pickup_time
             })
             
-            self.logger.info(f"Ride {ride_id} cancelled")
+            self.logger.info(f"Ride {ride_id} scheduled by {username} for {time.ctime(pickup_time)}")
             
             return {
                 "success": True,
-                "message": "Ride cancelled successfully",
+                "message": "Ride scheduled successfully",
+                "ride_id": ride_id,
+                "estimated_fare": ride.fare,
+                "status": ride.status,
+                "scheduled_time": pickup_time,
+                "estimated_distance": ride.estimated_distance,
+                "estimated_time": ride.estimated_time,
                 "server_clock": server_clock
             }
 
+    @idempotent
+    def cancel_ride(self, ride_id, client_clock=None, expected_version=None, idempotency_key=None):
+        """
+        Cancel a booked ride
+        
+        Args:
+            ride_id (str): ID of the ride to cancel
+            client_clock (int): Client's Lamport clock value
+            expected_version (int): Ride version the client last saw, if any
+            idempotency_key (str): Client-chosen key under which a retry of this call is answered
+                from the first call's response
+            
+        Returns:
+            dict: Response with cancellation result
+        """
+        server_clock = self._update_lamport_on_receive(client_clock)
+        
+        # Check if ride exists
+        ride = self.rides.get(ride_id)
+        if ride is None:
+            return {
+                "success": False,
+                "message": "Ride not found",
+                "server_clock": server_clock
+            }
+        
+        # Compare-and-set on the ride version instead of the service lock
+        version, status, conflict = self._transition_ride(ride, "CANCELLED", expected_version=expected_version)
+        if version is None:
+            return {
+                "success": False,
+                "message": (f"Ride {ride_id} was modified concurrently, please retry" if conflict
+                            else f"Cannot cancel a ride that is {status}"),
+                "conflict": conflict,
+                "server_clock": server_clock
+            }
+        
+        self.expiry_timers.cancel(("ride", ride_id))
+        self.scheduled_rides.cancel(ride_id)
+        
+        # Free up the driver
+        if ride.driver_name:
+            with self.lock:
+                if ride.driver_name in self.driver_availability:
+                    self.driver_availability[ride.driver_name] = True
+                    self.surge.update_driver(ride.driver_name, self.driver_locations.get(ride.driver_name), True)
+                    self._touch_driver_presence(ride.driver_name)
+                self._publish([ride_id], drivers=True)
+        else:
+            self._publish([ride_id])
+        
+        # Replicate to peers
+        self._replicate_operation("cancel_ride", {
+            "ride_id": ride_id,
+            "version": version
+        })
+        
+        self.logger.info(f"Ride {ride_id} cancelled")
+        
+        return {
+            "success": True,
+            "message": "Ride cancelled successfully",
+            "version": version,
+            "server_clock": server_clock
+        }
+
     def get_ride_status(self, ride_id, client_clock=None):
         """
         Get the status of a ride
@@ -424,24 +770,26 @@ class CabService:
         """
         server_clock = self._update_lamport_on_receive(client_clock)
         
-        with self.lock:
+        with self._read_guard():
+            ride_info = self._ride_views.get(ride_id)
+            
             # Check if ride exists
-            if ride_id not in self.rides:
+            if ride_info is None:
                 return {
                     "success": False,
                     "message": "Ride not found",
                     "server_clock": server_clock
                 }
             
-            ride = self.rides[ride_id]
-            
             return {
                 "success": True,
-                "ride_info": ride.to_dict(),
+                "ride_info": ride_info,
                 "server_clock": server_clock
             }
 
-    def update_ride_status(self, ride_id, new_status, client_clock=None):
+    @idempotent
+    def update_ride_status(self, ride_id, new_status, client_clock=None, expected_version=None,
+                           idempotency_key=None):
         """
         Update the status of a ride
         
@@ -449,53 +797,137 @@ class CabService:
             ride_id (str): ID of the ride to update
             new_status (str): New status for the ride
             client_clock (int): Client's Lamport clock value
+            expected_version (int): Ride version the client last saw, if any
+            idempotency_key (str): Client-chosen key under which a retry of this call is answered
+                from the first call's response
             
         Returns:
             dict: Response with update result
         """
         server_clock = self._update_lamport_on_receive(client_clock)
         
+        # Check if ride exists
+        ride = self.rides.get(ride_id)
+        if ride is None:
+            return {
+                "success": False,
+                "message": "Ride not found",
+                "server_clock": server_clock
+            }
+        
+        # Scheduled rides leave SCHEDULED only through dispatch or cancellation
+        from_statuses = None
+        if new_status != "CANCELLED":
+            from_statuses = [status for status in settings.RIDE_STATUS_TRANSITIONS if status != "SCHEDULED"]
+        
+        version, status, conflict = self._transition_ride(
+            ride, new_status, from_statuses, expected_version=expected_version
+        )
+        if version is None:
+            return {
+                "success": False,
+                "message": (f"Ride {ride_id} was modified concurrently, please retry" if conflict
+                            else f"Invalid status transition from {status} to {new_status}"),
+                "conflict": conflict,
+                "server_clock": server_clock
+            }
+        
+        self.expiry_timers.cancel(("ride", ride_id))
+        self.scheduled_rides.cancel(ride_id)
+        self._publish([ride_id])
+        
+        # Replicate to peers
+        self._replicate_operation("update_ride_status", {
+            "ride_id": ride_id,
+            "new_status": new_status,
+            "version": version
+        })
+        
+        self.logger.info(f"Ride {ride_id} status updated to {new_status}")
+        
+        return {
+            "success": True,
+            "message": f"Ride status updated to {new_status}",
+            "version": version,
+            "server_clock": server_clock
+        }
+
+    @idempotent
+    def accept_ride(self, ride_id, driver_name, client_clock=None, expected_version=None,
+                    idempotency_key=None):
+        """
+        Let a driver accept a ride that is still waiting for one
+        
+        Args:
+            ride_id (str): ID of the ride to accept
+            driver_name (str): Username of the accepting driver
+            client_clock (int): Client's Lamport clock value
+            expected_version (int): Ride version the driver last saw, if any
+            idempotency_key (str): Client-chosen key under which a retry of this call is answered
+                from the first call's response
+            
+        Returns:
+            dict: Response with acceptance result
+        """
+        server_clock = self._update_lamport_on_receive(client_clock)
+        
+        ride = self.rides.get(ride_id)
+        if ride is None:
+            return {
+                "success": False,
+                "message": "Ride not found",
+                "server_clock": server_clock
+            }
+        
+        # The driver claim must not interleave with matching in book_cab
         with self.lock:
-            # Check if ride exists
-            if ride_id not in self.rides:
+            user = self.users.get(driver_name)
+            if user is None or user.user_type != "DRIVER":
                 return {
                     "success": False,
-                    "message": "Ride not found",
+                    "message": "Only drivers can accept rides",
                     "server_clock": server_clock
                 }
             
-            ride = self.rides[ride_id]
-            
-            # Validate status transition
-            valid_transitions = {
-                "REQUESTED": ["ACCEPTED", "CANCELLED"],
-                "ACCEPTED": ["IN_PROGRESS", "CANCELLED"],
-                "IN_PROGRESS": ["COMPLETED", "CANCELLED"]
-            }
-            
-            if ride.status not in valid_transitions or new_status not in valid_transitions.get(ride.status, []):
+            if not self.driver_availability.get(driver_name):
                 return {
                     "success": False,
-                    "message": f"Invalid status transition from {ride.status} to {new_status}",
+                    "message": "Driver is not available",
                     "server_clock": server_clock
                 }
             
-            # Update ride status
-            ride.update_status(new_status, self.server_id)
-            
-            # Replicate to peers
-            self._replicate_operation("update_ride_status", {
-                "ride_id": ride_id,
-                "new_status": new_status
-            })
-            
-            self.logger.info(f"Ride {ride_id} status updated to {new_status}")
+            version, status, conflict = self._transition_ride(
+                ride, "ACCEPTED", ["REQUESTED"], expected_version, driver_name=driver_name
+            )
+            if version is None:
+                return {
+                    "success": False,
+                    "message": (f"Ride {ride_id} was modified concurrently, please retry" if conflict
+                                else f"Ride is no longer available ({status})"),
+                    "conflict": conflict,
+                    "server_clock": server_clock
+                }
             
-            return {
-                "success": True,
-                "message": f"Ride status updated to {new_status}",
-                "server_clock": server_clock
-            }
+            self.driver_availability[driver_name] = False
+            self.surge.update_driver(driver_name, None, False)
+            self.expiry_timers.cancel(("ride", ride_id))
+            self._publish([ride_id], drivers=True)
+        
+        # Replicate to peers
+        self._replicate_operation("accept_ride", {
+            "ride_id": ride_id,
+            "driver_name": driver_name,
+            "version": version
+        })
+        
+        self.logger.info(f"Ride {ride_id} accepted by driver {driver_name}")
+        
+        return {
+            "success": True,
+            "message": "Ride accepted successfully",
+            "version": version,
+            "server_clock": server_clock
+        }
 
     def set_driver_available(self, driver_name, location, is_available=True, client_clock=None):
         """
@@ -530,10 +962,20 @@ class CabService:
                 }
             
             # Update driver's location and availability
+            location_id = self.locations.intern(location)
+            location = self.locations.get_name(location_id)
             user.current_location = location
             user.is_available = is_available
-            self.driver_locations[driver_name] = location
+            self.driver_locations[driver_name] = location_id
             self.driver_availability[driver_name] = is_available
+            self.surge.update_driver(driver_name, location_id, is_available)
+            
+            # Each update doubles as a presence heartbeat
+            if is_available:
+                self._touch_driver_presence(driver_name)
+            else:
+                self.expiry_timers.cancel(("driver", driver_name))
+            self._publish(drivers=True)
             
             # Replicate to peers
             self._replicate_operation("set_driver_available", {
@@ -563,30 +1005,12 @@ class CabService:
         """
         server_clock = self._update_lamport_on_receive(client_clock)
         
-        with self.lock:
-            available_drivers = []
-            
-            for username, user in self.users.items():
-                if (user.user_type == "DRIVER" and 
-                    username in self.driver_availability and 
-                    self.driver_availability[username]):
-                    
-                    # Check if driver is near the location
-                    driver_location = self.driver_locations.get(username)
-                    if driver_location:
-                        # In a real system, we would calculate actual distance
-                        # Here we're simplifying by considering all drivers available
-                        available_drivers.append({
-                            "username": username,
-                            "name": user.name,
-                            "location": driver_location,
-                            "rating": user.rating,
-                            "vehicle_info": user.vehicle_info
-                        })
-            
+        with self._read_guard():
+            # In a real system, we would filter by distance to the location
+            # Here we're simplifying by considering all drivers available
             return {
                 "success": True,
-                "available_drivers": available_drivers,
+                "available_drivers": list(self._snapshot.available_drivers),
                 "server_clock": server_clock
             }
 
@@ -602,16 +1026,10 @@ class CabService:
         """
         server_clock = self._update_lamport_on_receive(client_clock)
         
-        with self.lock:
-            active_rides = []
-            
-            for ride_id, ride in self.rides.items():
-                if ride.status not in ["COMPLETED", "CANCELLED"]:
-                    active_rides.append(ride.to_dict())
-            
+        with self._read_guard():
             return {
                 "success": True,
-                "active_rides": active_rides,
+                "active_rides": list(self._snapshot.active_rides),
                 "server_clock": server_clock
             }
 
@@ -628,12 +1046,9 @@ class CabService:
         """
         server_clock = self._update_lamport_on_receive(client_clock)
         
-        with self.lock:
-            user_rides = []
-            
-            for ride_id, ride in self.rides.items():
-                if ride.rider_name == username or ride.driver_name == username:
-                    user_rides.append(ride.to_dict())
+        with self._read_guard():
+            ride_views = self._ride_views
+            user_rides = [ride_views[ride_id] for ride_id in self._user_ride_ids.get(username, ())]
             
             return {
                 "success": True,
@@ -641,6 +1056,53 @@ class CabService:
                 "server_clock": server_clock
             }
 
+    def autocomplete_locations(self, prefix, limit=None, client_clock=None):
+        """
+        Suggest known locations for a partially typed name
+        
+        Args:
+            prefix (str): Prefix typed by the user
+            limit (int): Maximum number of suggestions
+            client_clock (int): Client's Lamport clock value
+            
+        Returns:
+            dict: Response with matching locations
+        """
+        server_clock = self._update_lamport_on_receive(client_clock)
+        
+        if limit is None:
+            limit = settings.LOCATION_AUTOCOMPLETE_LIMIT
+        
+        return {
+            "success": True,
+            "locations": self.locations.autocomplete(prefix, int(limit)),
+            "server_clock": server_clock
+        }
+
+    def get_surge_pricing(self, client_clock=None):
+        """
+        Get the current surge multiplier, demand and supply per zone
+        
+        Args:
+            client_clock (int): Client's Lamport clock value
+            
+        Returns:
+            dict: Response with per-zone surge information
+        """
+        server_clock = self._update_lamport_on_receive(client_clock)
+        
+        zones = []
+        for zone, info in self.surge.snapshot().items():
+            zones.append(dict(info, location_id=zone, location=self.locations.get_name(zone)))
+        zones.sort(key=lambda z: z["multiplier"], reverse=True)
+        
+        return {
+            "success": True,
+            "base_multiplier": settings.SURGE_FACTOR,
+            "zones": zones,
+            "server_clock": server_clock
+        }
+
     def get_server_time(self, client_clock=None):
         """
         Get the current server time
@@ -693,36 +1155,122 @@ class CabService:
                 "server_clock": server_clock
             }
 
-    def _find_nearest_driver(self, pickup):
+    def _find_nearest_driver(self, pickup_id):
         """
         Find the nearest available driver to a pickup location
         
         Args:
-            pickup (str): Pickup location
+            pickup_id (int): Location id of the pickup
             
         Returns:
             str or None: Username of nearest driver, or None if no drivers available
         """
         available_drivers = []
+        nearby_drivers = []
         
         for driver, is_available in self.driver_availability.items():
             if is_available and driver in self.driver_locations:
                 available_drivers.append(driver)
+                if self.driver_locations[driver] == pickup_id:
+                    nearby_drivers.append(driver)
         
         if not available_drivers:
             return None
         
         # In a real system, we would calculate actual distances
-        # For now, just pick a random available driver
-        return random.choice(available_drivers)
+        # For now, prefer drivers already at the pickup, else any available driver
+        return random.choice(nearby_drivers or available_drivers)
+
+    def _match_ride(self, ride, expected_version=None):
+        """
+        Assign an available driver to a ride, or leave it REQUESTED with an expiry timer
+        
+        Caller must hold self.lock.
+        
+        Args:
+            ride (Ride): Ride to match
+            expected_version (int): Version of an already published ride to
+                compare-and-set against, or None for a ride not yet stored
+            
+        Returns:
+            bool: False if a published ride changed before it could be matched
+        """
+        available_driver = self._find_nearest_driver(ride.pickup_id)
+        new_status = "ACCEPTED" if available_driver else "REQUESTED"
+        
+        if expected_version is None:
+            ride.driver_name = available_driver
+            ride.status = new_status
+        elif ride.compare_and_set(expected_version, new_status, self.server_id, driver_name=available_driver) is None:
+            return False
+        
+        if available_driver:
+            self.driver_availability[available_driver] = False
+            self.surge.update_driver(available_driver, None, False)
+            self.logger.info(f"Ride {ride.ride_id} assigned to driver {available_driver}")
+        else:
+            self.expiry_timers.schedule(("ride", ride.ride_id), settings.RIDE_REQUEST_TIMEOUT)
+            self.logger.info(f"No drivers available for ride {ride.ride_id}")
+        return True
+
+    def _restore_scheduled_rides(self):
+        """Recreate scheduled rides from the persisted dispatch queue"""
+        with self.lock:
+            restored = []
+            for ride_id, _, payload in self.scheduled_rides.jobs():
+                if ride_id not in self.rides and payload:
+                    self.rides[ride_id] = Ride.from_dict(payload)
+                    restored.append(ride_id)
+            self._publish(restored)
+
+    def _dispatch_scheduled_rides(self, batch):
+        """
+        Dispatch a batch of scheduled rides that are due
+        
+        Args:
+            batch (list): (ride_id, ride dict) tuples from the dispatch queue
+        """
+        with self._replication_outbox(), self.lock:
+            dispatched = []
+            
+            for ride_id, payload in batch:
+                ride = self.rides.get(ride_id)
+                if ride is None and payload:
+                    ride = Ride.from_dict(payload)
+                    self.rides[ride_id] = ride
+                if ride is None:
+                    continue
+                
+                # A concurrent cancellation wins over dispatch
+                status, version = ride.read_state()
+                if status != "SCHEDULED" or not self._match_ride(ride, version):
+                    continue
+                
+                dispatched.append({
+                    "ride_id": ride_id,
+                    "driver_name": ride.driver_name,
+                    "status": ride.status,
+                    "version": version + 1
+                })
+            
+            self._publish([d["ride_id"] for d in dispatched], drivers=True)
+            
+            if not dispatched:
+                return
+            
+            # Replicate the whole batch as one operation
+            self._replicate_operation("dispatch_scheduled", {"rides": dispatched})
+            
+            self.logger.info(f"Dispatched {len(dispatched)} scheduled rides")
 
-    def _calculate_fare(self, pickup, destination):
+    def _calculate_fare(self, pickup, destination, zone=None):
         """
         Calculate the fare for a ride
         
         Args:
             pickup (str): Pickup location
             destination (str): Destination location
+            zone (int): Surge pricing zone (pickup location id)
             
         Returns:
             float: Estimated fare
@@ -733,7 +1281,7 @@ class CabService:
         # Calculate fare based on distance
         base_fare = settings.BASE_FARE
         per_km_rate = settings.PER_KM_RATE
-        surge_factor = settings.SURGE_FACTOR
+        surge_factor = self.surge.multiplier(zone)
         
         fare = base_fare + (distance * per_km_rate)
         fare *= surge_factor
@@ -788,10 +1336,262 @@ class CabService:
         
         return int(round(duration))
 
+    def _transition_ride(self, ride, new_status, from_statuses=None, expected_version=None, **changes):
+        """
+        Move a ride to a new status with a compare-and-set on its version
+        
+        Transitions on different rides never share a lock. When another change
+        wins the race the transition is re-validated against the status it left
+        behind and retried (up to RIDE_CAS_MAX_RETRIES) only while still valid,
+        so conflicting transitions fail fast.
+        
+        Args:
+            ride (Ride): Ride to update
+            new_status (str): Status to move to
+            from_statuses (list): Restrict the statuses the ride may move from
+            expected_version (int): Version the client last saw; any other fails
+            **changes: Other ride attributes to set with the status
+            
+        Returns:
+            tuple: (new version or None, status the decision was made on,
+                    whether it failed on a version conflict)
+        """
+        for _ in range(settings.RIDE_CAS_MAX_RETRIES):
+            status, version = ride.read_state()
+            if expected_version is not None and version != expected_version:
+                return None, status, True
+            if new_status not in settings.RIDE_STATUS_TRANSITIONS.get(status, []):
+                return None, status, False
+            if from_statuses is not None and status not in from_statuses:
+                return None, status, False
+            
+            new_version = ride.compare_and_set(version, new_status, self.server_id, **changes)
+            if new_version is not None:
+                return new_version, status, False
+        
+        return None, None, True
+
+    def batch_guard(self, calls):
+        """
+        Lock to hold around a system.multicall batch
+        
+        A batch runs under one acquisition of self.lock when every call in it
+        is batch-safe and at least one would take the lock anyway, so the
+        batch pays for the lock once instead of once per call. Anything else
+        runs unguarded, each call locking as it normally would.
+        
+        Args:
+            calls (list): Multicall entries ({"methodName": ..., "params": ...})
+        """
+        locking = False
+        for call in calls:
+            method = call.get("methodName") if isinstance(call, dict) else None
+            if method not in self.BATCH_SAFE_METHODS:
+                return nullcontext()
+            if method in self.LOCKED_METHODS or (method in self.READ_METHODS and not settings.LOCK_FREE_READS):
+                locking = True
+        return self.lock if locking else nullcontext()
+
+    def _read_guard(self):
+        """Lock taken by read-only RPCs: none when LOCK_FREE_READS, else the service lock"""
+        return nullcontext() if settings.LOCK_FREE_READS else self.lock
+
+    def _publish(self, ride_ids=(), drivers=False, users=False):
+        """
+        Publish read views after a write commits
+        
+        Caller must hold self.lock when publishing drivers or users; ride-only
+        publishes from lock-free transitions are serialized by _publish_lock.
+        Readers never take a lock: each ride view is a fresh dict replaced by
+        key, and the available drivers, active rides and counters go into a
+        new ServiceSnapshot that replaces the previous one in a single
+        assignment.
+        
+        Args:
+            ride_ids (iterable): Rides created or changed by the write
+            drivers (bool): Whether driver availability or location changed
+            users (bool): Whether users were added
+        """
+        with self._publish_lock:
+            snapshot = self._snapshot
+            counts = self._ride_status_counts
+            rides_changed = False
+            
+            for ride_id in ride_ids:
+                ride = self.rides.get(ride_id)
+                if ride is None:
+                    continue
+                rides_changed = True
+                
+                view = ride.snapshot()
+                status, driver_name = view["status"], view["driver_name"]
+                
+                old_status, old_driver = self._published_rides.get(ride_id, (None, None))
+                if old_status is not None:
+                    counts[old_status] -= 1
+                counts[status] = counts.get(status, 0) + 1
+                self._published_rides[ride_id] = (status, driver_name)
+                self._ride_views[ride_id] = view
+                
+                # Index the ride under each participant the first time they appear
+                if old_status is None:
+                    self._index_user_ride(ride.rider_name, ride_id)
+                if driver_name and driver_name != old_driver:
+                    self._index_user_ride(driver_name, ride_id)
+                
+                if status in ["COMPLETED", "CANCELLED"]:
+                    self._active_ride_views.pop(ride_id, None)
+                else:
+                    self._active_ride_views[ride_id] = view
+            
+            available_drivers = snapshot.available_drivers
+            if drivers:
+                available_drivers = tuple(self._build_available_drivers())
+            
+            active_rides = snapshot.active_rides
+            if rides_changed:
+                active_rides = tuple(self._active_ride_views.values())
+            
+            if users:
+                user_counts = {}
+                for user in self.users.values():
+                    user_counts[user.user_type] = user_counts.get(user.user_type, 0) + 1
+                self._user_counts = user_counts
+            
+            self._snapshot = ServiceSnapshot(available_drivers, active_rides, self._build_stats())
+
+    def _index_user_ride(self, username, ride_id):
+        """Append a ride to a user's published ride index (caller holds the lock)"""
+        self._user_ride_ids[username] = self._user_ride_ids.get(username, ()) + (ride_id,)
+
+    def _build_available_drivers(self):
+        """Build the available-driver view (caller holds the lock)"""
+        available_drivers = []
+        self._available_driver_count = 0
+        
+        for username, is_available in self.driver_availability.items():
+            user = self.users.get(username)
+            if not is_available or user is None or user.user_type != "DRIVER":
+                continue
+            self._available_driver_count += 1
+            
+            driver_location = self.locations.get_name(self.driver_locations.get(username))
+            if driver_location:
+                available_drivers.append({
+                    "username": username,
+                    "name": user.name,
+                    "location": driver_location,
+                    "rating": user.rating,
+                    "vehicle_info": dict(user.vehicle_info) if user.vehicle_info else user.vehicle_info
+                })
+        
+        return available_drivers
+
+    def _build_stats(self):
+        """Build the published counters (caller holds the lock)"""
+        counts = self._ride_status_counts
+        driver_count = self._user_counts.get("DRIVER", 0)
+        
+        return {
+            "users": {
+                "total": len(self.users),
+                "riders": self._user_counts.get("RIDER", 0),
+                "drivers": driver_count,
+            },
+            "rides": {
+                "total": len(self.rides),
+                "active": sum(counts.get(status, 0) for status in ["REQUESTED", "ACCEPTED", "IN_PROGRESS"]),
+                "completed": counts.get("COMPLETED", 0),
+                "cancelled": counts.get("CANCELLED", 0),
+            },
+            "drivers": {
+                "total": driver_count,
+                "available": self._available_driver_count,
+            }
+        }
+
+    def _owns_zone(self, location):
+        """Whether rides and drivers in a zone belong to this service (always, unless partitioned)"""
+        if self.partition is None:
+            return True
+        index, count = self.partition
+        return zone_partition(location, count) == index
+
+    def _new_ride_id(self):
+        """Generate a ride id; in a partitioned server, one that maps to this partition"""
+        ride_id = Ride.generate_ride_id()
+        if self.partition is not None:
+            index, count = self.partition
+            while partition_of(ride_id, count) != index:
+                ride_id = Ride.generate_ride_id()
+        return ride_id
+
+    def _touch_driver_presence(self, driver_name):
+        """Restart a driver's presence TTL"""
+        self.expiry_timers.schedule(("driver", driver_name), settings.DRIVER_PRESENCE_TTL)
+
+    def _expire_due(self):
+        """
+        Apply expired ride requests and driver heartbeats
+        
+        Expirations are applied and replicated in batches of
+        EXPIRY_BATCH_SIZE, one lock acquisition per batch.
+        """
+        expired = self.expiry_timers.advance()
+        
+        for start in range(0, len(expired), settings.EXPIRY_BATCH_SIZE):
+            batch = expired[start:start + settings.EXPIRY_BATCH_SIZE]
+            
+            with self._replication_outbox(), self.lock:
+                expired_rides = []  # {"ride_id", "version"} of each cancelled request
+                driver_names = []
+                
+                for kind, key in batch:
+                    if kind == "ride":
+                        ride = self.rides.get(key)
+                        version = self._transition_ride(ride, "CANCELLED", ["REQUESTED"])[0] if ride else None
+                        if version is not None:
+                            expired_rides.append({"ride_id": key, "version": version})
+                    elif kind == "driver":
+                        if self.driver_availability.get(key):
+                            self.driver_availability[key] = False
+                            self.users[key].is_available = False
+                            self.surge.update_driver(key, None, False)
+                            driver_names.append(key)
+                
+                self._publish([r["ride_id"] for r in expired_rides], drivers=bool(driver_names))
+                
+                if not expired_rides and not driver_names:
+                    continue
+                
+                # Replicate the whole batch as one operation
+                self._replicate_operation("expire", {
+                    "rides": expired_rides,
+                    "driver_names": driver_names
+                })
+                
+                self.logger.info(f"Expired {len(expired_rides)} ride requests and {len(driver_names)} stale drivers")
+
+    def _start_expiry_worker(self):
+        """Start a background thread that turns the expiry timing wheel"""
+        def expiry_worker():
+            while True:
+                try:
+                    self._expire_due()
+                except Exception as e:
+                    self.logger.error(f"Error in expiry worker: {e}")
+                time.sleep(settings.EXPIRY_TICK_INTERVAL)
+        
+        expiry_thread = threading.Thread(target=expiry_worker, daemon=True)
+        expiry_thread.start()
+
     def _replicate_operation(self, operation, params):
         """
         Replicate an operation to peer servers
         
+        Inside a _replication_outbox block, as every RPC is, the operation is
+        sent when the block ends rather than under the service lock.
+        
         Args:
             operation (str): Name of the operation to replicate
             params (dict): Parameters for the operation
@@ -804,26 +1604,81 @@ class CabService:
         self.vector_clock.increment()
         params["vector_clock"] = self.vector_clock.get_clock()
         
+        operations = getattr(self._outbox, "operations", None)
+        if operations is not None:
+            operations.append((operation, params))
+            return
+        self._send_replication(operation, params)
+    
+    @contextmanager
+    def _replication_outbox(self):
+        """
+        Hold the operations replicated inside the block and send them as it
+        ends, once the block has released self.lock. Two servers replicating
+        to each other while holding their locks would each wait for the other.
+        Blocks nest; the outermost one sends.
+        """
+        if getattr(self._outbox, "operations", None) is not None:
+            yield
+            return
+        self._outbox.operations = []
+        try:
+            yield
+        finally:
+            operations, self._outbox.operations = self._outbox.operations, None
+            for operation, params in operations:
+                self._send_replication(operation, params)
+    
+    def _send_replication(self, operation, params):
+        """Send a replicated operation to the peers, as REPLICATION_MODE says"""
         # Synchronous replication waits for all peers to acknowledge
         if settings.REPLICATION_MODE == "synchronous":
             for port, peer in self.peers.items():
+                start = time.perf_counter()
                 try:
-                    getattr(peer, f"_replicate_{operation}")(params, self.lamport_clock.get_time())
+                    peer.replicate(operation, params, self.lamport_clock.get_time(), settings.REPLICATION_TOKEN)
                 except Exception as e:
                     self.logger.error(f"Failed to replicate {operation} to peer at port {port}: {e}")
                     # In a production system, we might want to retry or handle this differently
+                self.metrics.record_replication(port, time.perf_counter() - start)
         
         # Asynchronous replication happens in the background
         elif settings.REPLICATION_MODE == "asynchronous":
             def replicate_async():
                 for port, peer in self.peers.items():
+                    start = time.perf_counter()
                     try:
-                        getattr(peer, f"_replicate_{operation}")(params, self.lamport_clock.get_time())
+                        peer.replicate(operation, params, self.lamport_clock.get_time(), settings.REPLICATION_TOKEN)
                     except Exception as e:
                         self.logger.error(f"Failed to replicate {operation} to peer at port {port}: {e}")
+                    self.metrics.record_replication(port, time.perf_counter() - start)
             
             threading.Thread(target=replicate_async, daemon=True).start()
 
+    def replicate(self, operation, params, client_clock=None, token=None):
+        """
+        Apply an operation replicated by a peer
+        
+        XML-RPC servers refuse method names starting with an underscore, so
+        peers call this endpoint, which runs the _replicate_<operation> handler.
+        Only peers know REPLICATION_TOKEN; a call without it is refused.
+        
+        Args:
+            operation (str): One of REPLICATED_OPERATIONS
+            params (dict): Parameters for the operation
+            client_clock (int): Peer's Lamport clock value
+            token (str): The peers' shared REPLICATION_TOKEN
+            
+        Returns:
+            dict: Response with success status
+        """
+        if not hmac.compare_digest(str(token or ""), settings.REPLICATION_TOKEN):
+            self.logger.warning(f"Refused replicated {operation} without the replication token")
+            return {"success": False, "message": "Replication is only accepted from peers"}
+        if operation not in self.REPLICATED_OPERATIONS:
+            return {"success": False, "message": f"Unknown replicated operation: {operation}"}
+        return getattr(self, f"_replicate_{operation}")(params, client_clock)
+
     # Replication endpoint methods
     def _replicate_register_user(self, params, client_clock=None):
         """Replicate user registration"""
@@ -843,6 +1698,8 @@ class CabService:
                 self.users[username] = user
                 self.logger.info(f"Replicated new user: {username}")
             
+            self._publish(users=True)
+            
             # Update vector clock if provided
             vector_clock = params.get("vector_clock")
             if vector_clock:
@@ -866,15 +1723,76 @@ class CabService:
             # Create new ride if it doesn't exist
             if ride_id not in self.rides:
                 ride = Ride(ride_id, rider_name, pickup, destination)
+                ride.pickup_id = self.locations.intern(pickup)
+                ride.destination_id = self.locations.intern(destination)
                 ride.fare = fare
                 ride.driver_name = driver_name
                 ride.status = status
                 self.rides[ride_id] = ride
+                self.surge.record_request(ride.pickup_id)
                 self.logger.info(f"Replicated new ride: {ride_id}")
                 
                 # Update driver availability
                 if driver_name and driver_name in self.driver_availability:
                     self.driver_availability[driver_name] = False
+                    self.surge.update_driver(driver_name, None, False)
+            
+            self._publish([ride_id], drivers=bool(driver_name))
+            
+            # Update vector clock if provided
+            vector_clock = params.get("vector_clock")
+            if vector_clock:
+                self.vector_clock.update(vector_clock)
+                
+            return {"success": True, "server_clock": server_clock}
+
+    def _replicate_schedule_ride(self, params, client_clock=None):
+        """Replicate a scheduled ride booking"""
+        server_clock = self._update_lamport_on_receive(client_clock)
+        
+        with self.lock:
+            ride_id = params["ride_id"]
+            
+            # Create new ride if it doesn't exist
+            if ride_id not in self.rides:
+                ride = Ride(ride_id, params["rider_name"], params["pickup"], params["destination"])
+                ride.pickup_id = self.locations.intern(params["pickup"])
+                ride.destination_id = self.locations.intern(params["destination"])
+                ride.fare = params["fare"]
+                ride.status = "SCHEDULED"
+                ride.scheduled_time = params["scheduled_time"]
+                self.rides[ride_id] = ride
+                self.logger.info(f"Replicated scheduled ride: {ride_id}")
+            
+            self._publish([ride_id])
+            
+            # Update vector clock if provided
+            vector_clock = params.get("vector_clock")
+            if vector_clock:
+                self.vector_clock.update(vector_clock)
+                
+            return {"success": True, "server_clock": server_clock}
+
+    def _replicate_dispatch_scheduled(self, params, client_clock=None):
+        """Replicate a batch of dispatched scheduled rides"""
+        server_clock = self._update_lamport_on_receive(client_clock)
+        
+        with self.lock:
+            for dispatched in params.get("rides", []):
+                ride = self.rides.get(dispatched["ride_id"])
+                if ride is None or ride.read_state()[0] != "SCHEDULED":
+                    continue
+                
+                if not ride.apply_replicated(dispatched["status"], self.server_id, dispatched.get("version"),
+                                             driver_name=dispatched.get("driver_name")):
+                    continue
+                if ride.driver_name and ride.driver_name in self.driver_availability:
+                    self.driver_availability[ride.driver_name] = False
+                    self.surge.update_driver(ride.driver_name, None, False)
+            
+            self.logger.info(f"Replicated dispatch of {len(params.get('rides', []))} scheduled rides")
+            
+            self._publish([d["ride_id"] for d in params.get("rides", [])], drivers=True)
             
             # Update vector clock if provided
             vector_clock = params.get("vector_clock")
@@ -890,16 +1808,17 @@ class CabService:
         with self.lock:
             ride_id = params["ride_id"]
             
-            if ride_id in self.rides:
-                ride = self.rides[ride_id]
-                ride.update_status("CANCELLED", self.server_id)
-                
+            ride = self.rides.get(ride_id)
+            if ride and ride.apply_replicated("CANCELLED", self.server_id, params.get("version")):
                 # Free up the driver
                 if ride.driver_name and ride.driver_name in self.driver_availability:
                     self.driver_availability[ride.driver_name] = True
+                    self.surge.update_driver(ride.driver_name, self.driver_locations.get(ride.driver_name), True)
                     
                 self.logger.info(f"Replicated ride cancellation: {ride_id}")
             
+            self._publish([ride_id], drivers=True)
+            
             # Update vector clock if provided
             vector_clock = params.get("vector_clock")
             if vector_clock:
@@ -915,11 +1834,38 @@ class CabService:
             ride_id = params["ride_id"]
             new_status = params["new_status"]
             
-            if ride_id in self.rides:
-                ride = self.rides[ride_id]
-                ride.update_status(new_status, self.server_id)
+            ride = self.rides.get(ride_id)
+            if ride and ride.apply_replicated(new_status, self.server_id, params.get("version")):
                 self.logger.info(f"Replicated ride status update: {ride_id} -> {new_status}")
             
+            self._publish([ride_id])
+            
+            # Update vector clock if provided
+            vector_clock = params.get("vector_clock")
+            if vector_clock:
+                self.vector_clock.update(vector_clock)
+                
+            return {"success": True, "server_clock": server_clock}
+
+    def _replicate_accept_ride(self, params, client_clock=None):
+        """Replicate a driver accepting a ride"""
+        server_clock = self._update_lamport_on_receive(client_clock)
+        
+        with self.lock:
+            ride_id = params["ride_id"]
+            driver_name = params["driver_name"]
+            
+            ride = self.rides.get(ride_id)
+            if ride and ride.apply_replicated("ACCEPTED", self.server_id, params.get("version"),
+                                              driver_name=driver_name):
+                if driver_name in self.driver_availability:
+                    self.driver_availability[driver_name] = False
+                    self.surge.update_driver(driver_name, None, False)
+                self.expiry_timers.cancel(("ride", ride_id))
+                self.logger.info(f"Replicated ride acceptance: {ride_id} by {driver_name}")
+            
+            self._publish([ride_id], drivers=True)
+            
             # Update vector clock if provided
             vector_clock = params.get("vector_clock")
             if vector_clock:
@@ -938,12 +1884,46 @@ class CabService:
             
             if driver_name in self.users:
                 user = self.users[driver_name]
-                user.current_location = location
+                location_id = self.locations.intern(location)
+                user.current_location = self.locations.get_name(location_id)
                 user.is_available = is_available
-                self.driver_locations[driver_name] = location
+                self.driver_locations[driver_name] = location_id
                 self.driver_availability[driver_name] = is_available
+                self.surge.update_driver(driver_name, location_id, is_available)
                 self.logger.info(f"Replicated driver availability: {driver_name} -> {is_available}")
             
+            self._publish(drivers=True)
+            
+            # Update vector clock if provided
+            vector_clock = params.get("vector_clock")
+            if vector_clock:
+                self.vector_clock.update(vector_clock)
+                
+            return {"success": True, "server_clock": server_clock}
+
+    def _replicate_expire(self, params, client_clock=None):
+        """Replicate a batch of expired ride requests and drivers"""
+        server_clock = self._update_lamport_on_receive(client_clock)
+        
+        with self.lock:
+            ride_ids = [expired["ride_id"] for expired in params.get("rides", [])]
+            for expired in params.get("rides", []):
+                ride = self.rides.get(expired["ride_id"])
+                if ride:
+                    # The origin's version: applied at most once, never over a newer change
+                    ride.apply_replicated("CANCELLED", self.server_id, expired["version"])
+            
+            for driver_name in params.get("driver_names", []):
+                if driver_name in self.users:
+                    self.users[driver_name].is_available = False
+                    self.driver_availability[driver_name] = False
+                    self.surge.update_driver(driver_name, None, False)
+            
+            self.logger.info(f"Replicated expiry batch: {len(ride_ids)} rides, "
+                             f"{len(params.get('driver_names', []))} drivers")
+            
+            self._publish(ride_ids, drivers=True)
+            
             # Update vector clock if provided
             vector_clock = params.get("vector_clock")
             if vector_clock:
@@ -951,6 +1931,19 @@ class CabService:
                 
             return {"success": True, "server_clock": server_clock}
 
+    def _replicate_idempotency(self, params, client_clock=None):
+        """Replicate the response stored under an idempotency key"""
+        server_clock = self._update_lamport_on_receive(client_clock)
+        
+        self.idempotency.store(params["key"], params["response"], params.get("fingerprint"))
+        
+        # Update vector clock if provided
+        vector_clock = params.get("vector_clock")
+        if vector_clock:
+            self.vector_clock.update(vector_clock)
+        
+        return {"success": True, "server_clock": server_clock}
+
     def get_server_stats(self, client_clock=None):
         """
         Get server statistics
@@ -963,38 +1956,17 @@ class CabService:
         """
         server_clock = self._update_lamport_on_receive(client_clock)
         
-        with self.lock:
-            active_rides = len([r for r in self.rides.values() if r.status not in ["COMPLETED", "CANCELLED"]])
-            completed_rides = len([r for r in self.rides.values() if r.status == "COMPLETED"])
-            cancelled_rides = len([r for r in self.rides.values() if r.status == "CANCELLED"])
-            
-            rider_count = len([u for u in self.users.values() if u.user_type == "RIDER"])
-            driver_count = len([u for u in self.users.values() if u.user_type == "DRIVER"])
-            
-            available_drivers = len([d for d, available in self.driver_availability.items() if available])
-            
-            stats = {
+        with self._read_guard():
+            stats = dict(self._snapshot.stats)
+            stats.update({
                 "server_id": self.server_id,
                 "is_leader": self.is_leader,
                 "lamport_clock": self.lamport_clock.get_time(),
                 "vector_clock": self.vector_clock.get_clock(),
                 "system_time": self.ntp_client.get_utc_iso(),
-                "users": {
-                    "total": len(self.users),
-                    "riders": rider_count,
-                    "drivers": driver_count,
-                },
-                "rides": {
-                    "total": len(self.rides),
-                    "active": active_rides,
-                    "completed": completed_rides,
-                    "cancelled": cancelled_rides,
-                },
-                "drivers": {
-                    "total": driver_count,
-                    "available": available_drivers,
-                }
-            }
+                "pending_timers": len(self.expiry_timers),
+                "scheduled_rides": len(self.scheduled_rides)
+            })
             
             return {
                 "success": True,
@@ -1002,6 +1974,33 @@ class CabService:
                 "server_clock": server_clock
             }
 
+    def get_metrics(self, client_clock=None):
+        """
+        Get latency histograms for this server
+        
+        Covers every RPC method (measured at the XML-RPC dispatcher), time
+        spent waiting for and holding the service lock, and how long each
+        peer takes to acknowledge replication. Nothing is recorded when
+        METRICS_ENABLED is off. A pooled server (SERVER_MODE = "pooled")
+        also reports its queue depth, queue wait and rejections.
+        
+        Args:
+            client_clock (int): Client's Lamport clock value
+            
+        Returns:
+            dict: Response with per-method, lock and replication summaries
+        """
+        server_clock = self._update_lamport_on_receive(client_clock)
+        
+        metrics = self.metrics.summary()
+        metrics["server_id"] = self.server_id
+        
+        return {
+            "success": True,
+            "metrics": metrics,
+            "server_clock": server_clock
+        }
+
 
 class CabServer:
     """
@@ -1023,19 +2022,51 @@ class CabServer:
         
         self.logger = logging.getLogger(f"CabServer-{server_id}")
         
+        frame_address = (settings.SERVER_HOST, self.port + settings.FRAME_PORT_OFFSET)
+        
         # Initialize the XML-RPC server
-        self.server = ThreadedXMLRPCServer(
-            (settings.SERVER_HOST, self.port),
-            requestHandler=RequestHandler,
-            allow_none=True
-        )
+        if settings.SERVER_MODE == "asyncio":
+            # One event loop serves XML-RPC and frame RPC connections
+            self.server = AsyncServer(
+                (settings.SERVER_HOST, self.port),
+                rpc_paths=RequestHandler.rpc_paths,
+                workers=settings.ASYNC_RPC_WORKERS,
+                frame_addr=frame_address if settings.FRAME_RPC_ENABLED else None
+            )
+        elif settings.SERVER_MODE == "pooled":
+            self.server = PooledXMLRPCServer(
+                (settings.SERVER_HOST, self.port),
+                requestHandler=RequestHandler,
+                allow_none=True
+            )
+            self.server.pool_workers = settings.SERVER_WORKERS
+            self.server.pool_queue_size = settings.SERVER_QUEUE_SIZE
+        else:
+            self.server = ThreadedXMLRPCServer(
+                (settings.SERVER_HOST, self.port),
+                requestHandler=RequestHandler,
+                allow_none=True
+            )
         
         # Initialize the cab service
         self.cab_service = CabService(server_id, self.is_leader)
+        if settings.SERVER_MODE == "pooled":
+            self.cab_service.metrics.pool = self.server
         
         # Register the cab service with the server
         self.server.register_introspection_functions()
+        self.server.register_multicall_functions()
         self.server.register_instance(self.cab_service)
+        self.server.metrics = self.cab_service.metrics
+        
+        # Frame RPC listener serving the same service next to XML-RPC
+        self.frame_server = None
+        if settings.FRAME_RPC_ENABLED and settings.SERVER_MODE != "asyncio":
+            self.frame_server = FrameServer(frame_address, workers=settings.FRAME_RPC_WORKERS)
+            self.frame_server.register_introspection_functions()
+            self.frame_server.register_multicall_functions()
+            self.frame_server.register_instance(self.cab_service)
+            self.frame_server.metrics = self.cab_service.metrics
     
     def run(self):
         """Start the server and run indefinitely"""
@@ -1046,14 +2077,23 @@ class CabServer:
         print(f"=== CAB SERVER {self.server_id} STARTED ===")
         print(f"Running on {settings.SERVER_HOST}:{self.port}")
         print(f"Is leader: {self.is_leader}")
+        print(f"Server mode: {settings.SERVER_MODE}")
         print("Waiting for client connections...")
         
+        if self.frame_server:
+            frame_port = self.port + settings.FRAME_PORT_OFFSET
+            self.logger.info(f"Frame RPC on {settings.SERVER_HOST}:{frame_port}")
+            print(f"Frame RPC on {settings.SERVER_HOST}:{frame_port}")
+            threading.Thread(target=self.frame_server.serve_forever, daemon=True).start()
+        
         try:
             self.server.serve_forever()
         except KeyboardInterrupt:
             self.logger.info("Server shutting down...")
             print("Server shutting down...")
             self.server.shutdown()
+            if self.frame_server:
+                self.frame_server.shutdown()
 
 
 def main():
@@ -1,13 +1,18 @@
 """
 Load balancer for the Cab Booking System
-Distributes client requests across multiple backend servers using least-connections algorithm
+Distributes client requests across multiple backend servers using a pluggable
+balancing policy (least connections by default, see util.balancing)
 """
 
 import xmlrpc.client
 import xmlrpc.server
 from xmlrpc.server import SimpleXMLRPCServer, SimpleXMLRPCRequestHandler
 from socketserver import ThreadingMixIn
+from concurrent.futures import ThreadPoolExecutor
 import threading
+import itertools
+import uuid
+import zlib
 import time
 import logging
 import sys
@@ -17,6 +22,19 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from config import settings
+from util.frame_rpc import FrameRPCClient, FrameRPCServer
+from util.async_rpc import AsyncRPCServer
+from util.worker_pool import BoundedPoolMixIn, is_busy_error, BUSY_STATUS
+from util.balancing import make_policy
+from util.retry_budget import RetryBudget
+from util.health import FailureDetector
+from util.circuit_breaker import CircuitBreaker
+from util.hedging import HedgeDelay, HedgeRace, HedgeTimer, HedgeAborted
+from util.concurrency_limit import AdaptiveConcurrencyLimit
+from util.response_cache import ResponseCache
+from util.metrics import TrafficMetrics
+from util.traffic_capture import TrafficCapture
+from util.xmlrpc_transport import TimeoutTransport
 
 # Configure logging
 logging.basicConfig(
@@ -33,17 +51,125 @@ class ThreadedXMLRPCServer(ThreadingMixIn, SimpleXMLRPCServer):
     """Threaded XML-RPC Server to handle concurrent requests"""
     pass
 
+class PooledXMLRPCServer(BoundedPoolMixIn, SimpleXMLRPCServer):
+    """XML-RPC Server with a fixed worker pool and a bounded accept queue"""
+    pass
+
+class MetricsRequestHandler(SimpleXMLRPCRequestHandler):
+    """XML-RPC request handler that also serves the Prometheus text metrics at LB_METRICS_PATH"""
+    
+    def do_GET(self):
+        if self.path != settings.LB_METRICS_PATH:
+            self.report_404()
+            return
+        content_type, body = self.server.instance.prometheus_response()
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+def _error_kind(error):
+    """Kind of a failed call for the traffic metrics: busy, fault, timeout, connection, protocol or other"""
+    if is_busy_error(error):
+        return "busy"
+    if isinstance(error, xmlrpc.client.Fault):
+        return "fault"
+    if isinstance(error, TimeoutError):
+        return "timeout"
+    if isinstance(error, ConnectionError):
+        return "connection"
+    if isinstance(error, xmlrpc.client.ProtocolError):
+        return "protocol"
+    return "other"
+
 class LoadBalancer:
     """
     Load balancer that distributes requests across multiple backend servers
-    using the least-connections algorithm.
+    using a balancing policy (LB_POLICY).
     """
-    def __init__(self, server_ports=None):
+    # Methods whose first argument (a ride id or username) is their routing key
+    KEYED_METHODS = frozenset([
+        "get_ride_status", "cancel_ride", "update_ride_status", "accept_ride",
+        "book_cab", "schedule_ride", "get_user_rides", "register_user",
+        "authenticate_user", "set_driver_available"
+    ])
+    
+    # Read-only methods, safe to retry on another backend
+    READ_METHODS = frozenset([
+        "get_ride_status", "get_available_cabs", "get_active_rides", "get_user_rides",
+        "get_server_stats", "get_metrics", "get_surge_pricing", "autocomplete_locations",
+        "get_server_time", "ping"
+    ])
+    
+    # Reads whose tail latency is cut by hedging: a second copy goes to
+    # another backend when the first is slower than usual
+    HEDGED_METHODS = frozenset(["get_ride_status", "get_available_cabs", "get_user_rides"])
+    
+    # Writes taking an idempotency key -> position of that argument
+    IDEMPOTENT_WRITES = {
+        "register_user": 7,
+        "book_cab": 4,
+        "schedule_ride": 5,
+        "cancel_ride": 3,
+        "update_ride_status": 4,
+        "accept_ride": 4
+    }
+    
+    # Served by the load balancer itself rather than forwarded
+    LOCAL_METHODS = frozenset(["register_backend", "drain_backend", "remove_backend", "get_stats"])
+    
+    # Methods backends only accept from their peers, refused to clients
+    PEER_METHODS = frozenset(["replicate"])
+    
+    # Methods that change backend state, sent to the leader (LB_LEADER_ROUTING)
+    WRITE_METHODS = frozenset(IDEMPOTENT_WRITES) | {"set_driver_available"}
+    
+    # Methods with their own traffic metrics; others are counted as "other",
+    # so clients cannot grow the tables
+    METERED_METHODS = KEYED_METHODS | READ_METHODS | WRITE_METHODS | LOCAL_METHODS | {
+        "system.multicall", "synchronize_clocks"
+    }
+    
+    # Reads that may be answered from the response cache -> number of leading
+    # arguments that determine the answer (later ones, like client_clock, do
+    # not); only those with a TTL in LB_CACHE_TTLS are cached
+    CACHEABLE_METHODS = {
+        "get_available_cabs": 1,
+        "get_active_rides": 0,
+        "get_surge_pricing": 0,
+        "get_ride_status": 1,
+        "autocomplete_locations": 2
+    }
+    
+    # Writes -> cached reads whose answers they change. A (method, index)
+    # entry drops only the entry keyed by the write's argument at that index
+    _RIDE_READS = ("get_available_cabs", "get_active_rides", "get_surge_pricing")
+    CACHE_INVALIDATIONS = {
+        "book_cab": _RIDE_READS,
+        "schedule_ride": _RIDE_READS,
+        "cancel_ride": _RIDE_READS + (("get_ride_status", 0),),
+        "update_ride_status": _RIDE_READS + (("get_ride_status", 0),),
+        "accept_ride": _RIDE_READS + (("get_ride_status", 0),),
+        "set_driver_available": ("get_available_cabs", "get_surge_pricing")
+    }
+    
+    # Priorities for load shedding: each may fill its LB_PRIORITY_SHARES of a
+    # backend's concurrency limit, so when backends are saturated stats and
+    # status polling are shed before bookings
+    CRITICAL_METHODS = frozenset(IDEMPOTENT_WRITES) | {"authenticate_user"}
+    SHEDDABLE_METHODS = frozenset([
+        "get_server_stats", "get_metrics", "get_surge_pricing", "get_active_rides",
+        "get_ride_status", "ping"
+    ])
+    
+    def __init__(self, server_ports=None, policy=None):
         """
         Initialize the load balancer
         
         Args:
             server_ports (list): List of server ports to balance between
+            policy (str): Balancing policy name, LB_POLICY by default
         """
         if server_ports is None:
             # Use default ports from settings
@@ -53,117 +179,983 @@ class LoadBalancer:
         else:
             self.server_ports = server_ports
             
-        self.servers = {}
+        self.servers = {}  # port -> backend URL
+        self._proxies = threading.local()  # per-thread (registration, ServerProxy) (they are not thread-safe)
+        self._registrations = {}  # port -> number of the backend's registration, so a re-registered port gets new proxies
+        self._registration_numbers = itertools.count()
+        self._frame_clients = {}  # port -> FrameRPCClient shared by all threads (RPC_TRANSPORT = "frame")
         self.active_connections = {}
         self.last_health_check = {}
         self.server_status = {}  # 'up' or 'down'
+        self.detector = FailureDetector(settings.HEALTH_EJECT_FAILURES, settings.HEALTH_READMIT_SUCCESSES)
+        self._probe_clients = {}  # port -> FrameRPCClient used only for health probes
+        self.breakers = {}  # port -> CircuitBreaker over the outcomes of forwarded calls
+        self.limits = {}  # port -> AdaptiveConcurrencyLimit on the calls in flight to it
+        self.leader = None  # port of the backend that last reported itself leader
+        self.draining = {}  # port -> deadline (monotonic) of a backend taking no new calls, removed once its calls finish
+        self.loads = {}  # port -> load last reported by the backend, with the weight derived from it
         self.lock = threading.RLock()
+        self.pool = None  # the pooled server in front of this balancer, for its queue stats
+        self.policy = make_policy(policy or settings.LB_POLICY)
+        
+        # Retries of reads and keyed writes that failed in transit
+        self.retry_budget = RetryBudget(
+            settings.LB_RETRY_BUDGET_RATIO,
+            settings.LB_RETRY_BUDGET_MIN,
+            settings.LB_RETRY_BUDGET_WINDOW
+        )
+        self.retry_stats = {
+            "retries": 0,  # retry attempts made
+            "failovers": 0,  # retries sent to a different backend
+            "recovered": 0,  # calls that succeeded on a retry
+            "budget_exhausted": 0,  # failures not retried because the budget was spent
+            "deadline_exceeded": 0  # failures not retried because LB_RETRY_DEADLINE had passed
+        }
+        
+        # Hedged reads: per-method delay estimates and a budget for the extra copies
+        self.hedge_delays = {
+            method: HedgeDelay(settings.HEDGE_PERCENTILE, floor=settings.HEDGE_MIN_DELAY)
+            for method in self.HEDGED_METHODS
+        }
+        self.hedge_budget = RetryBudget(
+            settings.HEDGE_BUDGET_RATIO,
+            settings.HEDGE_BUDGET_MIN,
+            settings.LB_RETRY_BUDGET_WINDOW
+        )
+        self._hedge_races = threading.local()  # the hedged call a request thread is making, if any
+        self.hedge_timer = HedgeTimer()
+        self.hedge_executor = ThreadPoolExecutor(
+            max_workers=settings.HEDGE_WORKERS,
+            thread_name_prefix="lb-hedge"
+        )
+        self.hedge_stats = {
+            "hedged": 0,  # second copies sent
+            "hedge_won": 0,  # calls answered first by the second copy
+            "budget_exhausted": 0  # slow calls not hedged because the budget was spent
+        }
+        
+        # Hot reads answered at the balancer; identical misses share one backend call
+        self.response_cache = ResponseCache(settings.LB_CACHE_MAX_ENTRIES)
+        
+        # Calls, errors by kind, rates and latency per backend (each forwarded
+        # call) and per method (each client call, however it was answered)
+        self.backend_metrics = TrafficMetrics("backend", settings.METRICS_RATE_WINDOW)
+        self.method_metrics = TrafficMetrics("method", settings.METRICS_RATE_WINDOW)
+        
+        # Calls turned away because every backend was at its concurrency limit
+        self.shed_stats = {priority: 0 for priority in settings.LB_PRIORITY_SHARES}
+        
+        # Optional record of a sample of the client calls, for replay (benchmarks/replay_capture.py)
+        self.capture = None
+        if settings.LB_CAPTURE_PATH:
+            self.capture = TrafficCapture(
+                settings.LB_CAPTURE_PATH,
+                settings.LB_CAPTURE_SAMPLE_RATE,
+                settings.LB_CAPTURE_MAX_BYTES,
+                settings.LB_CAPTURE_BACKUPS
+            )
         
         # Connect to all backend servers
         for port in self.server_ports:
             self._init_server_connection(port)
         
+        # Probes every backend at once, so a hung one cannot delay the others;
+        # threads are only started as needed, leaving room for registered backends
+        self.health_executor = ThreadPoolExecutor(
+            max_workers=max(64, len(self.server_ports)),
+            thread_name_prefix="lb-health"
+        )
+        
+        # Sends the sub-batches of a split multicall in parallel; sized by a
+        # setting, as the backends registered later share it
+        self.batch_executor = ThreadPoolExecutor(
+            max_workers=settings.LB_BATCH_WORKERS,
+            thread_name_prefix="lb-batch"
+        )
+        
         logger.info(f"Load Balancer initialized with servers on ports: {self.server_ports}")
         
+        # Learn which backends are up and which one leads before taking calls,
+        # so no keyed write is sent to another backend while the leader is unknown
+        self._health_check()
+        
         # Start health check thread
         self._start_health_checker()
     
     def _init_server_connection(self, port):
         """Initialize connection to a backend server"""
         with self.lock:
-            server_url = f"http://{settings.SERVER_HOST}:{port}{settings.RPC_PATH}"
-            self.servers[port] = xmlrpc.client.ServerProxy(server_url, allow_none=True)
+            self.servers[port] = f"http://{settings.SERVER_HOST}:{port}{settings.RPC_PATH}"
+            self._registrations[port] = next(self._registration_numbers)
             self.active_connections[port] = 0
             self.last_health_check[port] = time.time()
             self.server_status[port] = 'unknown'  # Will be updated by health check
+            self.breakers[port] = CircuitBreaker(
+                window=settings.BREAKER_WINDOW,
+                min_calls=settings.BREAKER_MIN_CALLS,
+                failure_rate=settings.BREAKER_FAILURE_RATE,
+                open_seconds=settings.BREAKER_OPEN_SECONDS,
+                half_open_calls=settings.BREAKER_HALF_OPEN_CALLS
+            )
+            self.limits[port] = AdaptiveConcurrencyLimit(
+                initial=settings.LB_LIMIT_INITIAL,
+                min_limit=settings.LB_LIMIT_MIN,
+                max_limit=settings.LB_LIMIT_MAX,
+                backoff=settings.LB_LIMIT_BACKOFF,
+                tolerance=settings.LB_LIMIT_LATENCY_TOLERANCE
+            )
 
+    def _server_proxy(self, port):
+        """Get this thread's connection to a backend server"""
+        if settings.RPC_TRANSPORT == "frame":
+            # One pipelined connection per backend, shared by every thread
+            client = self._frame_clients.get(port)
+            if client is None:
+                with self.lock:
+                    client = self._frame_clients.get(port)
+                    if client is None:
+                        client = self._frame_clients[port] = FrameRPCClient(
+                            settings.SERVER_HOST, port + settings.FRAME_PORT_OFFSET, settings.RPC_CODEC
+                        )
+            return client
+        
+        proxies = self._proxies.__dict__
+        registration = self._registrations[port]
+        cached = proxies.get(port)
+        if cached is not None and cached[0] == registration:
+            return cached[1]
+        if cached is not None:
+            # Made for an earlier registration of the port; its connection may be to a backend since gone
+            cached[1]("close")()
+        proxy = xmlrpc.client.ServerProxy(self.servers[port], transport=TimeoutTransport(), allow_none=True)
+        proxies[port] = (registration, proxy)
+        return proxy
+    
     def _dispatch(self, method, params):
         """
         Dispatch method to a backend server
         
-        This is called for every client request and implements the load balancing logic
+        This is called for every client request and implements the load balancing logic.
+        Cacheable reads are answered from the response cache when they can be,
+        and writes invalidate the cached reads they change. When capture is
+        on, a sample of the calls is recorded with their timing.
         """
+        captured = (self.capture is not None and method not in self.LOCAL_METHODS
+                    and self.capture.sampled())
+        if not settings.METRICS_ENABLED and not captured:
+            return self._route(method, params)
+        
+        started = time.time()
+        start = time.perf_counter()
+        response = None
+        error = None
+        try:
+            response = self._route(method, params)
+            return response
+        except Exception as e:
+            error = _error_kind(e)
+            raise
+        finally:
+            duration = time.perf_counter() - start
+            if settings.METRICS_ENABLED:
+                self.method_metrics.record(method if method in self.METERED_METHODS else "other",
+                                           duration, error)
+            if captured:
+                self.capture.record(started, duration, method, params, response, error is not None)
+    
+    def _route(self, method, params):
+        """Answer a client call locally, from the cache or from a backend"""
+        if method == "system.multicall":
+            if any(isinstance(call, dict) and call.get("methodName") in self.PEER_METHODS for call in params[0]):
+                raise xmlrpc.client.Fault(403, "Peer methods cannot be called through the load balancer")
+            return self._dispatch_batch(params[0])
+        
+        if method in self.PEER_METHODS:
+            raise xmlrpc.client.Fault(403, f"{method} cannot be called through the load balancer")
+        
+        if method in self.LOCAL_METHODS:
+            return getattr(self, method)(*params)
+        
+        if method in self.CACHE_INVALIDATIONS:
+            try:
+                return self._forward(method, params)
+            finally:
+                # Also after a failure: the write may have been applied
+                self._invalidate_cached(method, params)
+        
+        ttl = settings.LB_CACHE_TTLS.get(method) if settings.LB_CACHE_ENABLED else None
+        if ttl and method in self.CACHEABLE_METHODS:
+            args = repr(tuple(params[:self.CACHEABLE_METHODS[method]]))
+            return self.response_cache.get_or_call(method, args, ttl, lambda: self._forward(method, params))
+        return self._forward(method, params)
+    
+    def _forward(self, method, params):
+        """Send a call to a backend picked for it, with retries or hedging where safe"""
+        if method in self.IDEMPOTENT_WRITES:
+            params, port = self._keyed_write(method, params)
+            return self._call_with_retries(method, params, port)
+        
+        port = self._select_server(method)
+        if method in self.HEDGED_METHODS and settings.HEDGE_ENABLED:
+            return self._call_hedged(method, params, port)
+        if method in self.READ_METHODS:
+            return self._call_with_retries(method, params, port)
+        return self._call_server(port, method, params)
+    
+    def _invalidate_cached(self, method, params):
+        """Drop the cached reads a write passing through may have changed"""
+        for read in self.CACHE_INVALIDATIONS[method]:
+            if isinstance(read, tuple):
+                read, index = read
+                if len(params) > index:
+                    self.response_cache.invalidate(read, repr((params[index],)))
+            else:
+                self.response_cache.invalidate(read)
+    
+    def _keyed_write(self, method, params):
+        """
+        Give a write its idempotency key and pick its backend
+        
+        A key is generated if the client sent none. The write goes to its
+        home backend (see _write_home), where a retry, by us or by the
+        client, is answered from the response cache instead of being
+        applied twice.
+        
+        Returns:
+            tuple: (params with the key, port whose connection count was incremented)
+        """
+        index = self.IDEMPOTENT_WRITES[method]
+        params = list(params) + [None] * (index + 1 - len(params))
+        if not params[index]:
+            params[index] = uuid.uuid4().hex
+        
         with self.lock:
-            # Filter out 'down' servers
-            available_servers = [p for p, status in self.server_status.items() 
-                                if status != 'down']
-            
-            if not available_servers:
-                logger.error("No servers available")
-                raise Exception("No servers available")
-            
-            # Select server with least active connections
-            port = min(
-                available_servers, 
-                key=lambda p: self.active_connections.get(p, float('inf'))
+            port = self._write_home(str(params[index]))
+            if not self._admitted(method, [port]):
+                # Shed rather than move it, so the client's retry still lands on the same backend
+                self._shed(method)
+            self._claim(port)
+        return params, port
+    
+    def _write_home(self, key):
+        """
+        The backend a keyed write goes to (caller holds the lock)
+        
+        The leader while it is up; without leader routing, or while no
+        leader is known or it is down, the first backend up in the key's
+        hash order over all backends. Circuit breakers are not consulted: a
+        write moved off a slow backend whose breaker opened could run there
+        too. Only a backend marked down or draining loses its writes, to the
+        same backend for every attempt.
+        """
+        ports = sorted(self.servers)
+        takes_writes = [p for p in ports if self.server_status.get(p) != 'down' and p not in self.draining]
+        if not takes_writes:
+            logger.error("No servers available")
+            raise Exception("No servers available")
+        if settings.LB_LEADER_ROUTING and self.leader in takes_writes:
+            return self.leader
+        start = zlib.crc32(key.encode()) % len(ports)
+        return next(p for p in ports[start:] + ports[:start] if p in takes_writes)
+    
+    def _is_retryable(self, error):
+        """Whether a failed call may be sent again: it failed in transit or was turned away busy"""
+        return isinstance(error, (ConnectionError, TimeoutError)) or is_busy_error(error)
+    
+    def _call_with_retries(self, method, params, port):
+        """
+        Forward a call that is safe to repeat, retrying failures in transit
+        
+        Up to LB_RETRIES retries are made while LB_RETRY_DEADLINE has not
+        passed since the first attempt and the retry budget allows. A read is
+        retried on a backend it has not tried yet. A keyed write, or a batch
+        holding writes, may have run before it failed, so it is retried on
+        its home backend, where its response is cached or which waits for
+        it; it moves only with its home, when that backend is marked down.
+        
+        Args:
+            method (str): Method name
+            params (list): Call parameters
+            port (int): First backend, its connection count already incremented
+        """
+        deadline = time.monotonic() + settings.LB_RETRY_DEADLINE
+        self.retry_budget.record_call()
+        tried = []
+        for attempt in range(settings.LB_RETRIES + 1):
+            try:
+                result = self._call_server(port, method, params)
+                if attempt:
+                    self._count_retry("recovered")
+                return result
+            except Exception as e:
+                tried.append(port)
+                if not self._is_retryable(e) or attempt == settings.LB_RETRIES:
+                    raise
+                if time.monotonic() >= deadline:
+                    self._count_retry("deadline_exceeded")
+                    raise
+                if not self.retry_budget.try_retry():
+                    self._count_retry("budget_exhausted")
+                    raise
+                port = self._retry_server(method, params, port, tried)
+                logger.warning(f"Retrying {method} on server {port} after {type(e).__name__}")
+    
+    def _retry_server(self, method, params, port, tried):
+        """Pick the backend for a retry and count the new connection"""
+        with self.lock:
+            self.retry_stats["retries"] += 1
+            if method in self.IDEMPOTENT_WRITES or method == "system.multicall":
+                # Batches are only retried when they hold writes (see _forward_batch)
+                key = (self._batch_write_key(params[0]) if method == "system.multicall"
+                       else str(params[self.IDEMPOTENT_WRITES[method]]))
+                new_port = self._write_home(key)
+                if not self._admitted(method, [new_port]):
+                    self._shed(method)
+            else:
+                available_servers = self._admitted(method, self._available_servers())
+                if not available_servers:
+                    self._shed(method)
+                candidates = (self._read_servers([p for p in available_servers if p not in tried])
+                              or self._read_servers(available_servers))
+                new_port = self.policy.choose(candidates, self._connection_counts())
+            self._claim(new_port)
+            if new_port != port:
+                self.retry_stats["failovers"] += 1
+            return new_port
+    
+    def _call_hedged(self, method, params, port):
+        """
+        Forward a read, sending a second copy to another backend if no answer
+        came within the method's recent p95 (HEDGE_PERCENTILE)
+        
+        The call runs in the caller's thread; only the copy runs on the hedge
+        executor, sent by the hedge timer. The first successful answer is
+        returned: a copy answering first aborts the wait for the call (see
+        HedgeRace). The other cannot be recalled from its backend, so it
+        finishes there and is ignored. The delay estimate learns from the
+        call's own latency, or the time it ran until aborted, never the copy's.
+        Copies are capped by the hedge budget.
+        
+        Args:
+            method (str): Method name
+            params (list): Call parameters
+            port (int): First backend, its connection count already incremented
+        """
+        estimate = self.hedge_delays[method]
+        delay = estimate.delay()
+        start = time.perf_counter()
+        if delay is None:
+            # No estimate yet: call unhedged and learn from the answer
+            result = self._call_with_retries(method, params, port)
+            estimate.record(time.perf_counter() - start)
+            return result
+        
+        self.hedge_budget.record_call()
+        race = HedgeRace()
+        self.hedge_timer.schedule(delay, lambda: race.send_copy(lambda: self._send_hedge(method, params, port, race)))
+        self._hedge_races.race = race
+        try:
+            result = self._call_with_retries(method, params, port)
+        except HedgeAborted:
+            estimate.record(time.perf_counter() - start)
+            with self.lock:
+                self.hedge_stats["hedge_won"] += 1
+            return race.result
+        except Exception as error:
+            # The copy, if one was sent, may still answer
+            copy = race.finish()
+            if copy is None:
+                raise
+            try:
+                result = copy.result()
+            except Exception:
+                raise error from None
+            with self.lock:
+                self.hedge_stats["hedge_won"] += 1
+            return result
+        finally:
+            self._hedge_races.race = None
+            race.finish()
+        estimate.record(time.perf_counter() - start)
+        return result
+    
+    def _send_hedge(self, method, params, port, race):
+        """Send the hedged copy of a call on the hedge executor (the timer's callback); None if none may be sent"""
+        hedge_port = self._hedge_server(method, port)
+        if hedge_port is None:
+            return None
+        
+        def copy():
+            result = self._call_server(hedge_port, method, params)
+            race.win(result)
+            return result
+        return self.hedge_executor.submit(copy)
+    
+    def _hedge_server(self, method, port):
+        """Pick another backend for a hedged copy and count the connection, or None"""
+        with self.lock:
+            candidates = self._read_servers(
+                self._admitted(method, [p for p in self._available_servers() if p != port])
             )
-            
-            # Increment connection count for selected server
-            self.active_connections[port] += 1
+            if not candidates:
+                return None
+            if not self.hedge_budget.try_retry():
+                self.hedge_stats["budget_exhausted"] += 1
+                return None
+            hedge_port = self.policy.choose(candidates, self._connection_counts())
+            self._claim(hedge_port)
+            self.hedge_stats["hedged"] += 1
+            return hedge_port
+    
+    def _count_retry(self, outcome):
+        with self.lock:
+            self.retry_stats[outcome] += 1
+    
+    def _available_servers(self):
+        """Ports of servers not marked down or draining whose breaker lets a call through (caller holds the lock)"""
+        up_servers = [p for p, status in self.server_status.items() if status != 'down' and p not in self.draining]
+        available_servers = [p for p in up_servers if self.breakers[p].available()]
+        
+        if not available_servers and up_servers:
+            # Every breaker is open: trying the servers that are up beats failing every call
+            logger.warning("All circuit breakers open, ignoring them")
+            available_servers = up_servers
+        
+        if not available_servers:
+            logger.error("No servers available")
+            raise Exception("No servers available")
+        
+        return available_servers
+    
+    def _claim(self, port):
+        """Count a call about to be sent to a server (caller holds the lock)"""
+        self.active_connections[port] += 1
+        self.breakers[port].acquire()
+    
+    def _release(self, port):
+        """Count a call to a server as finished (caller holds the lock)"""
+        self.active_connections[port] = max(0, self.active_connections[port] - 1)
+    
+    def _connection_counts(self):
+        """port -> calls in flight, as the balancing policy sees them (caller holds the lock)"""
+        return self.active_connections
+    
+    def _leader_port(self):
+        """The leader's port if writes should go to it and it can take them, else None (caller holds the lock)"""
+        leader = self.leader
+        if not settings.LB_LEADER_ROUTING or leader is None:
+            return None
+        if (self.server_status.get(leader) == 'down' or leader in self.draining
+                or not self.breakers[leader].available()):
+            return None
+        return leader
+    
+    def _read_servers(self, ports):
+        """
+        The ports among `ports` reads may go to (caller holds the lock)
         
+        With leader routing and synchronous replication every follower has
+        each write acknowledged to a client, so reads are spread over the
+        followers, leaving the leader to writes. Otherwise a follower may
+        not have a write just made, so reads stay on the leader: only it
+        when it is among `ports`, none when it is not. While no leader is
+        known or it is down, all of `ports`.
+        """
+        leader = self._leader_port()
+        if leader is None:
+            return ports
+        if settings.REPLICATION_MODE == "synchronous":
+            return [p for p in ports if p != leader] or ports
+        return [p for p in ports if p == leader]
+    
+    def _priority(self, method):
+        """Load shedding priority of a method: 'critical', 'normal' or 'sheddable'"""
+        if method in self.CRITICAL_METHODS:
+            return "critical"
+        if method in self.SHEDDABLE_METHODS:
+            return "sheddable"
+        return "normal"
+    
+    def _admitted(self, method, ports):
+        """Ports whose concurrency limit has room for a call of this method (caller holds the lock)"""
+        if not settings.LB_CONCURRENCY_LIMIT_ENABLED:
+            return ports
+        share = settings.LB_PRIORITY_SHARES[self._priority(method)]
+        return [p for p in ports if self.limits[p].admits(self.active_connections[p], share)]
+    
+    def _shed(self, method):
+        """Turn a call away with a busy fault, which clients retry (caller holds the lock)"""
+        self.shed_stats[self._priority(method)] += 1
+        raise xmlrpc.client.Fault(BUSY_STATUS, "Load balancer overloaded, retry later")
+    
+    def _select_server(self, method=None):
+        """
+        Pick a server with the balancing policy and count the new connection
+        
+        Writes go to the leader while it is up; reads go where
+        _read_servers says (see LB_LEADER_ROUTING).
+        
+        Args:
+            method (str): Method to be called, checked against the backends'
+                          concurrency limits; None to skip the limits (read-only batches)
+        """
+        with self.lock:
+            available_servers = self._available_servers()
+            leader = self._leader_port()
+            if method in self.WRITE_METHODS and leader is not None:
+                available_servers = [leader]
+            else:
+                available_servers = self._read_servers(available_servers)
+            if method is not None:
+                available_servers = self._admitted(method, available_servers)
+                if not available_servers:
+                    self._shed(method)
+            port = self.policy.choose(available_servers, self._connection_counts())
+            self._claim(port)
+            return port
+    
+    def _call_server(self, port, method, params):
+        """
+        Forward a call to a server whose connection count was already incremented
+        """
+        start = time.perf_counter()
+        in_flight = self.active_connections.get(port, 0)
+        failed = False
+        healthy = None  # whether the server itself worked, for its breaker; None if unknown
+        reachable = None  # whether the server answered, for the failure detector; None if unknown
+        error = None  # kind of error, for the traffic metrics
+        aborted = False
         try:
             # Forward request to selected server
             logger.debug(f"Forwarding {method} to server on port {port}")
-            server = self.servers[port]
-            result = getattr(server, method)(*params)
+            server = self._server_proxy(port)
+            race = getattr(self._hedge_races, "race", None)
+            result = race.call(server, method, params) if race else getattr(server, method)(*params)
+            healthy = reachable = True
             return result
+        except HedgeAborted:
+            # Abandoned for a hedged copy's answer: no verdict on the server
+            aborted = True
+            raise
         except Exception as e:
             logger.error(f"Error calling method {method} on server {port}: {e}")
+            failed = not isinstance(e, xmlrpc.client.Fault)
+            error = _error_kind(e)
             
-            # Mark server as down if connection error
-            if isinstance(e, (ConnectionError, xmlrpc.client.ProtocolError, 
-                            xmlrpc.client.Fault, TimeoutError)):
-                with self.lock:
-                    self.server_status[port] = 'down'
-                    logger.warning(f"Marked server on port {port} as DOWN")
+            # A fault is the application's answer, so the server is up; a busy server is up, just full
+            if isinstance(e, xmlrpc.client.Fault):
+                healthy = reachable = True
+            elif is_busy_error(e):
+                logger.warning(f"Server on port {port} rejected {method}: busy")
+            elif isinstance(e, TimeoutError):
+                # A slow server is not a dead one: only probes and lost connections
+                # eject it, so keyed writes are not moved off it while they are retried
+                healthy = False
+            elif isinstance(e, (ConnectionError, xmlrpc.client.ProtocolError)):
+                healthy = reachable = False
             
-            # Could implement retry logic here with another server
+            # Retries, where safe, are made by _call_with_retries
             raise
         finally:
-            # Decrement connection count
+            # Decrement connection count and feed the call's outcome to the policy, breaker and detector
+            duration = time.perf_counter() - start
             with self.lock:
-                self.active_connections[port] = max(0, self.active_connections[port] - 1)
+                if port in self.servers:  # not removed while the call ran
+                    self._release(port)
+                    self.policy.record(port, duration, failed)
+                    if not aborted:
+                        # A busy answer or a failure is as much a sign of overload as a slow answer
+                        self.limits[port].record(duration, in_flight, failed=healthy is not True)
+                    breaker = self.breakers[port]
+                    previous_state = breaker.state
+                    breaker.record(healthy)
+                    if breaker.state != previous_state:
+                        logger.warning(f"Circuit breaker of server on port {port} is now {breaker.state}")
+                    if port in self.draining and not self.active_connections[port]:
+                        self._remove_server(port)
+                        logger.info(f"Server on port {port} drained and removed")
+            if settings.METRICS_ENABLED:
+                self.backend_metrics.record(port, duration, error)
+            if reachable is not None:
+                self._record_health(port, reachable)
     
-    def _health_check(self):
-        """Check the health of all backend servers"""
-        for port in self.server_ports:
+    def _routing_key(self, call):
+        """Get the ride id or username a multicall entry is about, or None"""
+        if not isinstance(call, dict):
+            return None
+        params = call.get("params") or []
+        if call.get("methodName") in self.KEYED_METHODS and params:
+            return str(params[0])
+        return None
+    
+    def _dispatch_batch(self, calls):
+        """
+        Forward a system.multicall batch
+        
+        A batch goes to one backend as a single call: one round-trip, and the
+        backend can run it under one lock acquisition. Batches of at least
+        MULTICALL_SPLIT_THRESHOLD calls are split by routing key instead and
+        the sub-batches sent to backends in parallel. Calls sharing a key
+        land in the same sub-batch, in their original order. A batch with
+        writes is never split: its keyed writes get idempotency keys and it
+        goes whole to its first write's home backend (see _write_home),
+        where it is retried like a keyed write. Writes in the batch
+        invalidate cached reads as they would on their own.
+        
+        Args:
+            calls (list): Multicall entries ({"methodName": ..., "params": ...})
+            
+        Returns:
+            list: One [result] or fault dict per call, in request order
+        """
+        try:
+            return self._forward_batch(calls)
+        finally:
+            for call in calls:
+                if isinstance(call, dict) and call.get("methodName") in self.CACHE_INVALIDATIONS:
+                    self._invalidate_cached(call["methodName"], call.get("params") or [])
+    
+    def _keyed_batch_call(self, call):
+        """A multicall entry with an idempotency key if it is a keyed write, as _keyed_write gives one"""
+        method = call.get("methodName") if isinstance(call, dict) else None
+        if method not in self.IDEMPOTENT_WRITES:
+            return call
+        index = self.IDEMPOTENT_WRITES[method]
+        params = list(call.get("params") or [])
+        params += [None] * (index + 1 - len(params))
+        if not params[index]:
+            params[index] = uuid.uuid4().hex
+        return dict(call, params=params)
+    
+    def _batch_write_key(self, calls):
+        """The key whose home backend a batch with writes goes to: its first write's"""
+        for call in calls:
+            method = call.get("methodName") if isinstance(call, dict) else None
+            if method in self.IDEMPOTENT_WRITES:
+                return str(call["params"][self.IDEMPOTENT_WRITES[method]])
+            if method in self.WRITE_METHODS:
+                return self._routing_key(call) or ""
+        return ""
+    
+    def _forward_batch(self, calls):
+        """Send a batch to one backend, or split by routing key across backends"""
+        threshold = settings.MULTICALL_SPLIT_THRESHOLD
+        if any(isinstance(call, dict) and call.get("methodName") in self.WRITE_METHODS for call in calls):
+            # A batch with writes is never split: it goes whole, its calls in
+            # order, to the home backend of its writes and is retried there
+            calls = [self._keyed_batch_call(call) for call in calls]
+            with self.lock:
+                port = self._write_home(self._batch_write_key(calls))
+                self._claim(port)
+            return self._call_with_retries("system.multicall", (calls,), port)
+        
+        with self.lock:
+            ports = sorted(self._read_servers(self._available_servers()))
+        
+        if not threshold or len(calls) < threshold or len(ports) < 2:
+            port = self._select_server()
+            return self._call_server(port, "system.multicall", (calls,))
+        
+        # Keyed calls hash to a backend; keyless calls are dealt round-robin
+        groups = {}  # port -> indexes into calls
+        for index, call in enumerate(calls):
+            key = self._routing_key(call)
+            slot = zlib.crc32(key.encode()) if key is not None else index
+            groups.setdefault(ports[slot % len(ports)], []).append(index)
+        
+        with self.lock:
+            for port in groups:
+                self._claim(port)
+        
+        futures = {
+            port: self.batch_executor.submit(
+                self._call_server, port, "system.multicall", ([calls[i] for i in indexes],)
+            )
+            for port, indexes in groups.items()
+        }
+        
+        results = [None] * len(calls)
+        for port, indexes in groups.items():
             try:
-                # Simple ping to check if server is alive
-                self.servers[port].ping()
-                
-                with self.lock:
-                    if self.server_status.get(port) == 'down':
-                        logger.info(f"Server on port {port} is back UP")
-                    self.server_status[port] = 'up'
-                    self.last_health_check[port] = time.time()
+                sub_results = futures[port].result()
             except Exception as e:
-                logger.warning(f"Health check failed for server on port {port}: {e}")
-                with self.lock:
-                    self.server_status[port] = 'down'
+                # A failed sub-batch fails only its own calls
+                fault = {"faultCode": 1, "faultString": f"{type(e).__name__}: {e}"}
+                sub_results = [fault] * len(indexes)
+            for index, result in zip(indexes, sub_results):
+                results[index] = result
+        
+        logger.debug(f"Split batch of {len(calls)} calls across servers {sorted(groups)}")
+        return results
+    
+    def _record_health(self, port, ok):
+        """Feed a probe or call result to the failure detector and apply its verdict"""
+        with self.lock:
+            if port not in self.servers:
+                return
+            previous = self.server_status.get(port)
+            status = self.detector.record(port, ok)
+            if ok:
+                self.last_health_check[port] = time.time()
+            if status != previous:
+                self.server_status[port] = status
+                if status == 'down':
+                    self.breakers[port].trip()
+                    logger.warning(f"Marked server on port {port} as DOWN")
+                elif previous == 'down':
+                    # Back on probation: limited traffic until calls succeed again
+                    self.breakers[port].half_open()
+                    logger.info(f"Server on port {port} is back UP")
+    
+    def _probe_proxy(self, port):
+        """Connection for health probes, timing out after HEALTH_CHECK_TIMEOUT"""
+        if settings.RPC_TRANSPORT == "frame":
+            client = self._probe_clients.get(port)
+            if client is None:
+                client = self._probe_clients[port] = FrameRPCClient(
+                    settings.SERVER_HOST, port + settings.FRAME_PORT_OFFSET, settings.RPC_CODEC,
+                    timeout=settings.HEALTH_CHECK_TIMEOUT
+                )
+            return client
+        return xmlrpc.client.ServerProxy(
+            self.servers[port], transport=TimeoutTransport(settings.HEALTH_CHECK_TIMEOUT), allow_none=True
+        )
+    
+    def _probe(self, port):
+        """Ping one backend and record the result"""
+        try:
+            response = self._probe_proxy(port).ping()
+        except Exception as e:
+            logger.warning(f"Health check failed for server on port {port}: {e}")
+            self._record_health(port, False)
+        else:
+            self._record_health(port, True)
+            if isinstance(response, dict):
+                if "is_leader" in response:
+                    self._record_leader(port, response["is_leader"])
+                if isinstance(response.get("load"), dict):
+                    self._record_load(port, response["load"])
+    
+    def _record_leader(self, port, is_leader):
+        """Apply a backend's report of whether it is the leader"""
+        with self.lock:
+            if port not in self.servers:
+                return
+            if is_leader and self.leader != port:
+                logger.info(f"Server on port {port} is the leader (was {self.leader})")
+                self.leader = port
+            elif not is_leader and self.leader == port:
+                logger.warning(f"Server on port {port} is no longer the leader")
+                self.leader = None
+    
+    def _record_load(self, port, load):
+        """Weight a backend by the load it reported (LB_LOAD_COSTS)"""
+        cost = sum(settings.LB_LOAD_COSTS.get(name, 0) * value
+                   for name, value in load.items() if isinstance(value, (int, float)))
+        weight = max(settings.LB_MIN_WEIGHT, 1.0 / (1.0 + max(0.0, cost)))
+        with self.lock:
+            if port not in self.servers:
+                return
+            self.loads[port] = dict(load, weight=round(weight, 3))
+            self.policy.set_weight(port, weight if settings.LB_WEIGHTED_ROUTING else 1.0)
+    
+    def register_backend(self, port):
+        """
+        Add a backend, or take back one being drained
+        
+        It gets calls once a health probe finds it up.
+        
+        Args:
+            port (int): Port of the backend on SERVER_HOST
+            
+        Returns:
+            dict: Response with the backend ports
+        """
+        port = int(port)
+        with self.lock:
+            if port in self.draining:
+                del self.draining[port]
+                logger.info(f"Server on port {port} no longer draining")
+            elif port not in self.servers:
+                self._init_server_connection(port)
+                self.server_ports.append(port)
+                logger.info(f"Registered server on port {port}")
+            ports = list(self.server_ports)
+        self.health_executor.submit(self._probe, port)
+        return {"success": True, "servers": ports}
+    
+    def drain_backend(self, port):
+        """
+        Stop sending new calls to a backend and remove it once its calls in flight finish
+        
+        Returns at once. A backend still draining is listed under 'draining'
+        in get_stats; the health checker removes it if its calls have not
+        finished within LB_DRAIN_TIMEOUT seconds.
+        
+        Args:
+            port (int): Port of the backend
+            
+        Returns:
+            dict: Response with the calls still in flight and whether it was removed
+        """
+        port = int(port)
+        with self.lock:
+            if port not in self.servers:
+                return {"success": False, "message": f"No server on port {port}"}
+            self.draining.setdefault(port, time.monotonic() + settings.LB_DRAIN_TIMEOUT)
+            logger.info(f"Draining server on port {port} ({self.active_connections[port]} calls in flight)")
+            if not self.active_connections[port]:
+                self._remove_server(port)
+            removed = port not in self.servers
+            return {
+                "success": True,
+                "removed": removed,
+                "in_flight": 0 if removed else self.active_connections[port]
+            }
+    
+    def remove_backend(self, port):
+        """
+        Remove a backend at once; calls in flight to it still finish, but are no longer tracked
+        
+        Args:
+            port (int): Port of the backend
+            
+        Returns:
+            dict: Response with the backend ports
+        """
+        port = int(port)
+        with self.lock:
+            if port not in self.servers:
+                return {"success": False, "message": f"No server on port {port}"}
+            self._remove_server(port)
+            logger.info(f"Removed server on port {port}")
+            return {"success": True, "servers": list(self.server_ports)}
+    
+    def _remove_server(self, port):
+        """Forget a backend (caller holds the lock)"""
+        for table in (self.servers, self._registrations, self.active_connections, self.last_health_check,
+                      self.server_status, self.breakers, self.limits, self.loads, self.draining):
+            table.pop(port, None)
+        self.server_ports.remove(port)
+        self.detector.forget(port)
+        self.policy.forget(port)
+        if self.leader == port:
+            self.leader = None
+        for clients in (self._frame_clients, self._probe_clients):
+            client = clients.pop(port, None)
+            if client is not None:
+                client.close()
+    
+    def _health_check(self):
+        """Probe all backend servers in parallel and wait for the probes; remove drains past their deadline"""
+        with self.lock:
+            ports = list(self.server_ports)
+        futures = [self.health_executor.submit(self._probe, port) for port in ports]
+        for future in futures:
+            future.result()
+        
+        with self.lock:
+            now = time.monotonic()
+            for port, deadline in list(self.draining.items()):
+                if now >= deadline:
+                    logger.warning(f"Removing server on port {port} with {self.active_connections[port]} "
+                                   f"calls still in flight after LB_DRAIN_TIMEOUT")
+                    self._remove_server(port)
     
     def _start_health_checker(self):
         """Start a background thread for periodic health checks"""
         def health_check_worker():
             while True:
+                start = time.monotonic()
                 try:
                     self._health_check()
                 except Exception as e:
                     logger.error(f"Error in health check worker: {e}")
-                time.sleep(5)  # Check every 5 seconds
+                time.sleep(max(0.0, settings.HEALTH_CHECK_INTERVAL - (time.monotonic() - start)))
         
         health_thread = threading.Thread(target=health_check_worker, daemon=True)
         health_thread.start()
     
     def get_stats(self):
-        """Get load balancer statistics"""
+        """
+        Get load balancer statistics
+        
+        Also served over RPC, so every table is keyed by strings (ports as
+        text). 'backends' has each backend's forwarded calls and 'methods'
+        each method's client calls: call counts, rates over
+        METRICS_RATE_WINDOW, errors by kind and latency percentiles.
+        """
+        hedge_delays = {method: estimate.delay() for method, estimate in self.hedge_delays.items()}
         with self.lock:
-            return {
-                'active_connections': dict(self.active_connections),
-                'server_status': dict(self.server_status),
+            stats = {
+                'active_connections': {str(port): count for port, count in self.active_connections.items()},
+                'policy': self.policy.name,
+                'leader': self.leader,
+                'policy_state': self.policy.stats(),
+                'retries': dict(self.retry_stats, budget=self.retry_budget.summary()),
+                'hedging': dict(
+                    self.hedge_stats,
+                    budget=self.hedge_budget.summary(),
+                    delay_ms={method: None if delay is None else round(delay * 1e3, 3)
+                              for method, delay in hedge_delays.items()}
+                ),
+                'server_status': {str(port): status for port, status in self.server_status.items()},
+                'health': {str(port): self.detector.summary(port) for port in self.server_ports},
+                'breakers': {str(port): breaker.summary() for port, breaker in self.breakers.items()},
+                'draining': sorted(self.draining),
+                'loads': {str(port): load for port, load in self.loads.items()},
+                'concurrency_limits': {str(port): limit.summary() for port, limit in self.limits.items()},
+                'shed': dict(self.shed_stats),
+                'cache': self.response_cache.summary(),
                 'last_health_check': {
-                    port: time.ctime(t) for port, t in self.last_health_check.items()
+                    str(port): time.ctime(t) for port, t in self.last_health_check.items()
                 }
             }
+        stats['backends'] = self.backend_metrics.summary()
+        stats['methods'] = self.method_metrics.summary()
+        if self.capture is not None:
+            stats['capture'] = self.capture.summary()
+        if self.pool is not None:
+            stats['pool'] = self.pool.pool_stats()
+        return stats
+    
+    def prometheus_metrics(self):
+        """Get the load balancer's metrics in the Prometheus text exposition format"""
+        lines = self.backend_metrics.prometheus("lb_backend") + self.method_metrics.prometheus("lb_method")
+        
+        with self.lock:
+            ports = list(self.server_ports)
+            gauges = {
+                "lb_backend_up": {port: int(self.server_status.get(port) == 'up') for port in ports},
+                "lb_backend_draining": {port: int(port in self.draining) for port in ports},
+                "lb_backend_active_connections": {port: self.active_connections[port] for port in ports},
+                "lb_backend_concurrency_limit": {port: round(self.limits[port].limit, 2) for port in ports},
+                "lb_backend_breaker_closed": {port: int(self.breakers[port].state == 'closed') for port in ports},
+                "lb_backend_weight": {port: self.policy.weights.get(port, 1.0) for port in ports},
+                "lb_backend_leader": {port: int(port == self.leader) for port in ports}
+            }
+            counters = {
+                "lb_retries_total": ("outcome", dict(self.retry_stats)),
+                "lb_shed_total": ("priority", dict(self.shed_stats)),
+                "lb_hedges_total": ("outcome", dict(self.hedge_stats))
+            }
+        
+        for name, values in gauges.items():
+            lines.append(f"# TYPE {name} gauge")
+            lines += [f'{name}{{backend="{port}"}} {value}' for port, value in values.items()]
+        for name, (label, values) in counters.items():
+            lines.append(f"# TYPE {name} counter")
+            lines += [f'{name}{{{label}="{key}"}} {value}' for key, value in values.items()]
+        
+        lines.append("# TYPE lb_cache_requests_total counter")
+        for method, counts in self.response_cache.summary()["methods"].items():
+            lines += [f'lb_cache_requests_total{{method="{method}",result="{result}"}} {counts[result]}'
+                      for result in ("hits", "misses", "coalesced")]
+        return "\n".join(lines) + "\n"
+    
+    def prometheus_response(self):
+        """Content type and body of the HTTP response at LB_METRICS_PATH"""
+        return "text/plain; version=0.0.4; charset=utf-8", self.prometheus_metrics().encode("utf-8")
 
 
 def main():
@@ -177,21 +1169,53 @@ def main():
     
     load_balancer = LoadBalancer(server_ports)
     
+    frame_port = load_balancer_port + settings.FRAME_PORT_OFFSET
+    
     # Create server
-    server = ThreadedXMLRPCServer(
-        (settings.SERVER_HOST, load_balancer_port), 
-        requestHandler=SimpleXMLRPCRequestHandler, 
-        allow_none=True
-    )
+    if settings.SERVER_MODE == "asyncio":
+        # One event loop serves XML-RPC and frame RPC connections
+        server = AsyncRPCServer(
+            (settings.SERVER_HOST, load_balancer_port),
+            rpc_paths=SimpleXMLRPCRequestHandler.rpc_paths,
+            workers=settings.ASYNC_RPC_WORKERS,
+            frame_addr=(settings.SERVER_HOST, frame_port) if settings.FRAME_RPC_ENABLED else None
+        )
+        server.get_paths[settings.LB_METRICS_PATH] = load_balancer.prometheus_response
+    elif settings.SERVER_MODE == "pooled":
+        server = PooledXMLRPCServer(
+            (settings.SERVER_HOST, load_balancer_port), 
+            requestHandler=MetricsRequestHandler, 
+            allow_none=True
+        )
+        server.pool_workers = settings.SERVER_WORKERS
+        server.pool_queue_size = settings.SERVER_QUEUE_SIZE
+        load_balancer.pool = server
+    else:
+        server = ThreadedXMLRPCServer(
+            (settings.SERVER_HOST, load_balancer_port), 
+            requestHandler=MetricsRequestHandler, 
+            allow_none=True
+        )
     server.register_introspection_functions()
     server.register_instance(load_balancer)
     
+    # Frame RPC listener for clients of the frame transport
+    if settings.FRAME_RPC_ENABLED and settings.SERVER_MODE != "asyncio":
+        frame_server = FrameRPCServer((settings.SERVER_HOST, frame_port), workers=settings.FRAME_RPC_WORKERS)
+        frame_server.register_introspection_functions()
+        frame_server.register_instance(load_balancer)
+        threading.Thread(target=frame_server.serve_forever, daemon=True).start()
+        logger.info(f"Frame RPC on {settings.SERVER_HOST}:{frame_port}")
+    
     logger.info(f"=== LOAD BALANCER STARTED ===")
     logger.info(f"Running on {settings.SERVER_HOST}:{load_balancer_port}")
     logger.info(f"Balancing between servers on ports: {server_ports}")
     print(f"=== LOAD BALANCER STARTED ===")
     print(f"Running on {settings.SERVER_HOST}:{load_balancer_port}")
     print(f"Balancing between servers on ports: {server_ports}")
+    print(f"Prometheus metrics at http://{settings.SERVER_HOST}:{load_balancer_port}{settings.LB_METRICS_PATH}")
+    if load_balancer.capture is not None:
+        print(f"Capturing {settings.LB_CAPTURE_SAMPLE_RATE:.0%} of calls to {settings.LB_CAPTURE_PATH}")
     print("Clients should connect to this load balancer instead of individual servers.")
     
     try:
@@ -199,6 +1223,9 @@ def main():
     except KeyboardInterrupt:
         logger.info("Load balancer shutting down...")
         server.shutdown()
+    finally:
+        if load_balancer.capture is not None:
+            load_balancer.capture.close()
 
 
 if __name__ == "__main__":
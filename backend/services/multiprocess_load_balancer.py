@@ -0,0 +1,260 @@
+"""
+Multi-process load balancer
+
+A single LoadBalancer process is bound by the GIL to one core, with one lock
+around every routing decision. This launcher starts N worker processes that
+all listen on the load balancer's ports with SO_REUSEPORT, so the kernel
+spreads client connections across them. The workers keep routing coherent
+through a table in shared memory (see util.shared_table): backend status,
+leader and weights as probed by worker 0, circuit breaker trips, and every
+worker's calls in flight per backend.
+"""
+
+import os
+import sys
+import threading
+import time
+import logging
+import multiprocessing
+from xmlrpc.server import SimpleXMLRPCRequestHandler
+
+# Add the parent directory to sys.path to allow relative imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import settings
+from services.load_balancer import (
+    LoadBalancer, ThreadedXMLRPCServer, PooledXMLRPCServer, MetricsRequestHandler
+)
+from services.multiprocess_server import ReusePortMixIn
+from util.async_rpc import AsyncRPCServer
+from util.circuit_breaker import OPEN, CLOSED
+from util.frame_rpc import FrameRPCServer
+from util.shared_table import SharedBackendTable
+
+logger = logging.getLogger("MultiProcessLoadBalancer")
+
+
+class ReusePortThreadedServer(ReusePortMixIn, ThreadedXMLRPCServer):
+    pass
+
+class ReusePortPooledServer(ReusePortMixIn, PooledXMLRPCServer):
+    pass
+
+class ReusePortFrameServer(ReusePortMixIn, FrameRPCServer):
+    pass
+
+
+class SharedStateLoadBalancer(LoadBalancer):
+    """
+    LoadBalancer for one worker process of a MultiProcessLoadBalancer.
+
+    Worker 0 probes the backends and publishes their status, the leader and
+    their weights into the shared table; the other workers run no probes and
+    read them from the table before every routing decision. Every worker
+    publishes its calls in flight per backend, and the policy sees the sum
+    over all workers. A worker whose breaker opens publishes until when, and
+    the others open theirs too, so one worker seeing a backend fail spares
+    the rest. Concurrency limits, retry and hedge budgets, the response
+    cache and the traffic metrics stay per worker.
+    """
+    def __init__(self, table, index, policy=None):
+        """
+        Initialize the worker's load balancer
+
+        Args:
+            table (SharedBackendTable): Backend state shared by the workers
+            index (int): This worker's index (0 probes the backends)
+            policy (str): Balancing policy name, LB_POLICY by default
+        """
+        self.table = table
+        self.index = index
+        self._adopted_opens = {}  # port -> breaker.times_opened already published or taken from the table
+        super().__init__(list(table.ports), policy)
+
+    def _start_health_checker(self):
+        if self.index == 0:
+            super()._start_health_checker()
+
+    def _health_check(self):
+        if self.index == 0:
+            super()._health_check()
+        else:
+            # Only worker 0 probes: wait (at startup) for its first round to be published
+            deadline = time.monotonic() + settings.HEALTH_CHECK_INTERVAL + settings.HEALTH_CHECK_TIMEOUT
+            while (any(self.table.status(port) == 'unknown' for port in self.server_ports)
+                   and time.monotonic() < deadline):
+                time.sleep(0.01)
+        with self.lock:
+            self._sync_table()
+
+    def _available_servers(self):
+        self._sync_table()
+        return super()._available_servers()
+
+    def _write_home(self, key):
+        self._sync_table()
+        return super()._write_home(key)
+
+    def _sync_table(self):
+        """Exchange backend state with the shared table (caller holds the lock)"""
+        now = time.time()
+        leader = None
+        for port in self.server_ports:
+            if self.index == 0:
+                self.table.publish(port, self.server_status[port], port == self.leader,
+                                   self.policy.weights.get(port, 1.0))
+            else:
+                self.server_status[port] = self.table.status(port)
+                self.policy.set_weight(port, self.table.weight(port))
+                if self.table.is_leader(port):
+                    leader = port
+
+            breaker = self.breakers[port]
+            if breaker.state == OPEN and breaker.times_opened != self._adopted_opens.get(port, 0):
+                self.table.set_open_until(port, now + breaker.open_seconds)
+            elif breaker.state == CLOSED and self.table.open_until(port) > now:
+                breaker.trip()
+            self._adopted_opens[port] = breaker.times_opened
+        if self.index != 0:
+            self.leader = leader
+
+    def _claim(self, port):
+        super()._claim(port)
+        self.table.set_connections(port, self.index, self.active_connections[port])
+
+    def _release(self, port):
+        super()._release(port)
+        self.table.set_connections(port, self.index, self.active_connections[port])
+
+    def _connection_counts(self):
+        return {port: self.table.connections(port) for port in self.server_ports}
+
+    def register_backend(self, port):
+        return {"success": False, "message": "Backends are fixed in a multi-process load balancer"}
+
+    def drain_backend(self, port):
+        return self.register_backend(port)
+
+    def remove_backend(self, port):
+        return self.register_backend(port)
+
+    def get_stats(self):
+        with self.lock:
+            self._sync_table()
+        stats = super().get_stats()
+        stats['worker'] = self.index
+        stats['active_connections'] = {str(port): count for port, count in self._connection_counts().items()}
+        return stats
+
+
+def run_worker(index, table):
+    """Worker process: serve client calls on the shared ports"""
+    logging.getLogger().setLevel(logging.WARNING)
+    if settings.LB_CAPTURE_PATH:
+        # One capture file per worker; the replay tool merges them
+        root, extension = os.path.splitext(settings.LB_CAPTURE_PATH)
+        settings.LB_CAPTURE_PATH = f"{root}-{index}{extension}"
+    load_balancer = SharedStateLoadBalancer(table, index)
+    port = settings.LOAD_BALANCER_PORT
+    frame_address = (settings.SERVER_HOST, port + settings.FRAME_PORT_OFFSET)
+
+    frame_server = None
+    if settings.SERVER_MODE == "asyncio":
+        server = AsyncRPCServer(
+            (settings.SERVER_HOST, port),
+            rpc_paths=SimpleXMLRPCRequestHandler.rpc_paths,
+            workers=settings.ASYNC_RPC_WORKERS,
+            frame_addr=frame_address if settings.FRAME_RPC_ENABLED else None,
+            reuse_port=True
+        )
+        server.get_paths[settings.LB_METRICS_PATH] = load_balancer.prometheus_response
+    else:
+        server_class = ReusePortPooledServer if settings.SERVER_MODE == "pooled" else ReusePortThreadedServer
+        server = server_class((settings.SERVER_HOST, port), requestHandler=MetricsRequestHandler,
+                              allow_none=True, logRequests=False)
+        if settings.SERVER_MODE == "pooled":
+            server.pool_workers = settings.SERVER_WORKERS
+            server.pool_queue_size = settings.SERVER_QUEUE_SIZE
+            load_balancer.pool = server
+        if settings.FRAME_RPC_ENABLED:
+            frame_server = ReusePortFrameServer(frame_address, workers=settings.FRAME_RPC_WORKERS)
+
+    for rpc_server in filter(None, (server, frame_server)):
+        rpc_server.register_introspection_functions()
+        rpc_server.register_instance(load_balancer)
+    if frame_server:
+        threading.Thread(target=frame_server.serve_forever, daemon=True).start()
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+class MultiProcessLoadBalancer:
+    """
+    Launcher for the worker processes of the load balancer
+    """
+    def __init__(self, processes=None, server_ports=None):
+        """
+        Initialize the launcher
+
+        Args:
+            processes (int): Worker processes, LB_PROCESSES by default
+            server_ports (list): Backend ports, from BASE_SERVER_PORT and SERVER_COUNT by default
+        """
+        self.processes = processes or settings.LB_PROCESSES
+        self.server_ports = server_ports or [
+            settings.BASE_SERVER_PORT + i for i in range(settings.SERVER_COUNT)
+        ]
+        self.table = SharedBackendTable(self.server_ports, self.processes)
+        self.workers = []
+
+    def start(self):
+        """Start the worker processes"""
+        os.makedirs(os.path.dirname(settings.LOG_FILE), exist_ok=True)
+        for index in range(self.processes):
+            worker = multiprocessing.Process(
+                target=run_worker, args=(index, self.table),
+                name=f"load-balancer-{index}", daemon=True
+            )
+            worker.start()
+            self.workers.append(worker)
+
+    def stop(self):
+        """Stop the worker processes"""
+        for worker in self.workers:
+            worker.terminate()
+        for worker in self.workers:
+            worker.join()
+        self.workers = []
+
+    def run(self):
+        """Start the workers and wait until interrupted or one of them exits"""
+        self.start()
+        print(f"=== LOAD BALANCER STARTED ({self.processes} processes) ===")
+        print(f"Running on {settings.SERVER_HOST}:{settings.LOAD_BALANCER_PORT}")
+        print(f"Balancing between servers on ports: {self.server_ports}")
+        try:
+            while all(worker.is_alive() for worker in self.workers):
+                time.sleep(1)
+            logger.error("A worker process exited, shutting down")
+        except KeyboardInterrupt:
+            print("Load balancer shutting down...")
+        finally:
+            self.stop()
+
+
+def main():
+    """Run a multi-process load balancer"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Multi-process Load Balancer')
+    parser.add_argument('--processes', type=int, default=None, help='Worker processes (default: LB_PROCESSES)')
+    args = parser.parse_args()
+
+    MultiProcessLoadBalancer(args.processes).run()
+
+
+if __name__ == "__main__":
+    main()
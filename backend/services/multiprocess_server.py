@@ -0,0 +1,392 @@
+"""
+Multi-process cab server
+
+A single CabServer process is bound by the GIL to one core. This launcher
+starts N worker processes that all listen on the server's ports with
+SO_REUSEPORT, so the kernel spreads connections across them. Each worker
+owns one zone partition: the rides picked up in its zones and the drivers
+available there, plus a copy of every user. Calls arriving at a worker that
+does not own their ride or zone are forwarded to the owner over a Unix
+socket (frame RPC); calls that span partitions are fanned out and merged.
+Operations replicated by peers are applied on the partitions their original
+calls would have run on.
+
+Matching does not cross partitions. book_cab and scheduled dispatch assign
+only drivers available in the ride's partition, and accept_ride runs there
+too, so a driver can take only rides picked up in the zones of the partition
+they are available in. A ride with no driver in its partition stays
+REQUESTED until one becomes available there or the request expires.
+"""
+
+import os
+import random
+import socket
+import sys
+import threading
+import time
+import logging
+import multiprocessing
+
+# Add the parent directory to sys.path to allow relative imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import settings
+from services.cab_service import (
+    CabService, ThreadedXMLRPCServer, PooledXMLRPCServer, FrameServer, AsyncServer, RequestHandler
+)
+from util.frame_rpc import FrameRPCClient, UnixFrameRPCServer
+from util.location_catalog import normalize_location
+from util.partitioning import partition_of, zone_partition
+
+logger = logging.getLogger("MultiProcessCabServer")
+
+
+class ReusePortMixIn:
+    """Bind with SO_REUSEPORT so every worker process can listen on the same port"""
+
+    def server_bind(self):
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        super().server_bind()
+
+class ReusePortThreadedServer(ReusePortMixIn, ThreadedXMLRPCServer):
+    pass
+
+class ReusePortPooledServer(ReusePortMixIn, PooledXMLRPCServer):
+    pass
+
+class ReusePortFrameServer(ReusePortMixIn, FrameServer):
+    pass
+
+
+def partition_socket(server_id, index):
+    """Path of the Unix socket a partition serves its local calls on"""
+    return os.path.join(settings.PARTITION_SOCKET_DIR, f"cab_server_{server_id}_p{index}.sock")
+
+
+class PartitionRouter:
+    """
+    CabService front end for one worker: runs calls on the local partition
+    or forwards them to the partition that owns their ride or zone.
+    """
+    # Methods whose first argument is a ride id
+    RIDE_METHODS = frozenset(["get_ride_status", "cancel_ride", "update_ride_status", "accept_ride"])
+
+    # Methods routed by their pickup location -> index of that argument
+    ZONE_METHODS = {"book_cab": 1, "schedule_ride": 1}
+
+    # Replicated operations applied by the partition owning their ride (params["ride_id"])
+    RIDE_OPERATIONS = frozenset(["book_ride", "schedule_ride", "cancel_ride", "update_ride_status", "accept_ride"])
+
+    # Methods answered by every partition, merged by concatenating one list field
+    MERGED_METHODS = {
+        "get_active_rides": "active_rides",
+        "get_user_rides": "rides",
+        "get_available_cabs": "available_drivers"
+    }
+
+    def __init__(self, service, server_id, index, count):
+        """
+        Initialize the router
+
+        Args:
+            service (CabService): This worker's partition
+            server_id (int): Cab server the workers belong to
+            index (int): This worker's partition index
+            count (int): Number of partitions
+        """
+        self.service = service
+        self.index = index
+        self.count = count
+        self.peers = {
+            i: FrameRPCClient(partition_socket(server_id, i), None, "json")
+            for i in range(count) if i != index
+        }
+
+    def __getattr__(self, name):
+        # Lets the server see the service's public methods (introspection, per-method metrics)
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.service, name)
+
+    def _local(self, method, params):
+        func = None if method.startswith("_") else getattr(self.service, method, None)
+        if func is None:
+            raise Exception(f'method "{method}" is not supported')
+        return func(*params)
+
+    def _call(self, partition, method, params):
+        """Run a call on one partition"""
+        if partition == self.index:
+            return self._local(method, params)
+        return self.peers[partition].call(method, *params)
+
+    def _call_all(self, method, params, partitions=None):
+        """Run a call on several partitions in parallel; results in partition order"""
+        if partitions is None:
+            partitions = range(self.count)
+        futures = {p: self.peers[p].call_async(method, *params) for p in partitions if p != self.index}
+        results = {}
+        if self.index in partitions:
+            results[self.index] = self._local(method, params)
+        for p, future in futures.items():
+            results[p] = future.result(settings.REQUEST_TIMEOUT)
+        return [results[p] for p in partitions]
+
+    def _dispatch(self, method, params):
+        """Route one call to the partition(s) that own its data"""
+        if method in self.RIDE_METHODS and params:
+            return self._call(partition_of(params[0], self.count), method, params)
+
+        if method in self.ZONE_METHODS and len(params) > self.ZONE_METHODS[method]:
+            return self._call(zone_partition(params[self.ZONE_METHODS[method]], self.count), method, params)
+
+        if method == "register_user" and params:
+            # The username's owner decides, so two registrations cannot both win; then every copy
+            owner = partition_of(params[0], self.count)
+            result = self._call(owner, method, params)
+            if result.get("success"):
+                # Copies are applied as replicated, so only the owner replicates to the peers
+                username, password, user_type = params[:3]
+                name, email, phone = (list(params[3:6]) + [None] * 3)[:3]
+                copy = {"username": username, "password": password, "user_type": user_type,
+                        "name": name, "email": email, "phone": phone}
+                self._replicate_elsewhere(owner, "register_user", copy, settings.REPLICATION_TOKEN)
+            return result
+
+        if method == "set_driver_available" and len(params) >= 2:
+            return self._set_driver_available(params)
+
+        if method == "replicate" and len(params) >= 2:
+            return self._replicate(*params[:4])
+
+        if method in self.MERGED_METHODS:
+            field = self.MERGED_METHODS[method]
+            results = self._call_all(method, params)
+            merged = dict(results[0])
+            merged[field] = [item for result in results for item in result.get(field, [])]
+            return merged
+
+        if method == "get_surge_pricing":
+            results = self._call_all(method, params)
+            merged = dict(results[0])
+            merged["zones"] = sorted((z for r in results for z in r.get("zones", [])),
+                                     key=lambda z: z["multiplier"], reverse=True)
+            return merged
+
+        if method == "autocomplete_locations" and params:
+            limit = params[1] if len(params) > 1 and params[1] is not None else settings.LOCATION_AUTOCOMPLETE_LIMIT
+            results = self._call_all(method, params)
+            # Location ids are per partition; keep each place's entry from the partition owning it
+            locations = {}
+            for partition, result in enumerate(results):
+                for location in result.get("locations", []):
+                    key = normalize_location(location["name"])
+                    if key not in locations or zone_partition(key, self.count) == partition:
+                        locations[key] = location
+            merged = dict(results[0])
+            merged["locations"] = [locations[key] for key in sorted(locations)[:int(limit)]]
+            return merged
+
+        if method == "get_server_stats":
+            return self._merge_stats(self._call_all(method, params))
+
+        if method == "get_metrics":
+            results = self._call_all(method, params)
+            merged = dict(results[self.index])
+            merged["partitions"] = [r.get("metrics") for r in results]
+            return merged
+
+        return self._local(method, params)
+
+    def _set_driver_available(self, params):
+        """
+        A driver is available in the partition owning their zone and nowhere
+        else, so the other partitions are told the driver is unavailable.
+        """
+        driver_name, location = params[0], params[1]
+        owner = zone_partition(location, self.count)
+        result = self._call(owner, "set_driver_available", params)
+        if result.get("success"):
+            # Applied as replicated, so only the owner replicates to the peers
+            self._replicate_elsewhere(owner, "set_driver_available",
+                                      {"driver_name": driver_name, "location": location, "is_available": False},
+                                      settings.REPLICATION_TOKEN)
+        return result
+
+    def _replicate_elsewhere(self, owner, operation, params, token):
+        """Apply an operation on every partition but the owner, without replicating it again"""
+        self._call_all("replicate", [operation, params, None, token], [p for p in range(self.count) if p != owner])
+
+    def _replicate(self, operation, params, client_clock=None, token=None):
+        """
+        Apply an operation replicated by a peer on the partition(s) its
+        original call ran on in this server, keyed as _dispatch keys the call.
+        Batches of rides are split by the partition owning each ride. The
+        peer's token goes with every part, for each partition to check.
+        """
+        if operation in self.RIDE_OPERATIONS:
+            partition = partition_of(params["ride_id"], self.count)
+            return self._call(partition, "replicate", [operation, params, client_clock, token])
+
+        if operation == "set_driver_available":
+            owner = zone_partition(params["location"], self.count)
+            result = self._call(owner, "replicate", [operation, params, client_clock, token])
+            if result.get("success"):
+                self._replicate_elsewhere(owner, operation, dict(params, is_available=False), token)
+            return result
+
+        if operation in ("dispatch_scheduled", "expire"):
+            # Expired drivers are marked unavailable everywhere, harmless outside the partition they were in
+            partitions = range(self.count) if operation == "expire" else []
+            batches = {partition: dict(params, rides=[]) for partition in partitions}
+            for ride in params.get("rides", []):
+                partition = partition_of(ride["ride_id"], self.count)
+                batches.setdefault(partition, dict(params, rides=[]))["rides"].append(ride)
+            return self._replicate_batches(operation, client_clock, token, batches)
+
+        # register_user and idempotency: every partition keeps a copy. An
+        # idempotency key does not name the zone its call was routed by, so
+        # the stored response goes wherever a retry may land.
+        results = self._call_all("replicate", [operation, params, client_clock, token])
+        return results[self.index]
+
+    def _replicate_batches(self, operation, client_clock, token, batches):
+        """Apply one part of a replicated batch on each partition; successful if every part was"""
+        results = [self._call(partition, "replicate", [operation, batches[partition], client_clock, token])
+                   for partition in sorted(batches)]
+        failed = [result for result in results if not result.get("success")]
+        return failed[0] if failed else (results[0] if results else {"success": True})
+
+    def _merge_stats(self, results):
+        """Sum ride and available-driver counters across partitions (users are the same everywhere)"""
+        merged = dict(results[self.index])
+        stats = dict(merged["stats"])
+        stats["rides"] = {key: sum(r["stats"]["rides"][key] for r in results) for key in stats["rides"]}
+        stats["drivers"] = dict(stats["drivers"], available=sum(r["stats"]["drivers"]["available"] for r in results))
+        stats["partition"] = self.index
+        stats["partitions"] = self.count
+        stats["pending_timers"] = sum(r["stats"]["pending_timers"] for r in results)
+        stats["scheduled_rides"] = sum(r["stats"]["scheduled_rides"] for r in results)
+        merged["stats"] = stats
+        return merged
+
+
+def run_worker(server_id, index, count):
+    """Worker process: serve one partition on the shared ports"""
+    # Identical sample data in every partition; each keeps only its own zones' drivers available
+    random.seed(server_id)
+    service = CabService(server_id, is_leader=(server_id == 0), partition=(index, count))
+
+    # Calls forwarded from the other partitions
+    ipc_server = UnixFrameRPCServer(partition_socket(server_id, index), workers=settings.FRAME_RPC_WORKERS)
+    ipc_server.register_instance(service)
+    threading.Thread(target=ipc_server.serve_forever, daemon=True).start()
+
+    router = PartitionRouter(service, server_id, index, count)
+    port = settings.BASE_SERVER_PORT + server_id
+    frame_address = (settings.SERVER_HOST, port + settings.FRAME_PORT_OFFSET)
+
+    frame_server = None
+    if settings.SERVER_MODE == "asyncio":
+        server = AsyncServer(
+            (settings.SERVER_HOST, port),
+            rpc_paths=RequestHandler.rpc_paths,
+            workers=settings.ASYNC_RPC_WORKERS,
+            frame_addr=frame_address if settings.FRAME_RPC_ENABLED else None,
+            reuse_port=True
+        )
+    else:
+        server_class = ReusePortPooledServer if settings.SERVER_MODE == "pooled" else ReusePortThreadedServer
+        server = server_class((settings.SERVER_HOST, port), requestHandler=RequestHandler,
+                              allow_none=True, logRequests=False)
+        if settings.SERVER_MODE == "pooled":
+            server.pool_workers = settings.SERVER_WORKERS
+            server.pool_queue_size = settings.SERVER_QUEUE_SIZE
+            service.metrics.pool = server
+        if settings.FRAME_RPC_ENABLED:
+            frame_server = ReusePortFrameServer(frame_address, workers=settings.FRAME_RPC_WORKERS)
+
+    for rpc_server in filter(None, (server, frame_server)):
+        rpc_server.register_introspection_functions()
+        rpc_server.register_multicall_functions()
+        rpc_server.register_instance(router)
+        rpc_server.metrics = service.metrics
+    if frame_server:
+        threading.Thread(target=frame_server.serve_forever, daemon=True).start()
+
+    logger.info(f"Partition {index}/{count} of server {server_id} serving on port {port} (pid {os.getpid()})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        ipc_server.server_close()
+
+
+class MultiProcessCabServer:
+    """
+    Launcher for the worker processes of one cab server
+    """
+    def __init__(self, server_id=0, processes=None):
+        """
+        Initialize the launcher
+
+        Args:
+            server_id (int): Unique identifier for this server instance
+            processes (int): Worker processes (partitions), SERVER_PROCESSES by default
+        """
+        self.server_id = server_id
+        self.processes = processes or settings.SERVER_PROCESSES
+        self.port = settings.BASE_SERVER_PORT + server_id
+        self.workers = []
+
+    def start(self):
+        """Start the worker processes"""
+        os.makedirs(os.path.dirname(settings.LOG_FILE), exist_ok=True)
+        os.makedirs(settings.PARTITION_SOCKET_DIR, exist_ok=True)
+        for index in range(self.processes):
+            worker = multiprocessing.Process(
+                target=run_worker, args=(self.server_id, index, self.processes),
+                name=f"cab-server-{self.server_id}-p{index}", daemon=True
+            )
+            worker.start()
+            self.workers.append(worker)
+
+    def stop(self):
+        """Stop the worker processes"""
+        for worker in self.workers:
+            worker.terminate()
+        for worker in self.workers:
+            worker.join()
+        self.workers = []
+
+    def run(self):
+        """Start the workers and wait until interrupted or one of them exits"""
+        self.start()
+        print(f"=== CAB SERVER {self.server_id} STARTED ({self.processes} processes) ===")
+        print(f"Running on {settings.SERVER_HOST}:{self.port}")
+        print(f"Server mode: {settings.SERVER_MODE}")
+        try:
+            while all(worker.is_alive() for worker in self.workers):
+                time.sleep(1)
+            logger.error("A worker process exited, shutting down")
+        except KeyboardInterrupt:
+            print("Server shutting down...")
+        finally:
+            self.stop()
+
+
+def main():
+    """Run a multi-process cab server"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Multi-process Cab Server')
+    parser.add_argument('--id', type=int, default=0, help='Server ID')
+    parser.add_argument('--processes', type=int, default=None, help='Worker processes (default: SERVER_PROCESSES)')
+    args = parser.parse_args()
+
+    MultiProcessCabServer(args.id, args.processes).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""
+Event-loop RPC server: one asyncio loop owns every connection, and calls run
+on a bounded thread pool.
+
+The loop only reads and writes sockets, so thousands of idle or slow
+connections cost a socket and a small coroutine each rather than an OS thread.
+Request parsing, dispatch and response marshaling are done by the workers,
+which also keeps blocking service code (locks, replication) off the loop.
+Serves XML-RPC over HTTP/1.1 with keep-alive and, optionally, the frame
+protocol from util.frame_rpc on a second port.
+"""
+
+import asyncio
+import logging
+import xmlrpc.client
+from concurrent.futures import ThreadPoolExecutor
+from xmlrpc.server import SimpleXMLRPCDispatcher
+
+from util.frame_rpc import HEADER, MAX_FRAME_SIZE, CODECS, encode_frame
+
+logger = logging.getLogger(__name__)
+
+MAX_HEADER_SIZE = 64 * 1024
+MAX_BODY_SIZE = 64 * 1024 * 1024
+
+
+class AsyncRPCServer(SimpleXMLRPCDispatcher):
+    """
+    asyncio server with the same registration API as SimpleXMLRPCServer
+    (register_instance, register_function, register_multicall_functions, ...).
+    """
+
+    def __init__(self, addr, rpc_paths=("/RPC2",), workers=32, frame_addr=None, backlog=4096, reuse_port=False):
+        """
+        Initialize the server (sockets are bound when it starts)
+
+        Args:
+            addr (tuple): (host, port) for XML-RPC over HTTP
+            rpc_paths (tuple): Accepted HTTP paths
+            workers (int): Calls executed concurrently
+            frame_addr (tuple): (host, port) for frame RPC, or None
+            backlog (int): Listen backlog of each socket
+            reuse_port (bool): Bind with SO_REUSEPORT, so several processes can share the ports
+        """
+        SimpleXMLRPCDispatcher.__init__(self, allow_none=True, encoding=None)
+        self.server_address = addr
+        self.frame_address = frame_addr
+        self.rpc_paths = rpc_paths
+        self.backlog = backlog
+        self.reuse_port = reuse_port
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="async-rpc")
+        self.connections = 0
+        self.get_paths = {}  # HTTP path -> callable returning (content type, body bytes) for GET requests
+        self._loop = None
+        self._servers = []
+        self._stopped = None
+
+    async def start(self):
+        """Bind the listening sockets on the running loop"""
+        self._loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        host, port = self.server_address
+        http_server = await asyncio.start_server(self._serve_http, host, port, backlog=self.backlog,
+                                                 reuse_port=self.reuse_port or None)
+        self._servers.append(http_server)
+        self.server_address = http_server.sockets[0].getsockname()[:2]
+        if self.frame_address:
+            host, port = self.frame_address
+            frame_server = await asyncio.start_server(self._serve_frames, host, port, backlog=self.backlog,
+                                                      reuse_port=self.reuse_port or None)
+            self._servers.append(frame_server)
+            self.frame_address = frame_server.sockets[0].getsockname()[:2]
+
+    async def serve(self):
+        """Start and serve until shutdown() is called"""
+        await self.start()
+        await self._stopped.wait()
+        for server in self._servers:
+            server.close()
+            await server.wait_closed()
+        self.executor.shutdown(wait=False)
+
+    def serve_forever(self):
+        """Run the event loop in this thread until shutdown() is called"""
+        asyncio.run(self.serve())
+
+    def shutdown(self):
+        """Stop serving; safe to call from any thread"""
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._stopped.set)
+
+    def server_close(self):
+        self.shutdown()
+
+    async def _serve_http(self, reader, writer):
+        """Serve XML-RPC requests on one keep-alive HTTP connection"""
+        self.connections += 1
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    return
+                if len(head) > MAX_HEADER_SIZE:
+                    return
+
+                lines = head.decode("latin-1").split("\r\n")
+                parts = lines[0].split()
+                if len(parts) != 3:
+                    await self._send_http(writer, 400, b"", False)
+                    return
+                command, path, version = parts
+                headers = {}
+                for line in lines[1:]:
+                    name, _, value = line.partition(":")
+                    if name:
+                        headers[name.strip().lower()] = value.strip()
+
+                connection = headers.get("connection", "").lower()
+                keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+
+                try:
+                    length = int(headers.get("content-length", 0))
+                except ValueError:
+                    length = -1
+                if length < 0 or length > MAX_BODY_SIZE:
+                    await self._send_http(writer, 400, b"", False)
+                    return
+                try:
+                    body = await reader.readexactly(length)
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    return
+
+                if command == "GET" and path in self.get_paths:
+                    status, content_type, response = await self._loop.run_in_executor(
+                        self.executor, self._http_get, path
+                    )
+                    await self._send_http(writer, status, response, keep_alive, content_type)
+                elif command != "POST":
+                    await self._send_http(writer, 501, b"", keep_alive)
+                elif path not in self.rpc_paths:
+                    await self._send_http(writer, 404, b"", keep_alive)
+                else:
+                    status, response = await self._loop.run_in_executor(self.executor, self._http_call, body)
+                    await self._send_http(writer, status, response, keep_alive)
+                if not keep_alive:
+                    return
+        except ConnectionError:
+            pass
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    def _http_get(self, path):
+        """Run the handler of a GET path (runs on a worker)"""
+        try:
+            content_type, response = self.get_paths[path]()
+            return 200, content_type, response
+        except Exception as e:
+            logger.error(f"Error handling GET {path}: {e}")
+            return 500, "text/plain", b""
+
+    def _http_call(self, body):
+        """Unmarshal, dispatch and marshal one XML-RPC request (runs on a worker)"""
+        try:
+            return 200, self._marshaled_dispatch(body)
+        except Exception as e:
+            logger.error(f"Error handling XML-RPC request: {e}")
+            return 500, b""
+
+    async def _send_http(self, writer, status, body, keep_alive, content_type="text/xml"):
+        reason = {200: "OK", 400: "Bad Request", 404: "Not Found", 500: "Internal Server Error",
+                  501: "Not Implemented"}.get(status, "Error")
+        head = (f"HTTP/1.1 {status} {reason}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+    async def _serve_frames(self, reader, writer):
+        """Serve frame RPC on one connection; pipelined calls run concurrently"""
+        self.connections += 1
+        pending = set()
+        try:
+            while True:
+                try:
+                    header = await reader.readexactly(HEADER.size)
+                    length, codec = HEADER.unpack(header)
+                    if length > MAX_FRAME_SIZE or codec not in CODECS:
+                        return
+                    payload = await reader.readexactly(length)
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    return
+                task = asyncio.ensure_future(self._frame_call(writer, codec, payload))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+        finally:
+            # A client may half-close after its last request and still read the answers
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+            self.connections -= 1
+            writer.close()
+
+    async def _frame_call(self, writer, codec, payload):
+        frame = await self._loop.run_in_executor(self.executor, self._frame_response, codec, payload)
+        try:
+            writer.write(frame)
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+    def _frame_response(self, codec, payload):
+        """Decode, dispatch and encode one frame request (runs on a worker)"""
+        request_id = None
+        try:
+            request = CODECS[codec][2](payload)
+            request_id = request.get("id")
+            response = {"id": request_id, "result": self._dispatch(request["method"], request.get("params") or [])}
+        except xmlrpc.client.Fault as fault:
+            response = {"id": request_id, "error": {"code": fault.faultCode, "message": fault.faultString}}
+        except Exception as e:
+            response = {"id": request_id, "error": {"code": 1, "message": f"{type(e)}:{e}"}}
+        try:
+            return encode_frame(codec, response)
+        except Exception as e:
+            return encode_frame(codec, {"id": request_id, "error": {"code": 1, "message": f"{type(e)}:{e}"}})
@@ -0,0 +1,161 @@
+"""
+Backend selection policies for the load balancer
+"""
+
+import math
+import random
+import time
+
+
+class BalancingPolicy:
+    """
+    Chooses the backend for each call.
+
+    The load balancer calls choose() with its lock held, so a policy needs no
+    locking of its own as long as it keeps its state in record(), which is
+    called with the same lock held after every backend call.
+
+    Backends may be weighted from the load they report: a backend of weight
+    w is treated as w times as able to take calls as one of weight 1.
+    """
+    name = None
+
+    def __init__(self):
+        self.weights = {}  # port -> weight, 1.0 when not set
+
+    def choose(self, ports, active_connections):
+        """
+        Pick a backend
+
+        Args:
+            ports (list): Ports of the backends not marked down (never empty)
+            active_connections (dict): port -> calls in flight
+
+        Returns:
+            int: The chosen port
+        """
+        raise NotImplementedError
+
+    def record(self, port, duration, failed=False):
+        """Account a finished call to a backend and how long it took in seconds"""
+
+    def set_weight(self, port, weight):
+        """Set a backend's weight"""
+        self.weights[port] = weight
+
+    def forget(self, port):
+        """Drop the state kept about a backend removed from the load balancer"""
+        self.weights.pop(port, None)
+
+    def _load(self, port, active_connections):
+        """Calls in flight to a backend, counting the next one, relative to its weight"""
+        return (active_connections.get(port, 0) + 1) / self.weights.get(port, 1.0)
+
+    def stats(self):
+        """Per-backend state worth reporting, keyed by port as a string"""
+        return {}
+
+
+class LeastConnectionsPolicy(BalancingPolicy):
+    """Backend with the fewest calls in flight for its weight, scanning all of them"""
+    name = "least_connections"
+
+    def choose(self, ports, active_connections):
+        return min(ports, key=lambda p: self._load(p, active_connections))
+
+
+class PowerOfTwoChoicesPolicy(BalancingPolicy):
+    """
+    The less busy of two backends sampled at random: O(1) per call, and
+    avoids the herd that least-connections sends to whichever backend just
+    freed a connection.
+    """
+    name = "p2c"
+
+    def __init__(self, rng=None):
+        super().__init__()
+        self._rng = rng or random.Random()
+
+    def _pick(self, ports, cost):
+        if len(ports) == 1:
+            return ports[0]
+        a, b = self._rng.sample(ports, 2)
+        return a if cost(a) <= cost(b) else b
+
+    def choose(self, ports, active_connections):
+        return self._pick(ports, lambda p: self._load(p, active_connections))
+
+
+class PeakEwmaPolicy(PowerOfTwoChoicesPolicy):
+    """
+    Power of two choices over expected latency: each backend's cost is a
+    moving average of its call durations times its calls in flight + 1,
+    divided by its weight.
+
+    The average is "peak" sensitive: a call slower than the average replaces
+    it outright, while faster calls pull it down gradually (decaying over
+    `decay` seconds), so a backend that stalls is avoided at once and earns
+    its traffic back as it recovers. A failure counts as a call of at least
+    `failure_penalty` seconds. Backends not measured yet cost nothing, so
+    they are tried.
+    """
+    name = "peak_ewma"
+
+    def __init__(self, decay=10.0, failure_penalty=1.0, rng=None, clock=time.monotonic):
+        """
+        Initialize the policy
+
+        Args:
+            decay (float): Seconds over which faster calls pull the average down
+            failure_penalty (float): Duration charged for a failed call
+            rng (random.Random): Source of the two random choices
+            clock (callable): Monotonic time source in seconds
+        """
+        super().__init__(rng)
+        self.decay = decay
+        self.failure_penalty = failure_penalty
+        self._clock = clock
+        self._ewma = {}  # port -> [average seconds, time of last update]
+
+    def _latency(self, port, now):
+        """Current average of a backend, decayed toward zero while it gets no calls"""
+        entry = self._ewma.get(port)
+        if entry is None:
+            return 0.0
+        average, updated = entry
+        return average * math.exp(-(now - updated) / self.decay)
+
+    def choose(self, ports, active_connections):
+        now = self._clock()
+        return self._pick(ports, lambda p: self._latency(p, now) * self._load(p, active_connections))
+
+    def record(self, port, duration, failed=False):
+        if failed:
+            duration = max(duration, self.failure_penalty)
+        now = self._clock()
+        entry = self._ewma.get(port)
+        if entry is None or duration > entry[0]:
+            self._ewma[port] = [duration, now]
+            return
+        weight = math.exp(-(now - entry[1]) / self.decay)
+        entry[0] = entry[0] * weight + duration * (1 - weight)
+        entry[1] = now
+
+    def forget(self, port):
+        super().forget(port)
+        self._ewma.pop(port, None)
+
+    def stats(self):
+        now = self._clock()
+        return {str(port): round(self._latency(port, now) * 1e3, 3) for port in self._ewma}
+
+
+POLICIES = {policy.name: policy for policy in (LeastConnectionsPolicy, PowerOfTwoChoicesPolicy, PeakEwmaPolicy)}
+
+
+def make_policy(name):
+    """Create the balancing policy registered under a name"""
+    try:
+        return POLICIES[name]()
+    except KeyError:
+        raise ValueError(f"Unknown balancing policy {name!r}, expected one of {sorted(POLICIES)}") from None
@@ -0,0 +1,142 @@
+"""
+Circuit breaker for one load balancer backend
+"""
+
+import time
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Closed / open / half-open breaker over a sliding window of call outcomes.
+
+    Closed, calls flow and their outcomes are counted per second over the
+    last `window` seconds; once at least `min_calls` were made and
+    `failure_rate` of them failed, the breaker opens. Open, the backend gets
+    no calls for `open_seconds`, then the breaker turns half-open and lets
+    up to `half_open_calls` calls through at a time. When that many have
+    succeeded it closes; any failure opens it again.
+
+    Only failures of the backend itself count (connection errors, timeouts);
+    the caller decides which outcomes those are. Not thread-safe: the caller
+    serializes access.
+    """
+    def __init__(self, window=10, min_calls=20, failure_rate=0.5, open_seconds=5,
+                 half_open_calls=3, clock=time.monotonic):
+        """
+        Initialize a closed breaker
+
+        Args:
+            window (int): Seconds of outcomes the error rate is computed over
+            min_calls (int): Calls in the window before the error rate counts
+            failure_rate (float): Share of failed calls that opens the breaker
+            open_seconds (float): Seconds an open breaker rejects calls
+            half_open_calls (int): Probe calls allowed, and needed to close, when half-open
+            clock (callable): Monotonic time source in seconds
+        """
+        self.window = int(window)
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self._clock = clock
+
+        self.state = CLOSED
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        self.times_opened = 0
+        self._reset_window()
+
+    def _reset_window(self):
+        self._calls = [0] * self.window
+        self._failures = [0] * self.window
+        self._epochs = [0] * self.window
+
+    def _bucket(self, now):
+        epoch = int(now)
+        index = epoch % self.window
+        if self._epochs[index] != epoch:
+            self._epochs[index] = epoch
+            self._calls[index] = 0
+            self._failures[index] = 0
+        return index
+
+    def _totals(self, now):
+        oldest = int(now) - self.window
+        calls = failures = 0
+        for index, epoch in enumerate(self._epochs):
+            if epoch > oldest:
+                calls += self._calls[index]
+                failures += self._failures[index]
+        return calls, failures
+
+    def available(self):
+        """Whether the backend may be sent a call now (turns an expired open breaker half-open)"""
+        if self.state == OPEN and self._clock() - self._opened_at >= self.open_seconds:
+            self.half_open()
+        if self.state == HALF_OPEN:
+            return self._probes_in_flight < self.half_open_calls
+        return self.state == CLOSED
+
+    def acquire(self):
+        """Account a call sent to the backend (takes a probe slot when half-open)"""
+        if self.state == HALF_OPEN:
+            self._probes_in_flight += 1
+
+    def record(self, ok):
+        """
+        Account the outcome of an acquired call
+
+        Args:
+            ok (bool): True if the backend answered, False if it failed,
+                       None to release the call without a verdict
+        """
+        if self.state == HALF_OPEN:
+            self._probes_in_flight = max(0, self._probes_in_flight - 1)
+            if ok is False:
+                self.trip()
+            elif ok:
+                self._probe_successes += 1
+                if self._probe_successes >= self.half_open_calls:
+                    self.state = CLOSED
+                    self._reset_window()
+            return
+        if ok is None or self.state != CLOSED:
+            return
+
+        now = self._clock()
+        index = self._bucket(now)
+        self._calls[index] += 1
+        if not ok:
+            self._failures[index] += 1
+            calls, failures = self._totals(now)
+            if calls >= self.min_calls and failures >= self.failure_rate * calls:
+                self.trip()
+
+    def trip(self):
+        """Open the breaker"""
+        if self.state != OPEN:
+            self.times_opened += 1
+        self.state = OPEN
+        self._opened_at = self._clock()
+        self._probes_in_flight = 0
+
+    def half_open(self):
+        """Let limited probe traffic through"""
+        self.state = HALF_OPEN
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+
+    def summary(self):
+        """State, window counts and how often the breaker opened"""
+        calls, failures = self._totals(self._clock())
+        return {
+            "state": self.state,
+            "calls": calls,
+            "failures": failures,
+            "times_opened": self.times_opened
+        }
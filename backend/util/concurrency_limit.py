@@ -0,0 +1,87 @@
+"""
+Adaptive concurrency limit for one load balancer backend
+"""
+
+import time
+
+
+class AdaptiveConcurrencyLimit:
+    """
+    AIMD limit on the calls in flight to a backend, driven by latency.
+
+    The backend's no-load latency is estimated as the smallest latency seen
+    in the previous `window` seconds. A call slower than `tolerance` times
+    that (plus `slack` seconds), or one that failed, means calls are queueing
+    at the backend: the limit is multiplied by `backoff`, counting only calls
+    sent after the last decrease, so the backlog that caused it does not
+    shrink the limit again. Otherwise, while the backend is used to at least
+    half its limit, the limit grows by one per limit's worth of calls. Not
+    thread-safe: the caller serializes access.
+    """
+    def __init__(self, initial=20, min_limit=2, max_limit=200, backoff=0.9, tolerance=2.0,
+                 slack=0.005, window=10, clock=time.monotonic):
+        """
+        Initialize the limit
+
+        Args:
+            initial (int): Starting limit
+            min_limit (int): Lowest the limit goes
+            max_limit (int): Highest the limit goes
+            backoff (float): Factor applied to the limit on a sign of queueing
+            tolerance (float): Latency, as a multiple of the no-load latency, that counts as queueing
+            slack (float): Seconds added to the queueing threshold, so jitter on fast calls is ignored
+            window (float): Seconds over which the no-load latency is measured
+            clock (callable): Monotonic time source in seconds
+        """
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.tolerance = tolerance
+        self.slack = slack
+        self.window = window
+        self._clock = clock
+        self._baseline = None  # no-load latency from the previous window
+        self._window_min = None
+        self._window_start = clock()
+        self._last_decrease = 0.0
+        self.decreases = 0
+
+    def record(self, latency, in_flight, failed=False):
+        """
+        Account a finished call
+
+        Args:
+            latency (float): Call duration in seconds
+            in_flight (int): Calls in flight to the backend when it was sent
+            failed (bool): Whether the backend failed to answer (e.g. timed out)
+        """
+        now = self._clock()
+        if not failed and (self._window_min is None or latency < self._window_min):
+            self._window_min = latency
+        if now - self._window_start >= self.window and self._window_min is not None:
+            self._baseline = self._window_min
+            self._window_min = None
+            self._window_start = now
+        baseline = self._baseline if self._baseline is not None else self._window_min
+
+        if failed or (baseline is not None and latency > self.tolerance * baseline + self.slack):
+            if now - latency >= self._last_decrease:
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+                self._last_decrease = now
+                self.decreases += 1
+        elif in_flight * 2 >= self.limit:
+            self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+
+    def admits(self, in_flight, share=1.0):
+        """Whether one more call fits under `share` of the limit"""
+        return in_flight < max(1.0, self.limit * share)
+
+    def summary(self):
+        """Current limit, no-load latency estimate and number of decreases"""
+        baseline = self._baseline if self._baseline is not None else self._window_min
+        return {
+            "limit": round(self.limit, 1),
+            "baseline_ms": None if baseline is None else round(baseline * 1e3, 3),
+            "decreases": self.decreases
+        }
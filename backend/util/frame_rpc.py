@@ -0,0 +1,340 @@
+"""
+Length-prefixed RPC over persistent TCP connections, as a lighter alternative
+to XML-RPC over one HTTP request per call.
+
+Every message is a frame: a 4-byte big-endian payload length, a 1-byte codec
+id, then the payload. Requests are {"id", "method", "params"}; responses are
+{"id", "result"} or {"id", "error": {"code", "message"}}. Request ids let a
+client pipeline many calls on one connection and the server answer them in
+whatever order they finish.
+"""
+
+import itertools
+import json
+import logging
+import socket
+import socketserver
+import struct
+import sys
+import os
+import threading
+import xmlrpc.client
+from concurrent.futures import Future, ThreadPoolExecutor
+from xmlrpc.server import SimpleXMLRPCDispatcher
+
+try:
+    import msgpack
+except ImportError:  # optional, only needed for RPC_CODEC = "msgpack"
+    msgpack = None
+
+# Add the parent directory to sys.path to allow relative imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+HEADER = struct.Struct(">IB")
+MAX_FRAME_SIZE = 64 * 1024 * 1024
+
+
+def _msgpack_dumps(obj):
+    return msgpack.packb(obj, use_bin_type=True)
+
+
+def _msgpack_loads(data):
+    return msgpack.unpackb(data, raw=False, strict_map_key=False)
+
+
+def _json_dumps(obj):
+    return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+
+# codec id -> (name, dumps, loads)
+CODECS = {
+    1: ("json", _json_dumps, json.loads),
+    2: ("msgpack", _msgpack_dumps, _msgpack_loads),
+}
+CODEC_IDS = {name: codec_id for codec_id, (name, _, _) in CODECS.items()}
+
+
+def codec_id(name):
+    """Get the wire id of a codec, checking that it can be used here"""
+    if name not in CODEC_IDS:
+        raise ValueError(f"Unknown RPC codec {name!r}, expected one of {sorted(CODEC_IDS)}")
+    if name == "msgpack" and msgpack is None:
+        raise ImportError("RPC codec 'msgpack' needs the msgpack package (pip install msgpack)")
+    return CODEC_IDS[name]
+
+
+def encode_frame(codec, message):
+    """Build one frame from a message"""
+    payload = CODECS[codec][1](message)
+    return HEADER.pack(len(payload), codec) + payload
+
+
+def read_frame(stream):
+    """
+    Read one frame from a buffered binary stream
+
+    Returns:
+        tuple: (codec id, decoded message), or None at end of stream
+    """
+    header = stream.read(HEADER.size)
+    if len(header) < HEADER.size:
+        return None
+    length, codec = HEADER.unpack(header)
+    if length > MAX_FRAME_SIZE or codec not in CODECS:
+        raise ValueError(f"Bad frame header (length={length}, codec={codec})")
+    payload = stream.read(length)
+    if len(payload) < length:
+        return None
+    return codec, CODECS[codec][2](payload)
+
+
+class _FrameRequestHandler(socketserver.StreamRequestHandler):
+    """Reads frames off one connection and hands each request to the worker pool"""
+
+    def handle(self):
+        if self.request.family != socket.AF_UNIX:
+            self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        write_lock = threading.Lock()
+        while True:
+            try:
+                frame = read_frame(self.rfile)
+            except (OSError, ValueError) as e:
+                logger.debug(f"Closing frame connection from {self.client_address}: {e}")
+                return
+            if frame is None:
+                return
+            self.server.executor.submit(self.server.process_request_frame, self.request, write_lock, *frame)
+
+
+class FrameRPCServer(socketserver.ThreadingTCPServer, SimpleXMLRPCDispatcher):
+    """
+    Frame transport server with the same registration API as SimpleXMLRPCServer
+    (register_instance, register_function, register_multicall_functions, ...).
+
+    Each connection gets a reader thread; requests run on a bounded worker
+    pool so pipelined calls from one connection execute concurrently.
+    """
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, addr, workers=32):
+        """
+        Initialize the server
+
+        Args:
+            addr (tuple): (host, port) to listen on
+            workers (int): Requests executed concurrently across all connections
+        """
+        SimpleXMLRPCDispatcher.__init__(self, allow_none=True, encoding=None)
+        socketserver.ThreadingTCPServer.__init__(self, addr, _FrameRequestHandler)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="frame-rpc")
+
+    def process_request_frame(self, sock, write_lock, codec, request):
+        """Run one request and write its response frame"""
+        request_id = request.get("id") if isinstance(request, dict) else None
+        try:
+            result = self._dispatch(request["method"], request.get("params") or [])
+            response = {"id": request_id, "result": result}
+        except xmlrpc.client.Fault as fault:
+            response = {"id": request_id, "error": {"code": fault.faultCode, "message": fault.faultString}}
+        except Exception as e:
+            # Same fault string as SimpleXMLRPCDispatcher, so callers see identical errors
+            response = {"id": request_id, "error": {"code": 1, "message": f"{type(e)}:{e}"}}
+
+        try:
+            frame = encode_frame(codec, response)
+        except Exception as e:
+            frame = encode_frame(codec, {"id": request_id, "error": {"code": 1, "message": f"{type(e)}:{e}"}})
+        try:
+            with write_lock:
+                sock.sendall(frame)
+        except OSError as e:
+            logger.debug(f"Could not send response {request_id}: {e}")
+
+    def server_close(self):
+        socketserver.ThreadingTCPServer.server_close(self)
+        self.executor.shutdown(wait=False)
+
+
+class UnixFrameRPCServer(FrameRPCServer):
+    """FrameRPCServer on a Unix domain socket, for calls between local processes"""
+    address_family = socket.AF_UNIX
+
+    def server_bind(self):
+        # A socket file left behind by a previous run would make bind fail
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+        socketserver.TCPServer.server_bind(self)
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+
+
+class _Method:
+    """Callable for a (possibly dotted) remote method name, like xmlrpc.client's"""
+
+    def __init__(self, call, name):
+        self._call = call
+        self._name = name
+
+    def __getattr__(self, name):
+        return _Method(self._call, f"{self._name}.{name}")
+
+    def __call__(self, *params):
+        return self._call(self._name, *params)
+
+
+class FrameRPCClient:
+    """
+    Thread-safe client for FrameRPCServer over one persistent connection.
+
+    Calls from any number of threads are pipelined on the connection and
+    matched to their responses by request id. Use it like a ServerProxy
+    (`client.book_cab(...)`, `xmlrpc.client.MultiCall(client)`); errors come
+    back as xmlrpc.client.Fault and broken connections as ConnectionError, so
+    callers handle both transports the same way.
+    """
+
+    def __init__(self, host, port, codec="json", timeout=None):
+        """
+        Initialize the client (the connection is opened on first use)
+
+        Args:
+            host (str): Server host, or a Unix socket path when port is None
+            port (int): Server frame port
+            codec (str): "json" or "msgpack"
+            timeout (float): Seconds to wait for a response, None for REQUEST_TIMEOUT
+        """
+        self._address = (host, port)
+        self._codec = codec_id(codec)
+        self._timeout = settings.REQUEST_TIMEOUT if timeout is None else timeout
+        self._ids = itertools.count(1)
+        self._pending = {}  # request id -> Future
+        self._lock = threading.Lock()
+        self._sock = None
+
+    def _connect(self):
+        """Open the connection and start its reader (caller holds the lock)"""
+        if self._address[1] is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self._timeout)
+            try:
+                sock.connect(self._address[0])
+            except OSError:
+                sock.close()
+                raise
+        else:
+            sock = socket.create_connection(self._address, timeout=self._timeout)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.settimeout(None)
+        self._sock = sock
+        threading.Thread(target=self._read_responses, args=(sock,), daemon=True,
+                         name=f"frame-rpc-reader-{self._address[1]}").start()
+
+    def _read_responses(self, sock):
+        """Deliver response frames to waiting calls until the connection ends"""
+        error = ConnectionError(f"Connection to {self._address[0]}:{self._address[1]} closed")
+        try:
+            with sock.makefile("rb") as stream:
+                while True:
+                    frame = read_frame(stream)
+                    if frame is None:
+                        break
+                    response = frame[1]
+                    future = self._pending.pop(response.get("id"), None)
+                    if future is None:
+                        continue
+                    if "error" in response:
+                        fault = response["error"]
+                        future.set_exception(xmlrpc.client.Fault(fault.get("code", 1), fault.get("message", "")))
+                    else:
+                        future.set_result(response.get("result"))
+        except (OSError, ValueError) as e:
+            error = ConnectionError(f"Connection to {self._address[0]}:{self._address[1]} failed: {e}")
+
+        with self._lock:
+            if self._sock is sock:
+                self._sock = None
+            pending, self._pending = self._pending, {}
+        for future in pending.values():
+            future.set_exception(error)
+        try:
+            sock.close()
+        except OSError:
+            pass
+
+    def call_async(self, method, *params):
+        """
+        Send a call without waiting for its response
+
+        Returns:
+            Future: Resolves to the result, or raises Fault / ConnectionError
+        """
+        future = Future()
+        request_id = next(self._ids)
+        frame = encode_frame(self._codec, {"id": request_id, "method": method, "params": list(params)})
+        with self._lock:
+            if self._sock is None:
+                self._connect()
+            self._pending[request_id] = future
+            try:
+                self._sock.sendall(frame)
+            except OSError as e:
+                self._pending.pop(request_id, None)
+                self._sock.close()
+                self._sock = None
+                raise ConnectionError(f"Send to {self._address[0]}:{self._address[1]} failed: {e}") from e
+        future.request_id = request_id
+        return future
+
+    def call(self, method, *params):
+        """Call a remote method and wait for its result"""
+        return self.result(self.call_async(method, *params), method)
+
+    def result(self, future, method):
+        """Wait for the result of a call_async call, up to the client's timeout"""
+        try:
+            return future.result(self._timeout)
+        except TimeoutError:
+            self._pending.pop(future.request_id, None)
+            raise TimeoutError(f"{method} timed out after {self._timeout}s") from None
+
+    def cancel(self, future):
+        """Stop waiting for a call_async call: it fails with a connection error and its response is ignored"""
+        if self._pending.pop(future.request_id, None) is not None:
+            future.set_exception(ConnectionAbortedError("Call aborted"))
+
+    def close(self):
+        """Close the connection; pending calls fail with ConnectionError"""
+        with self._lock:
+            sock, self._sock = self._sock, None
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            sock.close()
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return _Method(self.call, name)
+
+
+def rpc_proxy(host, port):
+    """
+    Get a client for an RPC server using the transport chosen in settings
+
+    With RPC_TRANSPORT = "frame" this is a FrameRPCClient on the server's
+    frame port (port + FRAME_PORT_OFFSET); otherwise an XML-RPC ServerProxy.
+    Both are called the same way.
+    """
+    if settings.RPC_TRANSPORT == "frame":
+        return FrameRPCClient(host, port + settings.FRAME_PORT_OFFSET, settings.RPC_CODEC)
+    return xmlrpc.client.ServerProxy(f"http://{host}:{port}{settings.RPC_PATH}", allow_none=True)
@@ -0,0 +1,70 @@
+"""
+Failure detection for load balancer backends
+"""
+
+
+class FailureDetector:
+    """
+    Consecutive-failure detector over active probes and passive call results.
+
+    A backend is marked 'down' after `eject_after` failures in a row and
+    'up' again after `readmit_after` successes in a row, so one lost probe
+    does not eject a healthy backend and one good ping does not readmit a
+    flapping one. A backend starts 'unknown' and is 'up' after its first
+    success. Not thread-safe: the caller serializes access.
+    """
+    def __init__(self, eject_after=3, readmit_after=2):
+        """
+        Initialize the detector
+
+        Args:
+            eject_after (int): Consecutive failures that mark a backend down
+            readmit_after (int): Consecutive successes that mark a down backend up
+        """
+        self.eject_after = eject_after
+        self.readmit_after = readmit_after
+        self._status = {}  # port -> 'unknown', 'up' or 'down'
+        self._failures = {}  # port -> consecutive failures
+        self._successes = {}  # port -> consecutive successes
+
+    def status(self, port):
+        """Current status of a backend"""
+        return self._status.get(port, 'unknown')
+
+    def record(self, port, ok):
+        """
+        Account a probe or call result
+
+        Args:
+            port (int): Backend port
+            ok (bool): Whether the probe or call succeeded
+
+        Returns:
+            str: The backend's status afterwards
+        """
+        status = self.status(port)
+        if ok:
+            self._failures[port] = 0
+            successes = self._successes[port] = self._successes.get(port, 0) + 1
+            if status == 'unknown' or (status == 'down' and successes >= self.readmit_after):
+                status = 'up'
+        else:
+            self._successes[port] = 0
+            failures = self._failures[port] = self._failures.get(port, 0) + 1
+            if failures >= self.eject_after:
+                status = 'down'
+        self._status[port] = status
+        return status
+
+    def forget(self, port):
+        """Drop the state kept about a backend"""
+        for table in (self._status, self._failures, self._successes):
+            table.pop(port, None)
+
+    def summary(self, port):
+        """Status and current streaks of a backend"""
+        return {
+            "status": self.status(port),
+            "consecutive_failures": self._failures.get(port, 0),
+            "consecutive_successes": self._successes.get(port, 0)
+        }
@@ -0,0 +1,192 @@
+"""
+Hedge delay estimation and racing of hedged requests
+"""
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+import xmlrpc.client
+
+from util.metrics import LatencyHistogram
+
+logger = logging.getLogger(__name__)
+
+
+class HedgeAborted(Exception):
+    """The primary copy of a hedged call was abandoned: the hedged copy answered first"""
+
+
+class HedgeDelay:
+    """
+    How long to wait for a call before sending a second copy: a recent
+    percentile (p95 by default) of the call's latency.
+
+    Latencies go into a histogram that is replaced every `window` seconds,
+    so the estimate follows the backends as they speed up or slow down. The
+    percentile is recomputed at most once a second and only from at least
+    `min_samples` samples; until then there is no estimate and no hedging.
+    """
+    def __init__(self, percentile=95, window=30, min_samples=100, floor=0.002, clock=time.monotonic):
+        """
+        Initialize the estimator
+
+        Args:
+            percentile (float): Latency percentile used as the delay
+            window (float): Seconds of samples the percentile is computed over
+            min_samples (int): Samples needed before there is an estimate
+            floor (float): Smallest delay in seconds, so fast calls are not all hedged
+            clock (callable): Monotonic time source in seconds
+        """
+        self.percentile = percentile
+        self.window = window
+        self.min_samples = min_samples
+        self.floor = floor
+        self._clock = clock
+        self._histogram = LatencyHistogram()
+        self._started = clock()
+        self._refresh_at = 0.0
+        self._delay = None
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        """Record the latency of a call"""
+        self._histogram.record(seconds)
+
+    def delay(self):
+        """Current hedge delay in seconds, or None while there is no estimate"""
+        now = self._clock()
+        if now >= self._refresh_at and self._lock.acquire(blocking=False):
+            try:
+                histogram = self._histogram
+                if histogram.count >= self.min_samples:
+                    self._delay = max(self.floor, histogram.percentile(self.percentile))
+                if now - self._started >= self.window:
+                    self._histogram = LatencyHistogram()
+                    self._started = now
+                self._refresh_at = now + 1.0
+            finally:
+                self._lock.release()
+        return self._delay
+
+
+class HedgeRace:
+    """
+    One hedged call. The primary copy runs in the caller's thread; the
+    hedged copy, if one is sent, in another. The first successful answer
+    wins: when it is the hedged copy's, the primary's wait on its connection
+    is aborted and the caller returns the copy's answer at once. The aborted
+    call still finishes on its backend, its answer ignored.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._abort = None  # breaks off the primary's wait, while it waits
+        self.finished = False  # the primary returned or failed; no copy is sent after that
+        self.won = False  # the hedged copy answered first
+        self.result = None  # the hedged copy's answer if it won
+        self.copy = None  # Future of the hedged copy, once sent
+
+    def call(self, server, method, params):
+        """
+        Make the primary call on a backend connection, abortable by win()
+
+        Args:
+            server: ServerProxy with a TimeoutTransport, or FrameRPCClient
+            method (str): Method name
+            params (list): Call parameters
+
+        Raises:
+            HedgeAborted: The hedged copy answered first
+        """
+        transport = None
+        if isinstance(server, xmlrpc.client.ServerProxy):
+            transport = server("transport")
+            self._watch(transport.abort)
+            wait = lambda: getattr(server, method)(*params)
+        else:
+            future = server.call_async(method, *params)
+            self._watch(lambda: server.cancel(future))
+            wait = lambda: server.result(future, method)
+        try:
+            return wait()
+        except Exception:
+            if self.won:
+                raise HedgeAborted() from None
+            raise
+        finally:
+            with self._lock:
+                self._abort = None
+            if transport is not None:
+                transport.aborted = False
+
+    def _watch(self, abort):
+        with self._lock:
+            if not self.won:
+                self._abort = abort
+                return
+        abort()
+
+    def send_copy(self, send):
+        """Send the hedged copy with `send()`, returning a Future, unless the primary already finished"""
+        with self._lock:
+            if not self.finished:
+                self.copy = send()
+
+    def win(self, result):
+        """
+        Offer the hedged copy's answer
+
+        Returns:
+            bool: True if it came before the primary's, which is aborted
+        """
+        with self._lock:
+            if self.finished:
+                return False
+            self.won = True
+            self.result = result
+            # Under the lock, so an abort cannot land once call() has returned
+            if self._abort is not None:
+                self._abort()
+        return True
+
+    def finish(self):
+        """Mark the primary finished; returns the hedged copy's Future, or None if none was sent"""
+        with self._lock:
+            self.finished = True
+            return self.copy
+
+
+class HedgeTimer:
+    """
+    One thread running callbacks after their delay, so a primary call can
+    run in its caller's thread while its hedged copy waits to be sent.
+    """
+    def __init__(self, name="hedge-timer", clock=time.monotonic):
+        self._heap = []  # (due, sequence, callback)
+        self._sequence = itertools.count()
+        self._cond = threading.Condition()
+        self._clock = clock
+        threading.Thread(target=self._run, name=name, daemon=True).start()
+
+    def schedule(self, delay, callback):
+        """Call `callback()` in the timer's thread after `delay` seconds"""
+        entry = (self._clock() + delay, next(self._sequence), callback)
+        with self._cond:
+            heapq.heappush(self._heap, entry)
+            if self._heap[0] is entry:
+                self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    wait = self._heap[0][0] - self._clock() if self._heap else None
+                    if wait is not None and wait <= 0:
+                        break
+                    self._cond.wait(wait)
+                _, _, callback = heapq.heappop(self._heap)
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"Error in hedge timer callback: {e}")
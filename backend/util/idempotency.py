@@ -0,0 +1,153 @@
+"""
+Bounded TTL cache of responses by idempotency key, for safely retried writes
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+# Fault code of a call reusing a key with different parameters (HTTP 422 Unprocessable Entity)
+KEY_REUSED_STATUS = 422
+
+
+class KeyReusedError(Exception):
+    """An idempotency key was sent again with parameters other than its first call's"""
+
+
+class _Pending:
+    """A call running under a key; duplicates arriving meanwhile wait for it"""
+
+    def __init__(self, fingerprint):
+        self.done = threading.Event()
+        self.fingerprint = fingerprint
+        self.response = None
+        self.stored = False
+
+
+class IdempotencyCache:
+    """
+    Maps idempotency keys to the response of the first call made with them.
+
+    A retried call with a key that already completed gets the stored
+    response instead of running again; one arriving while the first is still
+    running waits for it. Calls that raise, or whose response is not
+    `cacheable`, are not stored, so they may be retried. Entries expire after `ttl` seconds, and the oldest are evicted
+    beyond `max_entries`.
+
+    Each key remembers a fingerprint of its call's parameters; a call
+    reusing the key with another fingerprint raises KeyReusedError rather
+    than being handed a response to a different request.
+    """
+
+    def __init__(self, ttl=86400, max_entries=100000, wait_timeout=None, clock=time.monotonic):
+        """
+        Initialize an empty cache
+
+        Args:
+            ttl (float): Seconds a response is kept
+            max_entries (int): Maximum number of stored responses
+            wait_timeout (float): Seconds a duplicate waits for the call it
+                repeats before giving up, None to wait indefinitely
+            clock (callable): Time source in seconds
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.wait_timeout = wait_timeout
+        self._clock = clock
+        self._entries = OrderedDict()  # key -> (expires_at, response, fingerprint), oldest first
+        self._pending = {}  # key -> _Pending
+        self._lock = threading.Lock()
+        self.hits = 0
+
+    def _get(self, key, now):
+        """Stored (response, fingerprint) for a key, or None (caller holds the lock)"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= now:
+            del self._entries[key]
+            return None
+        return entry[1:]
+
+    def _put(self, key, response, fingerprint, now):
+        """Store a response (caller holds the lock)"""
+        self._entries.pop(key, None)
+        self._entries[key] = (now + self.ttl, response, fingerprint)
+        # Entries are in insertion order with one TTL, so the oldest expire first
+        while self._entries:
+            oldest_key, (expires_at, _, _) = next(iter(self._entries.items()))
+            if expires_at > now and len(self._entries) <= self.max_entries:
+                break
+            del self._entries[oldest_key]
+
+    def get(self, key):
+        """Get the stored response for a key, or None"""
+        with self._lock:
+            entry = self._get(key, self._clock())
+            return None if entry is None else entry[0]
+
+    def store(self, key, response, fingerprint=None):
+        """Store a response under a key (e.g. one replicated from a peer)"""
+        with self._lock:
+            self._put(key, response, fingerprint, self._clock())
+
+    @staticmethod
+    def _check(key, fingerprint, stored_fingerprint):
+        if fingerprint != stored_fingerprint:
+            raise KeyReusedError(f"Idempotency key {key} was used for a different request")
+
+    def run(self, key, func, cacheable=None, fingerprint=None):
+        """
+        Run func once per key
+
+        Args:
+            key (str): Idempotency key
+            func (callable): The call, taking no arguments
+            cacheable (callable): Predicate on a response; responses it rejects
+                are returned but not stored
+            fingerprint (str): Digest of the call's parameters
+
+        Returns:
+            tuple: (response, replayed) where replayed is True if the response
+                   came from an earlier call with the same key
+
+        Raises:
+            KeyReusedError: The key was first used with another fingerprint
+        """
+        while True:
+            with self._lock:
+                entry = self._get(key, self._clock())
+                if entry is not None:
+                    response, stored_fingerprint = entry
+                    self._check(key, fingerprint, stored_fingerprint)
+                    self.hits += 1
+                    return response, True
+                pending = self._pending.get(key)
+                if pending is None:
+                    pending = self._pending[key] = _Pending(fingerprint)
+                    break
+                self._check(key, fingerprint, pending.fingerprint)
+            # Another call with this key is running: wait and take its response
+            if not pending.done.wait(self.wait_timeout):
+                raise TimeoutError(f"A call with idempotency key {key} is still in progress")
+            if pending.stored:
+                with self._lock:
+                    self.hits += 1
+                return pending.response, True
+            # It failed or is not cached: run again
+
+        try:
+            response = func()
+            if cacheable is None or cacheable(response):
+                pending.response = response
+                pending.stored = True
+                with self._lock:
+                    self._put(key, response, fingerprint, self._clock())
+            return response, False
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+            pending.done.set()
+
+    def __len__(self):
+        return len(self._entries)
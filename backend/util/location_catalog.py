@@ -0,0 +1,169 @@
+"""
+Location catalog with name normalization and a sorted prefix index
+"""
+
+import bisect
+import re
+import threading
+import unicodedata
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def display_location(name):
+    """Clean up a free-form location name for display (whitespace only, case kept)"""
+    if name is None:
+        return ""
+    name = unicodedata.normalize("NFKC", str(name))
+    return _WHITESPACE_RE.sub(" ", name).strip()
+
+
+def normalize_location(name):
+    """
+    Normalize a free-form location name into its catalog key
+
+    "Andheri", "andheri " and " ANDHERI" all map to the same key, while
+    "Andheri East" stays a distinct place that shares the "andheri" prefix.
+    """
+    return display_location(name).casefold()
+
+
+class LocationCatalog:
+    """
+    Interns location names as compact integer ids.
+
+    Every distinct normalized name gets one id; the first spelling seen is kept
+    as the display name. A sorted list of keys serves as the prefix index for
+    autocomplete. New keys are appended to a pending list and merged into the
+    index lazily, so bulk loads cost one sort instead of one insort per name.
+    """
+    def __init__(self):
+        self._ids = {}  # key -> id
+        self._names = {}  # id -> display name
+        self._keys = {}  # id -> key
+        self._next_id = 1
+        self._sorted_keys = []
+        self._pending_keys = []
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._ids)
+
+    def _add(self, key, name, location_id=None):
+        """Add a key to the catalog (caller holds the lock)"""
+        if location_id is None:
+            location_id = self._next_id
+        self._next_id = max(self._next_id, location_id + 1)
+        self._ids[key] = location_id
+        self._names[location_id] = name
+        self._keys[location_id] = key
+        self._pending_keys.append(key)
+        return location_id
+
+    def intern(self, name):
+        """
+        Get the id for a location, adding it to the catalog if needed
+
+        Args:
+            name (str): Free-form location name
+
+        Returns:
+            int or None: Location id, or None for an empty name
+        """
+        key = normalize_location(name)
+        if not key:
+            return None
+
+        location_id = self._ids.get(key)
+        if location_id is not None:
+            return location_id
+
+        with self._lock:
+            location_id = self._ids.get(key)
+            if location_id is None:
+                location_id = self._add(key, display_location(name))
+            return location_id
+
+    def add_many(self, names):
+        """
+        Intern many locations at once
+
+        Args:
+            names (iterable): Free-form location names
+
+        Returns:
+            list: Location ids in the same order as the names
+        """
+        with self._lock:
+            return [self.intern(name) for name in names]
+
+    def register(self, location_id, name):
+        """
+        Add a location under an id assigned elsewhere (e.g. loaded from MongoDB)
+
+        Args:
+            location_id (int): Persisted id of the location
+            name (str): Display name of the location
+        """
+        key = normalize_location(name)
+        if not key:
+            return
+        with self._lock:
+            if key not in self._ids:
+                self._add(key, display_location(name), int(location_id))
+
+    def lookup(self, name):
+        """
+        Get the id for a location without adding it
+
+        Returns:
+            int or None: Location id, or None if the location is unknown
+        """
+        return self._ids.get(normalize_location(name))
+
+    def get_name(self, location_id):
+        """Get the display name for a location id"""
+        return self._names.get(location_id)
+
+    def canonical_name(self, name):
+        """Get the catalog display name for a free-form location name"""
+        location_id = self.lookup(name)
+        if location_id is None:
+            return display_location(name)
+        return self._names[location_id]
+
+    def _flush_pending(self):
+        """Merge newly added keys into the sorted prefix index"""
+        if self._pending_keys:
+            self._sorted_keys.extend(self._pending_keys)
+            self._sorted_keys.sort()
+            self._pending_keys = []
+
+    def autocomplete(self, prefix, limit=10):
+        """
+        Find locations whose normalized name starts with a prefix
+
+        Args:
+            prefix (str): Prefix typed by the user
+            limit (int): Maximum number of suggestions
+
+        Returns:
+            list: Dicts with 'id' and 'name', in alphabetical order
+        """
+        key = normalize_location(prefix)
+        if not key or limit <= 0:
+            return []
+
+        with self._lock:
+            self._flush_pending()
+            sorted_keys = self._sorted_keys
+            results = []
+            index = bisect.bisect_left(sorted_keys, key)
+            while index < len(sorted_keys) and len(results) < limit:
+                candidate = sorted_keys[index]
+                if not candidate.startswith(key):
+                    break
+                location_id = self._ids[candidate]
+                results.append({"id": location_id, "name": self._names[location_id]})
+                index += 1
+            return results
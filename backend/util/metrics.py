@@ -0,0 +1,318 @@
+"""
+Low-overhead latency histograms and lock instrumentation for the RPC servers,
+and per-backend / per-method traffic metrics for the load balancer
+"""
+
+import threading
+import time
+
+
+class LatencyHistogram:
+    """
+    HDR-style latency histogram.
+
+    Values are recorded in microseconds into log-linear buckets: every power
+    of two is split into the same number of linear sub-buckets, so each
+    bucket is within about 1.6% of the values it holds at any magnitude.
+    Recording is a bit_length and a list increment; percentiles are read by
+    walking the (small, fixed) bucket array.
+    """
+    SUB_BUCKET_BITS = 7  # 128 sub-buckets, 64 per power of two above the first
+
+    def __init__(self, max_seconds=60.0):
+        """
+        Initialize an empty histogram
+
+        Args:
+            max_seconds (float): Largest value tracked exactly; larger ones are clamped
+        """
+        self._sub_count = 1 << self.SUB_BUCKET_BITS
+        self._half_count = self._sub_count >> 1
+        self._max_value = int(max_seconds * 1e6)
+        self._counts = [0] * (self._index(self._max_value) + 1)
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def _index(self, value):
+        """Bucket index of a value in microseconds"""
+        if value < self._sub_count:
+            return value
+        shift = value.bit_length() - self.SUB_BUCKET_BITS
+        return self._sub_count + (shift - 1) * self._half_count + (value >> shift) - self._half_count
+
+    def _highest_value(self, index):
+        """Largest value (in microseconds) that falls into a bucket"""
+        if index < self._sub_count:
+            return index
+        shift, offset = divmod(index - self._sub_count, self._half_count)
+        shift += 1
+        return ((offset + self._half_count + 1) << shift) - 1
+
+    def record(self, seconds):
+        """Record one latency sample given in seconds"""
+        value = int(seconds * 1e6)
+        if value < self._sub_count:
+            index = value if value > 0 else 0
+        else:
+            if value > self._max_value:
+                value = self._max_value
+            shift = value.bit_length() - self.SUB_BUCKET_BITS
+            index = self._sub_count + (shift - 1) * self._half_count + (value >> shift) - self._half_count
+        with self._lock:
+            self._counts[index] += 1
+            self.count += 1
+            self.total += value
+            if value > self.max:
+                self.max = value
+
+    def percentile(self, pct):
+        """
+        Get the value at a percentile
+
+        Args:
+            pct (float): Percentile between 0 and 100
+
+        Returns:
+            float: Latency in seconds, 0.0 if nothing was recorded
+        """
+        with self._lock:
+            if not self.count:
+                return 0.0
+            target = max(1, int(round(self.count * pct / 100.0)))
+            seen = 0
+            for index, bucket_count in enumerate(self._counts):
+                seen += bucket_count
+                if seen >= target:
+                    return min(self._highest_value(index), self.max) / 1e6
+            return self.max / 1e6
+
+    def summary(self):
+        """Get count, mean, min, max and common percentiles in milliseconds"""
+        if not self.count:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count / 1e3, 3),
+            "min_ms": round(self.percentile(0) * 1e3, 3),
+            "p50_ms": round(self.percentile(50) * 1e3, 3),
+            "p90_ms": round(self.percentile(90) * 1e3, 3),
+            "p99_ms": round(self.percentile(99) * 1e3, 3),
+            "p999_ms": round(self.percentile(99.9) * 1e3, 3),
+            "max_ms": round(self.max / 1e3, 3)
+        }
+
+
+class InstrumentedLock:
+    """
+    Re-entrant lock that records how long callers wait for it and hold it.
+
+    Only the outermost acquisition of a thread is measured, so nested
+    `with` blocks on the same lock are not double counted. The depth and
+    acquisition time are only touched by the owning thread while it holds
+    the lock, so they need no extra synchronization.
+    """
+    def __init__(self, wait_histogram, hold_histogram):
+        self._lock = threading.RLock()
+        self._wait = wait_histogram
+        self._hold = hold_histogram
+        self._depth = 0
+        self._acquired_at = 0.0
+
+    def acquire(self, blocking=True, timeout=-1):
+        start = time.perf_counter()
+        if not self._lock.acquire(blocking, timeout):
+            return False
+        self._depth += 1
+        if self._depth == 1:
+            self._acquired_at = time.perf_counter()
+            self._wait.record(self._acquired_at - start)
+        return True
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0:
+            self._hold.record(time.perf_counter() - self._acquired_at)
+        self._lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+
+class ServiceMetrics:
+    """
+    Per-RPC latency, service lock wait/hold time and per-peer replication
+    time for one server process.
+    """
+    def __init__(self, enabled=True):
+        """
+        Initialize the metrics
+
+        Args:
+            enabled (bool): Whether anything is recorded at all
+        """
+        self.enabled = enabled
+        self.started = time.time()
+        self.rpc = {}  # method -> LatencyHistogram
+        self.replication = {}  # peer -> LatencyHistogram
+        self.lock_wait = LatencyHistogram()
+        self.lock_hold = LatencyHistogram()
+        self.pool = None  # server with pool_stats() when it runs a bounded worker pool
+        self._lock = threading.Lock()
+
+    def _histogram(self, table, key):
+        """Get or create the histogram for a key"""
+        histogram = table.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = table.setdefault(key, LatencyHistogram())
+        return histogram
+
+    def new_lock(self):
+        """Create the service lock, instrumented only when metrics are enabled"""
+        if not self.enabled:
+            return threading.RLock()
+        return InstrumentedLock(self.lock_wait, self.lock_hold)
+
+    def record_rpc(self, method, seconds):
+        """Record the latency of one RPC"""
+        if self.enabled:
+            self._histogram(self.rpc, method).record(seconds)
+
+    def record_replication(self, peer, seconds):
+        """Record the time one peer took to acknowledge a replicated operation"""
+        if self.enabled:
+            self._histogram(self.replication, str(peer)).record(seconds)
+
+    def summary(self):
+        """Get every histogram summarized, keyed for XML-RPC (string keys)"""
+        return {
+            "enabled": self.enabled,
+            "uptime": round(time.time() - self.started, 1),
+            "rpc": {method: h.summary() for method, h in list(self.rpc.items())},
+            "lock": {
+                "wait": self.lock_wait.summary(),
+                "hold": self.lock_hold.summary()
+            },
+            "replication": {peer: h.summary() for peer, h in list(self.replication.items())},
+            "pool": self.pool.pool_stats() if self.pool is not None else None
+        }
+
+
+class _Traffic:
+    """Calls, errors by kind, recent call rate and latency of one backend or method"""
+
+    def __init__(self, window):
+        self.calls = 0
+        self.errors = {}  # kind -> count
+        self.latency = LatencyHistogram()
+        self._window = window
+        self._buckets = [0] * window  # calls per second, a ring indexed by epoch second
+        self._epochs = [0] * window
+
+    def record(self, seconds, error, now):
+        """Account one call (caller holds the TrafficMetrics lock, except for the histogram)"""
+        self.calls += 1
+        if error is not None:
+            self.errors[error] = self.errors.get(error, 0) + 1
+        epoch = int(now)
+        index = epoch % self._window
+        if self._epochs[index] != epoch:
+            self._epochs[index] = epoch
+            self._buckets[index] = 0
+        self._buckets[index] += 1
+
+    def rate(self, now):
+        """Calls per second over the last `window` whole seconds"""
+        current = int(now)
+        recent = sum(count for count, epoch in zip(self._buckets, self._epochs)
+                     if current - self._window <= epoch < current)
+        return recent / self._window
+
+
+class TrafficMetrics:
+    """
+    Call counts, error counts by kind, recent call rates and latency
+    histograms keyed by a label value, such as a backend port or a method.
+    """
+    def __init__(self, label, window=10, clock=time.monotonic):
+        """
+        Initialize empty metrics
+
+        Args:
+            label (str): Name of what the metrics are keyed by, used as the Prometheus label
+            window (int): Seconds over which call rates are averaged
+            clock (callable): Monotonic time source in seconds
+        """
+        self.label = label
+        self.window = int(window)
+        self._clock = clock
+        self._traffic = {}  # key -> _Traffic
+        self._lock = threading.Lock()
+
+    def record(self, key, seconds, error=None):
+        """
+        Record one call
+
+        Args:
+            key (str): Backend, method, ... the call is counted under
+            seconds (float): Latency
+            error (str): Kind of error the call ended in, None if it succeeded
+        """
+        with self._lock:
+            traffic = self._traffic.get(key)
+            if traffic is None:
+                traffic = self._traffic[key] = _Traffic(self.window)
+            traffic.record(seconds, error, self._clock())
+        traffic.latency.record(seconds)
+
+    def summary(self):
+        """Per-key calls, rate, errors and latency summary, keyed for XML-RPC (string keys)"""
+        now = self._clock()
+        with self._lock:
+            items = [(key, traffic, traffic.calls, dict(traffic.errors), traffic.rate(now))
+                     for key, traffic in self._traffic.items()]
+        return {
+            str(key): {
+                "calls": calls,
+                "rate": round(rate, 2),
+                "errors": errors,
+                "latency": traffic.latency.summary()
+            }
+            for key, traffic, calls, errors, rate in items
+        }
+
+    def prometheus(self, prefix):
+        """
+        Render as Prometheus text exposition lines
+
+        Args:
+            prefix (str): Metric name prefix, e.g. "lb_backend"
+
+        Returns:
+            list: Lines of {prefix}_requests_total, {prefix}_errors_total and
+                  the {prefix}_latency_seconds summary
+        """
+        with self._lock:
+            items = [(str(key), traffic, traffic.calls, dict(traffic.errors)) for key, traffic in self._traffic.items()]
+        label = self.label
+        lines = [f"# TYPE {prefix}_requests_total counter"]
+        lines += [f'{prefix}_requests_total{{{label}="{key}"}} {calls}' for key, _, calls, _ in items]
+        lines.append(f"# TYPE {prefix}_errors_total counter")
+        for key, _, _, errors in items:
+            lines += [f'{prefix}_errors_total{{{label}="{key}",kind="{kind}"}} {count}'
+                      for kind, count in sorted(errors.items())]
+        lines.append(f"# TYPE {prefix}_latency_seconds summary")
+        for key, traffic, _, _ in items:
+            histogram = traffic.latency
+            for quantile in (0.5, 0.9, 0.99, 0.999):
+                lines.append(f'{prefix}_latency_seconds{{{label}="{key}",quantile="{quantile}"}} '
+                             f'{histogram.percentile(quantile * 100):.6f}')
+            lines.append(f'{prefix}_latency_seconds_sum{{{label}="{key}"}} {histogram.total / 1e6:.6f}')
+            lines.append(f'{prefix}_latency_seconds_count{{{label}="{key}"}} {histogram.count}')
+        return lines
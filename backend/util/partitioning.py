@@ -0,0 +1,17 @@
+"""
+Key-to-partition mapping shared by the multi-process cab server's workers
+"""
+
+import zlib
+
+from util.location_catalog import normalize_location
+
+
+def partition_of(key, count):
+    """Partition that owns a key (ride id, username)"""
+    return zlib.crc32(str(key).encode("utf-8")) % count
+
+
+def zone_partition(location, count):
+    """Partition that owns a zone; spellings of the same place map to the same partition"""
+    return partition_of(normalize_location(location or ""), count)
@@ -0,0 +1,146 @@
+"""
+Short-TTL LRU cache of read responses with request coalescing, for the load balancer
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class _Flight:
+    """A backend call answering a miss; identical calls arriving meanwhile wait for it"""
+
+    def __init__(self, generation):
+        self.done = threading.Event()
+        self.generation = generation  # the method's generation when the call was sent
+        self.stale = False  # set when a write invalidated the key while the call ran
+        self.response = None
+        self.error = None
+
+
+class ResponseCache:
+    """
+    Maps (method, arguments) to a recent response of that read.
+
+    Entries expire after the TTL given when they were stored, and the least
+    recently used are evicted beyond `max_entries`. Only one backend call is
+    made per key at a time: identical calls arriving while it runs wait for
+    its response, or its error, instead of calling again (singleflight).
+
+    A write invalidates either one key or every entry of a method; the latter
+    bumps the method's generation, so old entries die lazily. A call that was
+    in flight when its key was invalidated is not stored, since its answer
+    may predate the write.
+    """
+
+    def __init__(self, max_entries=10000, clock=time.monotonic):
+        """
+        Initialize an empty cache
+
+        Args:
+            max_entries (int): Maximum number of stored responses
+            clock (callable): Monotonic time source in seconds
+        """
+        self.max_entries = max_entries
+        self._clock = clock
+        self._entries = OrderedDict()  # key -> (expires_at, generation, response), least recently used first
+        self._generations = {}  # method -> number of times all its entries were invalidated
+        self._flights = {}  # key -> _Flight
+        self._counts = {}  # method -> {"hits", "misses", "coalesced"}
+        self._lock = threading.Lock()
+
+    def get_or_call(self, method, args, ttl, func):
+        """
+        Get a cached response, or make the call once for every caller waiting on it
+
+        Args:
+            method (str): Method name
+            args (hashable): The arguments that determine the response
+            ttl (float): Seconds the response is reused
+            func (callable): The backend call, taking no arguments
+
+        Returns:
+            The response
+        """
+        key = (method, args)
+        with self._lock:
+            counts = self._counts.setdefault(method, {"hits": 0, "misses": 0, "coalesced": 0})
+            generation = self._generations.get(method, 0)
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > self._clock() and entry[1] == generation:
+                    self._entries.move_to_end(key)
+                    counts["hits"] += 1
+                    return entry[2]
+                del self._entries[key]
+
+            flight = self._flights.get(key)
+            if flight is not None:
+                counts["coalesced"] += 1
+                leader = False
+            else:
+                flight = self._flights[key] = _Flight(generation)
+                counts["misses"] += 1
+                leader = True
+
+        if leader:
+            return self._lead(key, flight, ttl, func)
+        return self._follow(flight)
+
+    def _follow(self, flight):
+        """Wait for another caller's backend call and share its outcome"""
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.response
+
+    def _lead(self, key, flight, ttl, func):
+        """Make the backend call for a miss and store its response unless invalidated meanwhile"""
+        try:
+            flight.response = func()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+                if (flight.error is None and not flight.stale
+                        and flight.generation == self._generations.get(key[0], 0)):
+                    self._entries[key] = (self._clock() + ttl, flight.generation, flight.response)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+            flight.done.set()
+        return flight.response
+
+    def invalidate(self, method, args=None):
+        """
+        Drop cached responses of a method
+
+        Args:
+            method (str): Method name
+            args (hashable): Arguments of the one entry to drop, None for all entries of the method
+        """
+        with self._lock:
+            if args is None:
+                self._generations[method] = self._generations.get(method, 0) + 1
+                return
+            key = (method, args)
+            self._entries.pop(key, None)
+            flight = self._flights.get(key)
+            if flight is not None:
+                flight.stale = True
+
+    def summary(self):
+        """Per-method hits, misses, coalesced calls and hit ratio (share answered without a backend call of their own)"""
+        with self._lock:
+            summary = {"entries": len(self._entries), "methods": {}}
+            for method, counts in self._counts.items():
+                total = sum(counts.values())
+                summary["methods"][method] = dict(
+                    counts,
+                    hit_ratio=round((counts["hits"] + counts["coalesced"]) / total, 4) if total else None
+                )
+        return summary
+
+    def __len__(self):
+        return len(self._entries)
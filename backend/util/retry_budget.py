@@ -0,0 +1,77 @@
+"""
+Retry budget: caps retries at a fraction of recent calls
+"""
+
+import threading
+import time
+
+
+class RetryBudget:
+    """
+    Allows retries in proportion to the calls made over a sliding window.
+
+    Without a cap, retries multiply the load on backends exactly when they
+    are failing. Each call deposits `ratio` of a retry; a retry withdraws a
+    whole one. `min_per_second` retries are allowed on top, so a quiet
+    balancer can still retry. Counts are kept per second in a ring of
+    buckets covering `window` seconds.
+    """
+    def __init__(self, ratio=0.2, min_per_second=10, window=10, clock=time.monotonic):
+        """
+        Initialize the budget
+
+        Args:
+            ratio (float): Retries allowed per call
+            min_per_second (float): Retries allowed per second regardless of calls
+            window (int): Seconds of history the budget is computed over
+            clock (callable): Monotonic time source in seconds
+        """
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.window = int(window)
+        self._clock = clock
+        self._calls = [0] * self.window
+        self._retries = [0] * self.window
+        self._epochs = [0] * self.window
+        self._lock = threading.Lock()
+
+    def _bucket(self):
+        """Index of the current bucket, cleared if it is a window old (caller holds the lock)"""
+        epoch = int(self._clock())
+        index = epoch % self.window
+        if self._epochs[index] != epoch:
+            self._epochs[index] = epoch
+            self._calls[index] = 0
+            self._retries[index] = 0
+        return index
+
+    def _totals(self):
+        """Calls and retries within the window (caller holds the lock)"""
+        oldest = int(self._clock()) - self.window
+        calls = retries = 0
+        for index, epoch in enumerate(self._epochs):
+            if epoch > oldest:
+                calls += self._calls[index]
+                retries += self._retries[index]
+        return calls, retries
+
+    def record_call(self):
+        """Count a call that may later be retried"""
+        with self._lock:
+            self._calls[self._bucket()] += 1
+
+    def try_retry(self):
+        """Take one retry from the budget; False if it is spent"""
+        with self._lock:
+            index = self._bucket()
+            calls, retries = self._totals()
+            if retries >= self.ratio * calls + self.min_per_second * self.window:
+                return False
+            self._retries[index] += 1
+            return True
+
+    def summary(self):
+        """Calls and retries in the window"""
+        with self._lock:
+            calls, retries = self._totals()
+        return {"calls": calls, "retries": retries, "window": self.window}
@@ -0,0 +1,256 @@
+"""
+Persistent min-heap queue for jobs that become due at a wall-clock time
+"""
+
+import heapq
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class ScheduledJobQueue:
+    """
+    Min-heap of jobs ordered by due time.
+
+    A worker blocks on a condition variable until the earliest job is due, so
+    an idle queue costs nothing and no store has to be polled. When a `path`
+    is given every push and completion is appended to a JSON-lines journal that
+    is replayed on startup, so pending jobs survive a restart. The journal is
+    compacted once it holds mostly completed entries.
+
+    Popped jobs are claimed, not completed: they are journaled as done only
+    once complete() is called, after their handler succeeded, and retry()
+    puts them back. A job whose handler failed, or was cut short by a crash,
+    is run again, so handlers must tolerate a job they have already applied.
+    """
+    # Longest single wait, so wall-clock adjustments are picked up eventually
+    MAX_WAIT = 60.0
+    # Seconds before a job whose handler failed is due again
+    RETRY_DELAY = 5.0
+
+    def __init__(self, path=None, clock=time.time):
+        """
+        Initialize the queue
+
+        Args:
+            path (str): Journal file for persistence, or None for memory only
+            clock (callable): Wall-clock time source in seconds
+        """
+        self._heap = []  # (due, job_id)
+        self._jobs = {}  # job_id -> (due, payload)
+        self._claimed = {}  # job_id -> (due, payload) of popped jobs not yet completed
+        self._cond = threading.Condition()
+        self._clock = clock
+        self._path = path
+        self._journal = None
+        self._journal_entries = 0
+
+        if path:
+            self._load()
+
+    def __len__(self):
+        return len(self._jobs)
+
+    def __contains__(self, job_id):
+        return job_id in self._jobs
+
+    def jobs(self):
+        """Get all pending jobs as (job_id, due, payload) tuples"""
+        with self._cond:
+            return [(job_id, due, payload) for job_id, (due, payload) in self._jobs.items()]
+
+    def _load(self):
+        """Replay the journal and reopen it for appending"""
+        os.makedirs(os.path.dirname(self._path) or ".", exist_ok=True)
+        if os.path.exists(self._path):
+            with open(self._path, "r", encoding="utf-8") as journal:
+                for line in journal:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A torn last line from a crash mid-write
+                        continue
+                    if entry["op"] == "push":
+                        self._jobs[entry["id"]] = (entry["due"], entry.get("payload"))
+                    else:
+                        self._jobs.pop(entry["id"], None)
+            self._heap = [(due, job_id) for job_id, (due, _) in self._jobs.items()]
+            heapq.heapify(self._heap)
+            logger.info(f"Restored {len(self._jobs)} scheduled jobs from {self._path}")
+        self._compact()
+
+    def _write(self, entry):
+        """Append an entry to the journal (caller holds the lock)"""
+        if self._journal is None:
+            return
+        self._journal.write(json.dumps(entry) + "\n")
+        self._journal.flush()
+        self._journal_entries += 1
+        if self._journal_entries > 2 * len(self._jobs) + 1000:
+            self._compact()
+
+    def _compact(self):
+        """Rewrite the journal with only the pending and claimed jobs"""
+        if self._journal is not None:
+            self._journal.close()
+        tmp_path = self._path + ".tmp"
+        jobs = {**self._claimed, **self._jobs}
+        with open(tmp_path, "w", encoding="utf-8") as journal:
+            for job_id, (due, payload) in jobs.items():
+                journal.write(json.dumps({"op": "push", "id": job_id, "due": due, "payload": payload}) + "\n")
+        os.replace(tmp_path, self._path)
+        self._journal = open(self._path, "a", encoding="utf-8")
+        self._journal_entries = len(jobs)
+
+    def push(self, job_id, due, payload=None):
+        """
+        Add (or move) a job
+
+        Args:
+            job_id (str): Unique job identifier
+            due (float): Wall-clock time at which the job becomes due
+            payload: JSON-serializable data handed back on dispatch
+        """
+        with self._cond:
+            self._jobs[job_id] = (due, payload)
+            heapq.heappush(self._heap, (due, job_id))
+            self._write({"op": "push", "id": job_id, "due": due, "payload": payload})
+            # Wake the worker only if this job is now the earliest
+            if self._heap[0][1] == job_id:
+                self._cond.notify_all()
+
+    def cancel(self, job_id):
+        """
+        Remove a pending job, or a claimed one so it is not retried
+
+        Returns:
+            bool: True if the job was pending
+        """
+        with self._cond:
+            claimed = self._claimed.pop(job_id, None)
+            if self._jobs.pop(job_id, None) is None:
+                if claimed is not None:
+                    self._write({"op": "done", "id": job_id})
+                return False
+            # The heap entry is skipped lazily when it reaches the top
+            self._write({"op": "done", "id": job_id})
+            return True
+
+    def _peek(self):
+        """Get the earliest live heap entry, dropping stale ones (caller holds the lock)"""
+        while self._heap:
+            due, job_id = self._heap[0]
+            job = self._jobs.get(job_id)
+            if job is not None and job[0] == due:
+                return due, job_id
+            heapq.heappop(self._heap)
+        return None
+
+    def next_due(self):
+        """Get the due time of the earliest job, or None if the queue is empty"""
+        with self._cond:
+            top = self._peek()
+            return top[0] if top else None
+
+    def pop_due(self, limit=None, now=None):
+        """
+        Claim and return jobs that are due
+
+        The jobs stay in the journal until complete() is called for them.
+
+        Args:
+            limit (int): Maximum number of jobs to return
+            now (float): Current time, defaults to the queue's clock
+
+        Returns:
+            list: (job_id, payload) tuples in due-time order
+        """
+        if now is None:
+            now = self._clock()
+        due_jobs = []
+        with self._cond:
+            while limit is None or len(due_jobs) < limit:
+                top = self._peek()
+                if top is None or top[0] > now:
+                    break
+                heapq.heappop(self._heap)
+                job = self._claimed[top[1]] = self._jobs.pop(top[1])
+                due_jobs.append((top[1], job[1]))
+        return due_jobs
+
+    def complete(self, job_ids):
+        """Journal claimed jobs as done, unless pushed again while they were claimed"""
+        with self._cond:
+            for job_id in job_ids:
+                if self._claimed.pop(job_id, None) is not None and job_id not in self._jobs:
+                    self._write({"op": "done", "id": job_id})
+
+    def retry(self, job_ids, delay=None):
+        """
+        Put claimed jobs back, due again after `delay` seconds (RETRY_DELAY by default)
+
+        A job pushed again or cancelled while it was claimed is left as that
+        made it.
+        """
+        due = self._clock() + (self.RETRY_DELAY if delay is None else delay)
+        with self._cond:
+            for job_id in job_ids:
+                job = self._claimed.pop(job_id, None)
+                if job is not None and job_id not in self._jobs:
+                    self.push(job_id, due, job[1])
+
+    def wait_due(self, limit=None, timeout=None):
+        """
+        Block until at least one job is due, then pop a batch
+
+        Args:
+            limit (int): Maximum number of jobs to return
+            timeout (float): Longest time to block, or None to wait for a job
+
+        Returns:
+            list: (job_id, payload) tuples, empty if the timeout elapsed first
+        """
+        deadline = None if timeout is None else self._clock() + timeout
+        with self._cond:
+            while True:
+                now = self._clock()
+                top = self._peek()
+                if top is not None and top[0] <= now:
+                    return self.pop_due(limit, now)
+                wait = self.MAX_WAIT if top is None else min(self.MAX_WAIT, top[0] - now)
+                if deadline is not None:
+                    if now >= deadline:
+                        return []
+                    wait = min(wait, deadline - now)
+                self._cond.wait(wait)
+
+    def start_worker(self, handler, batch_size=100, name="scheduled-queue"):
+        """
+        Start a background thread that hands due jobs to a handler in batches
+
+        A batch is completed when the handler returns and retried after
+        RETRY_DELAY when it raises.
+
+        Args:
+            handler (callable): Called with a list of (job_id, payload) tuples
+            batch_size (int): Maximum number of jobs per handler call
+        """
+        def queue_worker():
+            while True:
+                batch = self.wait_due(batch_size)
+                job_ids = [job_id for job_id, _ in batch]
+                try:
+                    handler(batch)
+                except Exception as e:
+                    logger.error(f"Error dispatching scheduled jobs, retrying in {self.RETRY_DELAY:g} s: {e}")
+                    self.retry(job_ids)
+                else:
+                    self.complete(job_ids)
+
+        worker_thread = threading.Thread(target=queue_worker, name=name, daemon=True)
+        worker_thread.start()
+        return worker_thread
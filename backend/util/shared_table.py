@@ -0,0 +1,77 @@
+"""
+Backend state shared by the worker processes of a multi-process load balancer
+"""
+
+import ctypes
+import multiprocessing
+
+# Backend status codes in the table
+STATUS_CODES = {"unknown": 0, "up": 1, "down": 2}
+STATUS_NAMES = {code: name for name, code in STATUS_CODES.items()}
+
+# Columns of a backend's row before the per-worker connection counts
+_STATUS, _LEADER, _WEIGHT, _OPEN_UNTIL = range(4)
+_FIELDS = 4
+
+
+class SharedBackendTable:
+    """
+    Fixed-size table in shared memory with one row per backend: its status,
+    whether it is the leader, its routing weight, until when its circuit
+    breaker is open, and one active-connection count per worker process.
+
+    The table is created before the workers are forked and needs no lock:
+    every cell is an aligned double, written whole, and the connection
+    counts have a single writer each (the worker owning the column), so
+    readers sum the columns instead of sharing a counter.
+    """
+    def __init__(self, ports, workers):
+        """
+        Create the table in shared memory
+
+        Args:
+            ports (list): Backend ports, one row each
+            workers (int): Worker processes, one connection count column each
+        """
+        self.ports = list(ports)
+        self.workers = workers
+        self.slots = {port: slot for slot, port in enumerate(self.ports)}
+        self._width = _FIELDS + workers
+        self._cells = multiprocessing.RawArray(ctypes.c_double, len(self.ports) * self._width)
+        for port in self.ports:
+            self._cells[self._cell(port, _WEIGHT)] = 1.0
+
+    def _cell(self, port, column):
+        return self.slots[port] * self._width + column
+
+    def status(self, port):
+        """Status of a backend: 'unknown', 'up' or 'down'"""
+        return STATUS_NAMES[int(self._cells[self._cell(port, _STATUS)])]
+
+    def is_leader(self, port):
+        return bool(self._cells[self._cell(port, _LEADER)])
+
+    def weight(self, port):
+        return self._cells[self._cell(port, _WEIGHT)]
+
+    def publish(self, port, status, is_leader, weight):
+        """Set a backend's status, leadership and weight (written by the worker that probes)"""
+        self._cells[self._cell(port, _STATUS)] = STATUS_CODES[status]
+        self._cells[self._cell(port, _LEADER)] = 1.0 if is_leader else 0.0
+        self._cells[self._cell(port, _WEIGHT)] = weight
+
+    def open_until(self, port):
+        """Time (time.time()) until which some worker's breaker keeps the backend open"""
+        return self._cells[self._cell(port, _OPEN_UNTIL)]
+
+    def set_open_until(self, port, until):
+        self._cells[self._cell(port, _OPEN_UNTIL)] = until
+
+    def set_connections(self, port, worker, count):
+        """Set one worker's calls in flight to a backend"""
+        self._cells[self._cell(port, _FIELDS + worker)] = count
+
+    def connections(self, port):
+        """Calls in flight to a backend from all workers"""
+        start = self._cell(port, _FIELDS)
+        return int(sum(self._cells[start:start + self.workers]))
@@ -0,0 +1,171 @@
+"""
+Zone-level surge pricing from sliding-window demand and live driver supply
+"""
+
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class SurgePricingEngine:
+    """
+    Incremental surge pricing per zone.
+
+    Demand is the number of ride requests in a sliding window, kept as a ring
+    of time buckets per zone so each request is an O(1) bucket increment.
+    Supply is the number of drivers currently available in the zone, kept as
+    a gauge that moves in O(1) when a driver changes zone or availability.
+
+    Multipliers are recomputed at a fixed cadence and published as a new dict
+    that replaces the old one in a single assignment, so fare calculation reads
+    them without taking any lock.
+    """
+    def __init__(self, window=600, buckets=10, threshold=1.0, sensitivity=0.25,
+                 max_multiplier=3.0, smoothing=0.5, base_multiplier=1.0, clock=time.monotonic):
+        """
+        Initialize the surge pricing engine
+
+        Args:
+            window (float): Demand window in seconds
+            buckets (int): Number of buckets the window is split into
+            threshold (float): Requests per available driver before surge starts
+            sensitivity (float): Multiplier increase per unit of pressure above threshold
+            max_multiplier (float): Upper bound for a zone multiplier
+            smoothing (float): Weight of the new value when updating a multiplier (0-1]
+            base_multiplier (float): Multiplier for zones without surge
+            clock (callable): Monotonic time source in seconds
+        """
+        self.bucket_width = window / buckets
+        self.buckets = buckets
+        self.threshold = threshold
+        self.sensitivity = sensitivity
+        self.max_multiplier = max_multiplier
+        self.smoothing = smoothing
+        self.base_multiplier = base_multiplier
+        self._clock = clock
+
+        self._demand = {}  # zone -> [counts, bucket epochs]
+        self._supply = {}  # zone -> available drivers
+        self._driver_zones = {}  # driver -> zone while available
+        self._lock = threading.Lock()
+
+        # Published state, replaced wholesale on every recompute
+        self._multipliers = {}
+        self._snapshot = {}
+
+    def record_request(self, zone, now=None):
+        """
+        Count a ride request in a zone
+
+        Args:
+            zone: Zone identifier (e.g. a location id)
+            now (float): Current time, defaults to the engine's clock
+        """
+        if zone is None:
+            return
+        if now is None:
+            now = self._clock()
+        epoch = int(now / self.bucket_width)
+        index = epoch % self.buckets
+
+        with self._lock:
+            ring = self._demand.get(zone)
+            if ring is None:
+                ring = self._demand[zone] = [[0] * self.buckets, [epoch] * self.buckets]
+            counts, epochs = ring
+            if epochs[index] != epoch:
+                # Bucket last used a full window ago; start it over
+                epochs[index] = epoch
+                counts[index] = 0
+            counts[index] += 1
+
+    def update_driver(self, driver, zone, is_available):
+        """
+        Move a driver's contribution to supply
+
+        Args:
+            driver (str): Driver username
+            zone: Zone the driver is in (ignored when unavailable)
+            is_available (bool): Whether the driver can take rides
+        """
+        new_zone = zone if is_available else None
+
+        with self._lock:
+            old_zone = self._driver_zones.pop(driver, None)
+            if old_zone is not None:
+                self._supply[old_zone] -= 1
+                if not self._supply[old_zone]:
+                    del self._supply[old_zone]
+            if new_zone is not None:
+                self._driver_zones[driver] = new_zone
+                self._supply[new_zone] = self._supply.get(new_zone, 0) + 1
+
+    def multiplier(self, zone):
+        """Get the current multiplier for a zone (lock-free)"""
+        return self._multipliers.get(zone, self.base_multiplier)
+
+    def snapshot(self):
+        """Get the last computed per-zone demand, supply and multiplier"""
+        return self._snapshot
+
+    def recompute(self, now=None):
+        """
+        Recompute and publish multipliers for every zone with recent demand
+
+        Args:
+            now (float): Current time, defaults to the engine's clock
+        """
+        if now is None:
+            now = self._clock()
+        oldest_epoch = int(now / self.bucket_width) - self.buckets + 1
+
+        with self._lock:
+            demand = {}
+            for zone, (counts, epochs) in list(self._demand.items()):
+                total = sum(c for c, e in zip(counts, epochs) if e >= oldest_epoch)
+                if total:
+                    demand[zone] = total
+                else:
+                    del self._demand[zone]
+            supply = dict(self._supply)
+
+        previous = self._multipliers
+        multipliers = {}
+        snapshot = {}
+        for zone, requests in demand.items():
+            drivers = supply.get(zone, 0)
+            pressure = requests / max(drivers, 1)
+            target = 1.0 + self.sensitivity * max(0.0, pressure - self.threshold)
+            target = min(self.max_multiplier, target) * self.base_multiplier
+
+            # Smooth towards the target so multipliers do not flap
+            current = previous.get(zone, self.base_multiplier)
+            value = round(current + self.smoothing * (target - current), 2)
+            if value > self.base_multiplier:
+                multipliers[zone] = value
+            snapshot[zone] = {"requests": requests, "drivers": drivers, "multiplier": value}
+
+        self._multipliers = multipliers
+        self._snapshot = snapshot
+        return multipliers
+
+    def start(self, interval=30):
+        """
+        Start a background thread that recomputes multipliers at a fixed cadence
+
+        Args:
+            interval (float): Seconds between recomputations
+        """
+        def surge_worker():
+            while True:
+                try:
+                    self.recompute()
+                except Exception as e:
+                    logger.error(f"Error recomputing surge multipliers: {e}")
+                time.sleep(interval)
+
+        surge_thread = threading.Thread(target=surge_worker, daemon=True)
+        surge_thread.start()
+        return surge_thread
@@ -0,0 +1,150 @@
+"""
+Hierarchical timing wheel for large numbers of keyed timeouts
+"""
+
+import math
+import threading
+import time
+
+
+class TimingWheel:
+    """
+    Hierarchical timing wheel with O(1) schedule, cancel and per-tick expiry.
+
+    Level 0 has one slot per tick; each higher level has slots that are
+    `wheel_size` times wider. Timers too far out for level 0 are parked on a
+    higher level and cascade down as the wheel turns. Timers are identified by
+    a hashable key, so re-scheduling a key (e.g. on a heartbeat) simply moves it.
+    """
+    def __init__(self, tick=1.0, wheel_size=64, levels=4, clock=time.monotonic):
+        """
+        Initialize the timing wheel
+
+        Args:
+            tick (float): Resolution of the wheel in seconds
+            wheel_size (int): Number of slots per level
+            levels (int): Number of levels (span is wheel_size ** levels ticks)
+            clock (callable): Monotonic time source in seconds
+        """
+        self.tick = tick
+        self.wheel_size = wheel_size
+        self.levels = levels
+        self._clock = clock
+        self._origin = clock()
+        self._current_tick = 0
+        self._spans = [wheel_size ** level for level in range(levels + 1)]
+        self._wheels = [[{} for _ in range(wheel_size)] for _ in range(levels)]
+        self._timers = {}  # key -> (level, slot)
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._timers)
+
+    def __contains__(self, key):
+        return key in self._timers
+
+    def _tick_for(self, now):
+        return int((now - self._origin) / self.tick)
+
+    def _place(self, key, expiry_tick):
+        """Put a timer into the right level and slot (caller holds the lock)"""
+        delta = expiry_tick - self._current_tick
+        for level in range(self.levels):
+            if delta < self._spans[level + 1]:
+                slot = (expiry_tick // self._spans[level]) % self.wheel_size
+                break
+        else:
+            # Beyond the wheel span: park in the last top-level slot and
+            # re-place on every cascade until the expiry is in range (in a
+            # one-level wheel, when advance reaches the slot)
+            level = self.levels - 1
+            slot = (self._current_tick // self._spans[level] - 1) % self.wheel_size
+        self._wheels[level][slot][key] = expiry_tick
+        self._timers[key] = (level, slot)
+
+    def schedule(self, key, delay, now=None):
+        """
+        Schedule (or re-schedule) a timer
+
+        Args:
+            key: Hashable timer identifier
+            delay (float): Seconds from now until the timer expires
+            now (float): Current time, defaults to the wheel's clock
+        """
+        if now is None:
+            now = self._clock()
+        # Round up so a timer never fires before its delay has elapsed
+        expiry_tick = math.ceil((now - self._origin + delay) / self.tick)
+        with self._lock:
+            expiry_tick = max(expiry_tick, self._current_tick + 1)
+            self._remove(key)
+            self._place(key, expiry_tick)
+
+    def _remove(self, key):
+        location = self._timers.pop(key, None)
+        if location is not None:
+            level, slot = location
+            self._wheels[level][slot].pop(key, None)
+        return location is not None
+
+    def cancel(self, key):
+        """
+        Cancel a timer
+
+        Returns:
+            bool: True if the timer was pending
+        """
+        with self._lock:
+            return self._remove(key)
+
+    def advance(self, now=None):
+        """
+        Turn the wheel up to the current time and collect expired timers
+
+        Args:
+            now (float): Current time, defaults to the wheel's clock
+
+        Returns:
+            list: Keys of all timers that expired, in expiry order
+        """
+        if now is None:
+            now = self._clock()
+        target_tick = self._tick_for(now)
+        expired = []
+
+        with self._lock:
+            while self._current_tick < target_tick:
+                if not self._timers:
+                    # Nothing pending, jump straight to the target
+                    self._current_tick = target_tick
+                    break
+
+                self._current_tick += 1
+                self._cascade()
+
+                slot = self._wheels[0][self._current_tick % self.wheel_size]
+                if slot:
+                    self._wheels[0][self._current_tick % self.wheel_size] = {}
+                    for key, expiry_tick in slot.items():
+                        if expiry_tick > self._current_tick:
+                            # Parked beyond the span of a one-level wheel
+                            self._place(key, expiry_tick)
+                        else:
+                            del self._timers[key]
+                            expired.append(key)
+
+        return expired
+
+    def _cascade(self):
+        """Move timers from higher levels down as their slot comes due"""
+        for level in range(self.levels - 1, 0, -1):
+            span = self._spans[level]
+            if self._current_tick % span:
+                continue
+            index = (self._current_tick // span) % self.wheel_size
+            slot = self._wheels[level][index]
+            if not slot:
+                continue
+            self._wheels[level][index] = {}
+            for key, expiry_tick in slot.items():
+                self._place(key, max(expiry_tick, self._current_tick))
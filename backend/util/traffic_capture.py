@@ -0,0 +1,181 @@
+"""
+Compact binary capture of the calls a load balancer serves, for replaying them later
+"""
+
+import json
+import os
+import random
+import struct
+import threading
+from collections import namedtuple
+
+MAGIC = b"CABCAP1\n"  # first bytes of every capture file
+
+# Record header: wall-clock start (s), duration (s), response size (bytes),
+# failed flag, method length, params length; the method name and the params
+# as compact JSON follow
+_HEADER = struct.Struct("<dfIBHI")
+
+FLUSH_INTERVAL = 1.0  # seconds buffered records may wait before they are written out
+
+CapturedCall = namedtuple("CapturedCall", "started duration method params response_size failed")
+
+
+def _encode(value):
+    return json.dumps(value, separators=(",", ":"), default=str).encode("utf-8")
+
+
+class TrafficCapture:
+    """
+    Appends a sample of the calls served to a capture file, rotating it by size.
+
+    A record holds when the call arrived (wall clock, so replays keep the
+    inter-arrival times), how long it took, the method, its params, the size
+    of its response as compact JSON and whether it failed. Records are
+    encoded in the calling thread and appended to a buffered file under a
+    lock, which is written out once FLUSH_INTERVAL has passed or the buffer
+    fills. Past `max_bytes` the file is renamed to path.1, older files
+    shifting up to path.<backups>, as logging's RotatingFileHandler does; a
+    capture file left by a previous run is rotated away the same way.
+
+    Capture files hold the params of the calls, credentials included, and
+    should be kept as private as the database.
+    """
+
+    def __init__(self, path, sample_rate=1.0, max_bytes=64 * 1024 * 1024, backups=5):
+        """
+        Open a new capture file
+
+        Args:
+            path (str): Capture file path
+            sample_rate (float): Share of calls captured, 0 to 1
+            max_bytes (int): Size at which the file is rotated
+            backups (int): Rotated files kept
+        """
+        self.path = path
+        self.sample_rate = sample_rate
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.stats = {"captured": 0, "rotations": 0, "errors": 0}
+        self._lock = threading.Lock()
+        self._file = None
+        self._size = 0
+        self._flushed_at = 0.0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            if os.path.exists(path) and os.path.getsize(path) > 0:
+                self._shift_backups()
+            self._open()
+
+    def sampled(self):
+        """Whether to capture the next call"""
+        return self.sample_rate >= 1.0 or random.random() < self.sample_rate
+
+    def record(self, started, duration, method, params, response, failed):
+        """
+        Append one call to the capture
+
+        Args:
+            started (float): time.time() when the call arrived
+            duration (float): Seconds the call took
+            method (str): RPC method name
+            params (tuple): Call params
+            response: The call's response, None if it failed
+            failed (bool): Whether the call raised
+        """
+        try:
+            method_bytes = method.encode("utf-8")
+            params_bytes = _encode(params)
+            size = 0 if response is None else len(_encode(response))
+        except (TypeError, ValueError):
+            with self._lock:
+                self.stats["errors"] += 1
+            return
+        record = _HEADER.pack(started, duration, min(size, 0xFFFFFFFF), int(failed),
+                              len(method_bytes), len(params_bytes)) + method_bytes + params_bytes
+
+        with self._lock:
+            if self._file is None:
+                return
+            try:
+                if self._size + len(record) > self.max_bytes and self._size > len(MAGIC):
+                    self._rotate()
+                self._file.write(record)
+                self._size += len(record)
+                self.stats["captured"] += 1
+                if started - self._flushed_at >= FLUSH_INTERVAL:
+                    self._file.flush()
+                    self._flushed_at = started
+            except OSError:
+                self.stats["errors"] += 1
+
+    def _open(self):
+        """Start a new capture file (caller holds the lock)"""
+        self._file = open(self.path, "wb", buffering=1 << 20)
+        self._file.write(MAGIC)
+        self._size = len(MAGIC)
+
+    def _shift_backups(self):
+        """Rename path to path.1 and older files one number up, dropping the oldest (caller holds the lock)"""
+        for number in range(self.backups - 1, 0, -1):
+            older = f"{self.path}.{number}"
+            if os.path.exists(older):
+                os.replace(older, f"{self.path}.{number + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+    def _rotate(self):
+        """Close the full file and start a new one (caller holds the lock)"""
+        self._file.close()
+        self._shift_backups()
+        self._open()
+        self.stats["rotations"] += 1
+
+    def flush(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def summary(self):
+        with self._lock:
+            return dict(self.stats, path=self.path, sample_rate=self.sample_rate, bytes=self._size)
+
+
+def read_capture(path):
+    """
+    Read the calls of a capture file in the order they were recorded (as they finished)
+
+    A record cut short, as the last one of a file whose writer was killed
+    may be, ends the reading.
+
+    Yields:
+        CapturedCall: One per record
+    """
+    with open(path, "rb") as capture_file:
+        if capture_file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a capture file")
+        while True:
+            header = capture_file.read(_HEADER.size)
+            if len(header) < _HEADER.size:
+                return
+            started, duration, size, failed, method_length, params_length = _HEADER.unpack(header)
+            body = capture_file.read(method_length + params_length)
+            if len(body) < method_length + params_length:
+                return
+            yield CapturedCall(
+                started, duration,
+                body[:method_length].decode("utf-8"),
+                json.loads(body[method_length:]),
+                size, bool(failed)
+            )
@@ -0,0 +1,147 @@
+"""
+Fixed-size worker pool with a bounded accept queue for socketserver servers
+"""
+
+import queue
+import socket
+import threading
+import time
+import xmlrpc.client
+from collections import deque
+
+from util.metrics import LatencyHistogram
+
+# HTTP status of a fast rejection; clients should retry it (on another backend)
+BUSY_STATUS = 503
+BUSY_FAULT_STRING = "Server busy, retry later"
+
+
+def is_busy_error(error):
+    """Whether an RPC error is a fast rejection from a full server or load balancer (safe to retry)"""
+    if isinstance(error, xmlrpc.client.Fault):
+        return error.faultCode == BUSY_STATUS
+    return isinstance(error, xmlrpc.client.ProtocolError) and error.errcode == BUSY_STATUS
+
+
+def _busy_response():
+    body = xmlrpc.client.dumps(xmlrpc.client.Fault(BUSY_STATUS, BUSY_FAULT_STRING),
+                               methodresponse=True).encode()
+    head = (f"HTTP/1.0 {BUSY_STATUS} Service Unavailable\r\n"
+            f"Retry-After: 1\r\n"
+            f"Content-Type: text/xml\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: close\r\n\r\n")
+    return head.encode("latin-1") + body
+
+
+class BoundedPoolMixIn:
+    """
+    Mix-in for socketserver servers in place of ThreadingMixIn.
+
+    Accepted connections go into a bounded queue served by a fixed number of
+    worker threads. When the queue is full the connection is answered at
+    once with HTTP 503 (an XML-RPC client sees ProtocolError 503) instead of
+    waiting behind work it would time out on, so overload costs rejections
+    rather than latency for everyone.
+    """
+    pool_workers = 32
+    pool_queue_size = 64
+    request_queue_size = 1024  # listen backlog, so bursts reach the queue instead of SYN drops
+    reject_read_timeout = 0.5  # seconds a rejected client gets to send its request before we answer
+
+    def _init_pool(self):
+        self._pool_queue = queue.Queue(maxsize=self.pool_queue_size)
+        self._reject_queue = deque(maxlen=4 * self.pool_queue_size)
+        self._reject_ready = threading.Semaphore(0)
+        self.pool_wait = LatencyHistogram()
+        self.pool_accepted = 0
+        self.pool_rejected = 0
+        self.pool_max_depth = 0
+        self._busy_response = _busy_response()
+        threads = [threading.Thread(target=self._pool_worker, daemon=True, name=f"pool-worker-{i}")
+                   for i in range(self.pool_workers)]
+        threads.append(threading.Thread(target=self._reject_worker, daemon=True, name="pool-rejecter"))
+        for thread in threads:
+            thread.start()
+
+    def serve_forever(self, poll_interval=0.5):
+        if not hasattr(self, "_pool_queue"):
+            self._init_pool()
+        super().serve_forever(poll_interval)
+
+    def process_request(self, request, client_address):
+        """Queue the connection for a worker, or reject it when the queue is full"""
+        try:
+            self._pool_queue.put_nowait((request, client_address, time.perf_counter()))
+        except queue.Full:
+            self.pool_rejected += 1
+            if len(self._reject_queue) == self._reject_queue.maxlen:
+                # Even the rejecter is behind; dropping is the cheapest answer left
+                self.shutdown_request(request)
+            else:
+                self._reject_queue.append(request)
+                self._reject_ready.release()
+            return
+        self.pool_accepted += 1
+        depth = self._pool_queue.qsize()
+        if depth > self.pool_max_depth:
+            self.pool_max_depth = depth
+
+    def _pool_worker(self):
+        while True:
+            request, client_address, queued_at = self._pool_queue.get()
+            self.pool_wait.record(time.perf_counter() - queued_at)
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    def _reject_worker(self):
+        """Read each rejected request and answer it with 503, so the client sees a clean error"""
+        while True:
+            self._reject_ready.acquire()
+            try:
+                request = self._reject_queue.popleft()
+            except IndexError:
+                continue
+            try:
+                request.settimeout(self.reject_read_timeout)
+                received = b""
+                while b"\r\n\r\n" not in received:
+                    chunk = request.recv(4096)
+                    if not chunk:
+                        break
+                    received += chunk
+                # Drain the body too: closing with unread data would reset the connection
+                head, _, body = received.partition(b"\r\n\r\n")
+                length = 0
+                for line in head.split(b"\r\n"):
+                    if line.lower().startswith(b"content-length:"):
+                        length = int(line.split(b":", 1)[1])
+                while len(body) < length:
+                    chunk = request.recv(min(65536, length - len(body)))
+                    if not chunk:
+                        break
+                    body += chunk
+                request.sendall(self._busy_response)
+                request.shutdown(socket.SHUT_WR)
+            except (OSError, ValueError):
+                pass
+            finally:
+                self.shutdown_request(request)
+
+    def pool_stats(self):
+        """Get worker pool size, queue depth, queue wait and rejection counts"""
+        if not hasattr(self, "_pool_queue"):
+            return {"workers": self.pool_workers, "queue_size": self.pool_queue_size}
+        return {
+            "workers": self.pool_workers,
+            "queue_size": self.pool_queue_size,
+            "queue_depth": self._pool_queue.qsize(),
+            "max_queue_depth": self.pool_max_depth,
+            "accepted": self.pool_accepted,
+            "rejected": self.pool_rejected,
+            "queue_wait": self.pool_wait.summary()
+        }
@@ -0,0 +1,61 @@
+"""
+XML-RPC client helpers: a transport whose calls time out, and a proxy threads can share
+"""
+
+import socket
+import threading
+import xmlrpc.client
+
+from config import settings
+
+
+class TimeoutTransport(xmlrpc.client.Transport):
+    """XML-RPC transport whose calls time out, after REQUEST_TIMEOUT seconds by default"""
+
+    def __init__(self, timeout=None):
+        super().__init__()
+        self.timeout = timeout
+        self.aborted = False  # set by abort(); calls fail until the owner clears it
+
+    def make_connection(self, host):
+        connection = super().make_connection(host)
+        connection.timeout = settings.REQUEST_TIMEOUT if self.timeout is None else self.timeout
+        return connection
+
+    def single_request(self, host, handler, request_body, verbose=False):
+        if self.aborted:
+            # Not sent again on a fresh connection, as a call on a dropped one would be
+            raise ConnectionAbortedError("Call aborted")
+        return super().single_request(host, handler, request_body, verbose)
+
+    def abort(self):
+        """Break off the call in progress from another thread: it fails with a connection error"""
+        self.aborted = True
+        connection = self._connection[1]
+        sock = getattr(connection, "sock", None)
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+class SharedServerProxy:
+    """
+    ServerProxy that threads can share: a ServerProxy keeps one connection
+    and is not thread-safe, so each thread calling through this one gets its
+    own, with a TimeoutTransport
+    """
+
+    def __init__(self, url, timeout=None):
+        self.url = url
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def __getattr__(self, name):
+        proxy = getattr(self._local, "proxy", None)
+        if proxy is None:
+            proxy = self._local.proxy = xmlrpc.client.ServerProxy(
+                self.url, transport=TimeoutTransport(self.timeout), allow_none=True
+            )
+        return getattr(proxy, name)